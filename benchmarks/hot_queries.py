@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import time
+from sqlalchemy.future import select
+from src.app.core.db import AsyncSessionLocal, async_engine
+from src.app.models import URL
+from src.app.services import find_url
+
+# Compares the client-side cost of the redirect/stats lookup through the ORM,
+# select(URL) materialized into URL objects, with the lean column query behind
+# find_url. Runs read-only against the database configured in .env and needs at
+# least one row in urls.
+#
+#   python -m benchmarks.hot_queries --queries 20000
+
+
+async def orm_find_url(id: int, db) -> URL | None:
+    result = await db.execute(select(URL).where(URL.id == id))
+    return result.scalars().first()
+
+
+async def measure(lookup, ids: list[int], queries: int) -> tuple[float, float]:
+    # CPU time is this process only, so it leaves out the server's share of the work
+    async with AsyncSessionLocal() as db:
+        for id in ids[:100]:
+            await lookup(id, db)
+        wall, cpu = time.perf_counter(), time.process_time()
+        for i in range(queries):
+            await lookup(ids[i % len(ids)], db)
+            # A request-scoped session never sees the same object twice; keep the identity map from caching
+            db.expunge_all()
+        return (time.perf_counter() - wall) / queries, (time.process_time() - cpu) / queries
+
+
+async def main(args: argparse.Namespace):
+    async with AsyncSessionLocal() as db:
+        ids = list((await db.execute(select(URL.id).limit(args.ids))).scalars())
+    if not ids:
+        raise SystemExit("The urls table is empty")
+
+    results = {}
+    try:
+        for name, lookup in (("orm", orm_find_url), ("lean", find_url)):
+            results[name] = await measure(lookup, ids, args.queries)
+    finally:
+        await async_engine.dispose()
+
+    for name, (wall, cpu) in results.items():
+        print(f"{name:>5}: {cpu * 1e6:7.1f} us CPU/query, {wall * 1e6:7.1f} us wall/query")
+    saved = results["orm"][1] - results["lean"][1]
+    print(f"CPU saved per query: {saved * 1e6:.1f} us ({saved / results['orm'][1]:.0%})")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Hot lookup query cost benchmark")
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--ids", type=int, default=1000, help="Distinct existing ids to cycle through")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
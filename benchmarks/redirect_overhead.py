@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import logging
+import time
+from unittest.mock import patch
+from src.app.base62 import encode
+from src.app.core.local_cache import local_cache
+from src.app.main import create_app
+
+# Per-request cost of a cache-hit redirect through the FastAPI route and through
+# the fast ASGI path. The link is served from the in-process cache and the access
+# count task is a no-op, so no Redis or Postgres is needed and only the framework
+# overhead is left.
+#
+#   python -m benchmarks.redirect_overhead --requests 50000
+
+
+async def noop(*args, **kwargs):
+    pass
+
+
+def make_scope(path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def measure(app, path: str, requests: int) -> float:
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    scope = make_scope(path)
+    for _ in range(min(requests // 10, 1000)):
+        await app(dict(scope), receive, send)
+    statuses.clear()
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    elapsed = time.perf_counter() - started
+    assert set(statuses) == {307}, set(statuses)
+    return elapsed / requests
+
+
+async def main(args: argparse.Namespace):
+    if not args.debug_logs:
+        # Debug logging is on outside production and would dominate the route's numbers
+        logging.disable(logging.DEBUG)
+    short_link = encode(100000000)
+    local_cache.set(short_link, "https://example.com/some/long/path")
+    results = {}
+    with patch("src.app.services.increment_access_count", new=noop):
+        for name, fast_redirect in (("fastapi route", False), ("fast path", True)):
+            app = create_app(fast_redirect=fast_redirect)
+            results[name] = await measure(app, f"/{short_link}", args.requests)
+            # Keep the link warm across runs; L1 entries expire on their TTL
+            local_cache.set(short_link, "https://example.com/some/long/path")
+
+    for name, seconds in results.items():
+        print(f"{name:>13}: {seconds * 1e6:8.1f} us/request, {1 / seconds:9.0f} requests/s")
+    saved = results["fastapi route"] - results["fast path"]
+    print(f"removed per request: {saved * 1e6:.1f} us ({saved / results['fastapi route']:.0%})")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Redirect per-request overhead benchmark")
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--debug-logs", action="store_true", help="Keep the per-redirect debug log line")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
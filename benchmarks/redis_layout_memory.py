@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import random
+import string
+import redis.asyncio as redis
+from src.app.base62 import encode
+from src.app.core.config import settings
+from src.app.link_cache import create_layout
+
+# Compares the Redis memory taken by the string and hash bucket link cache layouts.
+# Runs against a scratch database, which is flushed before and after each layout.
+#
+#   python -m benchmarks.redis_layout_memory --links 1000000 --db 15
+
+
+def random_url(length: int) -> str:
+    path = "".join(random.choices(string.ascii_letters + string.digits, k=max(length - 20, 1)))
+    return f"https://example.com/{path}"
+
+
+async def used_memory(client: redis.Redis) -> int:
+    return (await client.info("memory"))["used_memory"]
+
+
+async def measure(client: redis.Redis, layout_name: str, args: argparse.Namespace) -> int:
+    layout = create_layout(layout_name, args.bucket_size)
+    await client.flushdb()
+    before = await used_memory(client)
+    for start in range(0, args.links, args.chunk_size):
+        async with client.pipeline(transaction=False) as pipe:
+            for id in range(start, min(start + args.chunk_size, args.links)):
+                layout.add_set(pipe, encode(settings.URL_ID_MIN + id), random_url(args.url_length), args.ttl)
+            await pipe.execute()
+    used = await used_memory(client) - before
+    await client.flushdb()
+    return used
+
+
+async def main(args: argparse.Namespace):
+    client = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=args.db,
+        decode_responses=True,
+    )
+    config = await client.config_get("hash-max-listpack-*")
+    print(f"{args.links} links, {args.url_length}-character URLs, {config}")
+    try:
+        results = {name: await measure(client, name, args) for name in ("string", "hash")}
+    finally:
+        await client.aclose()
+
+    for name, used in results.items():
+        print(f"{name:>6}: {used / 2**20:9.1f} MiB, {used / args.links:6.1f} B/link")
+    print(f"hash / string: {results['hash'] / results['string']:.2f}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Link cache layout memory benchmark")
+    parser.add_argument("--links", type=int, default=1_000_000)
+    parser.add_argument("--url-length", type=int, default=80)
+    parser.add_argument("--bucket-size", type=int, default=settings.LINK_CACHE_BUCKET_SIZE)
+    parser.add_argument("--ttl", type=int, default=settings.LINK_CACHE_TTL_SECONDS)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--db", type=int, default=15, help="Scratch database, flushed by the benchmark")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from .models import ClickRollup
+
+HOUR_SECONDS = 3600
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# Months whose url_clicks_hourly partition is known to exist
+known_partitions: set[datetime] = set()
+
+
+def rollup_field(id: int, timestamp: float) -> str:
+    # Field of the pending rollup hash: "<url id>:<start of the hour, epoch seconds>"
+    return f"{id}:{int(timestamp) // HOUR_SECONDS * HOUR_SECONDS}"
+
+
+def parse_rollup_field(field: str) -> tuple[int, datetime]:
+    id, hour = field.split(":")
+    return int(id), datetime.fromtimestamp(int(hour), timezone.utc)
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(moment: datetime) -> datetime:
+    return month_start(month_start(moment) + timedelta(days=32))
+
+
+def partition_name(month: datetime) -> str:
+    return f"{ClickRollup.__tablename__}_{month:%Y%m}"
+
+
+async def ensure_partitions(months: set[datetime], db: AsyncSession):
+    missing = sorted(months - known_partitions)
+    if not missing:
+        return
+    for month in missing:
+        await db.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+                f"PARTITION OF {ClickRollup.__tablename__} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+            )
+        )
+    # Committed on their own, and only remembered once committed: a CREATE rolled
+    # back along with a failed upsert is issued again by the next flush
+    await db.commit()
+    known_partitions.update(missing)
+
+
+async def apply_click_rollups(counts: dict[tuple[int, datetime], int], db: AsyncSession):
+    await ensure_partitions({month_start(hour) for _, hour in counts}, db)
+    query = insert(ClickRollup).values(
+        [{"url_id": id, "hour": hour, "clicks": clicks} for (id, hour), clicks in counts.items()]
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[ClickRollup.url_id, ClickRollup.hour],
+        set_={"clicks": ClickRollup.clicks + query.excluded.clicks},
+    )
+    await db.execute(query)
+    await db.commit()
+
+
+def floor_to(moment: datetime, granularity: str) -> datetime:
+    # Times without an offset are taken as UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+async def get_click_timeseries(
+    id: int, granularity: str, start: datetime, end: datetime, db: AsyncSession
+) -> list[tuple[datetime, int]]:
+    # Hours are the stored resolution; days are summed from them. The range on
+    # hour lets Postgres prune every partition outside [start, end).
+    query = (
+        select(ClickRollup.hour, ClickRollup.clicks)
+        .where(ClickRollup.url_id == id, ClickRollup.hour >= start, ClickRollup.hour < end)
+        .order_by(ClickRollup.hour)
+    )
+    result = await db.execute(query)
+    step = GRANULARITIES[granularity]
+    buckets = {}
+    bucket = start
+    while bucket < end:
+        buckets[bucket] = 0
+        bucket += step
+    for hour, clicks in result.all():
+        buckets[floor_to(hour, granularity)] += clicks
+    return list(buckets.items())
@@ -21,3 +21,18 @@ def decode(base62_str: str) -> int:
     for char in base62_str:
         num = num * BASE62_LEN + BASE62_DICT[char]
     return num
+
+
+# Largest id a BIGINT primary key holds, and the length of its encoding
+MAX_ID = 2**63 - 1
+MAX_ENCODED_LEN = 11
+
+
+def is_canonical(base62_str: str) -> bool:
+    # Only strings that encode() can produce: no foreign characters and no leading
+    # zeros, so every id has exactly one short link and one cache key
+    if not base62_str or len(base62_str) > MAX_ENCODED_LEN:
+        return False
+    if base62_str[0] == BASE62_ALPHABET[0] and len(base62_str) > 1:
+        return False
+    return all(char in BASE62_DICT for char in base62_str)
@@ -0,0 +1,152 @@
+import asyncio
+from redis.asyncio import Redis
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from .base62 import encode
+from .core.config import settings
+from .core.db import AsyncSessionLocal, shards
+from .core.logger import get_logger
+from .core.redis import get_redis_client
+from .dedup import url_digest
+from .id_allocator import IdAllocator, id_allocator
+from .link_cache import cache_links, uncache_links
+from .models import URL
+
+logger = get_logger(__name__)
+
+
+class CreateLinkBatcher:
+    # Group commit for link creation: concurrent creates that arrive within
+    # max_wait_ms of each other share one INSERT, one COMMIT and one Redis pipeline.
+    def __init__(
+        self,
+        redis: Redis,
+        max_size: int = settings.CREATE_BATCH_MAX_SIZE,
+        max_wait_ms: float = settings.CREATE_BATCH_MAX_WAIT_MS,
+        session_factory: sessionmaker = AsyncSessionLocal,
+        allocator: IdAllocator = id_allocator[0],
+    ):
+        self.redis = redis
+        self.allocator = allocator
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self.session_factory = session_factory
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._in_flight: set[asyncio.Task] = set()
+        self.batches = 0
+        self.links = 0
+        self.largest_batch = 0
+
+    async def submit(self, long_url: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((long_url, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._write_batch(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _write_batch(self, batch: list[tuple[str, asyncio.Future]]):
+        long_urls = [long_url for long_url, _ in batch]
+        try:
+            short_links = await self._insert(long_urls)
+        except Exception as e:
+            logger.error(f"Failed to create a batch of {len(batch)} links: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.links += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), short_link in zip(batch, short_links):
+            if not future.done():
+                future.set_result(short_link)
+
+    async def _insert(self, long_urls: list[str]) -> list[str]:
+        # Ids come from this worker's pre-allocated block, so the short links are
+        # known up front and the cache write does not have to wait for the INSERT
+        ids = await self.allocator.allocate_many(len(long_urls))
+        short_links = [encode(id) for id in ids]
+        rows = [
+            {"id": id, "long_url": long_url, "access_count": 0, "long_url_digest": url_digest(long_url)}
+            for id, long_url in zip(ids, long_urls)
+        ]
+        links = list(zip(short_links, long_urls))
+        inserted, cached = await asyncio.gather(
+            self._insert_rows(rows),
+            cache_links(self.redis, links, settings.LINK_CACHE_NEW_LINK_TTL_SECONDS),
+            return_exceptions=True,
+        )
+        if isinstance(inserted, BaseException):
+            if not isinstance(cached, BaseException):
+                await self._uncache(short_links)
+            raise inserted
+        if isinstance(cached, BaseException):
+            # The links exist in the DB; redirects repopulate the cache on a miss
+            logger.warning(f"Failed to cache a batch of {len(short_links)} links: {cached}")
+        return short_links
+
+    async def _insert_rows(self, rows: list[dict]):
+        async with self.session_factory() as db:
+            await db.execute(insert(URL), rows)
+            await db.commit()
+
+    async def _uncache(self, short_links: list[str]):
+        # Nobody has seen these short links yet, but they must not resolve either
+        try:
+            await uncache_links(self.redis, short_links)
+        except Exception as e:
+            logger.warning(f"Failed to uncache a batch of {len(short_links)} links: {e}")
+
+    async def close(self):
+        self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "links": self.links,
+            "avg_batch_size": self.links / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "pending": len(self._pending),
+        }
+
+
+class ShardedCreateLinkBatcher:
+    # One batcher per shard: a batch is one INSERT, which can only target one database
+    def __init__(self, batchers: list[CreateLinkBatcher]):
+        self.batchers = batchers
+
+    async def submit(self, long_url: str, shard: int = 0) -> str:
+        return await self.batchers[shard].submit(long_url)
+
+    async def close(self):
+        await asyncio.gather(*(batcher.close() for batcher in self.batchers))
+
+    def stats(self) -> list[dict]:
+        return [batcher.stats() for batcher in self.batchers]
+
+
+create_link_batcher = ShardedCreateLinkBatcher(
+    [
+        CreateLinkBatcher(get_redis_client(), session_factory=session_factory, allocator=id_allocator[shard])
+        for shard, session_factory in enumerate(shards.session_factories)
+    ]
+)
@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import contextlib
+import csv
+import sys
+import time
+from typing import Iterable, Iterator, TextIO
+import asyncpg
+import orjson
+from .base62 import encode
+from .click_events import ClickEventConsumer, FileSink, PostgresSink
+from .core.config import settings
+from .core.redis import get_redis_client
+from .dedup import url_digest
+from .id_allocator import id_allocator
+from .link_cache import REDIS_SHORTLINK_PREFIX, cache_links, create_layout, link_cache_clients, redirect_value
+from .models import URL
+from .sharding import shard_id, shard_of, write_shard_for
+from .snapshot import build_snapshot
+from .warmup import warm_links
+
+URL_COLUMNS = ["id", "long_url", "access_count", "long_url_digest", "redirect_status"]
+EXPORT_COLUMNS = ["id", "short_link", "long_url", "access_count", "redirect_status"]
+DEFAULT_CHUNK_SIZE = 10000
+
+# Moves the sequence past explicitly imported ids so new links do not collide with
+# them. Each shard's sequence counts local ids, so $1 strips the shard bits.
+ADVANCE_SEQUENCE_QUERY = """
+SELECT setval('urls_id_seq', max_id - $1)
+FROM (SELECT max(id) AS max_id FROM urls) AS urls_max, urls_id_seq
+WHERE max_id - $1 >= last_value
+"""
+
+
+class Progress:
+    def __init__(self, action: str, out: TextIO = sys.stderr, interval: float = 5.0):
+        self.action = action
+        self.out = out
+        self.interval = interval
+        self.rows = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    def add(self, rows: int):
+        self.rows += rows
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def report(self, done: bool = False):
+        elapsed = time.monotonic() - self.started
+        rate = self.rows / elapsed if elapsed else 0.0
+        status = "done" if done else "in progress"
+        print(
+            f"{self.action} {status}: {self.rows} rows in {elapsed:.1f}s ({rate:.0f} rows/s)",
+            file=self.out,
+        )
+
+
+def detect_format(path: str, fmt: str | None) -> str:
+    if fmt:
+        return fmt
+    if path.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def read_rows(source: TextIO, fmt: str) -> Iterator[dict]:
+    if fmt == "ndjson":
+        for line in source:
+            if line.strip():
+                yield orjson.loads(line)
+    else:
+        yield from csv.DictReader(source)
+
+
+def to_record(row: dict) -> tuple[int | None, str, int, bytes | None, int | None]:
+    id = row.get("id")
+    redirect_status = row.get("redirect_status")
+    redirect_status = int(redirect_status) if redirect_status not in (None, "") else None
+    return (
+        int(id) if id not in (None, "") else None,
+        row["long_url"],
+        int(row.get("access_count") or 0),
+        # Same as /create: links with their own status are left out of dedup
+        url_digest(row["long_url"]) if redirect_status is None else None,
+        redirect_status,
+    )
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def import_urls(
+    source: TextIO,
+    fmt: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    warm_redis: bool = False,
+    progress: Progress | None = None,
+) -> int:
+    progress = progress or Progress("Import")
+    redis = get_redis_client() if warm_redis else None
+    conns = [await asyncpg.connect(url) for url in settings.POSTGRES_SHARD_SYNC_URLS]
+    try:
+        records = (to_record(row) for row in read_rows(source, fmt))
+        for chunk in chunked(records, chunk_size):
+            # Rows with an id go back to the shard in it; the rest are placed like new
+            # links and get ids from the same id blocks the app uses
+            by_shard: dict[int, list[tuple]] = {}
+            missing: dict[int, list[tuple]] = {}
+            for record in chunk:
+                if record[0] is None:
+                    missing.setdefault(write_shard_for(url_digest(record[1])), []).append(record)
+                else:
+                    by_shard.setdefault(shard_of(record[0]), []).append(record)
+            for shard, shard_records in missing.items():
+                ids = await id_allocator.allocate_many(len(shard_records), shard)
+                by_shard.setdefault(shard, []).extend(
+                    (id, *record[1:]) for id, record in zip(ids, shard_records)
+                )
+
+            for shard, shard_records in by_shard.items():
+                await conns[shard].copy_records_to_table(
+                    URL.__tablename__, records=shard_records, columns=URL_COLUMNS
+                )
+                if redis is not None:
+                    await cache_links(
+                        redis,
+                        [
+                            (encode(id), redirect_value(long_url, redirect_status))
+                            for id, long_url, _, _, redirect_status in shard_records
+                        ],
+                    )
+            progress.add(len(chunk))
+
+        for shard, conn in enumerate(conns):
+            await conn.execute(ADVANCE_SEQUENCE_QUERY, shard_id(shard, 0))
+    finally:
+        for conn in conns:
+            await conn.close()
+
+    progress.report(done=True)
+    return progress.rows
+
+
+async def export_urls(
+    sink: TextIO,
+    fmt: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Progress | None = None,
+) -> int:
+    progress = progress or Progress("Export")
+    writer = csv.writer(sink) if fmt == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_COLUMNS)
+
+    # Shard by shard, which keeps the output ordered by id
+    for url in settings.POSTGRES_SHARD_SYNC_URLS:
+        conn = await asyncpg.connect(url)
+        try:
+            # Server-side cursors only live inside a transaction; prefetch bounds memory
+            async with conn.transaction(readonly=True):
+                cursor = conn.cursor(
+                    "SELECT id, long_url, access_count, redirect_status FROM urls ORDER BY id",
+                    prefetch=chunk_size,
+                )
+                rows = 0
+                async for id, long_url, access_count, redirect_status in cursor:
+                    row = (id, encode(id), long_url, access_count, redirect_status)
+                    if writer:
+                        writer.writerow(row)
+                    else:
+                        sink.write(
+                            orjson.dumps(
+                                dict(zip(EXPORT_COLUMNS, row)),
+                                option=orjson.OPT_APPEND_NEWLINE,
+                            ).decode()
+                        )
+                    rows += 1
+                    if rows == chunk_size:
+                        progress.add(rows)
+                        rows = 0
+                progress.add(rows)
+        finally:
+            await conn.close()
+
+    progress.report(done=True)
+    return progress.rows
+
+
+async def expire_cached_links(
+    ttl_seconds: int = settings.LINK_CACHE_TTL_SECONDS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Progress | None = None,
+) -> int:
+    # Keys written before links had TTLs never expire; NX leaves keys that have one alone
+    progress = progress or Progress("Expire")
+    for redis in link_cache_clients(get_redis_client()):
+        keys = []
+        async for key in redis.scan_iter(match=f"{REDIS_SHORTLINK_PREFIX}*", count=chunk_size):
+            keys.append(key)
+            if len(keys) >= chunk_size:
+                await _expire_keys(redis, keys, ttl_seconds)
+                progress.add(len(keys))
+                keys = []
+        if keys:
+            await _expire_keys(redis, keys, ttl_seconds)
+            progress.add(len(keys))
+
+    progress.report(done=True)
+    return progress.rows
+
+
+async def _expire_keys(redis, keys: list[str], ttl_seconds: int):
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.expire(key, ttl_seconds, nx=True)
+        await pipe.execute()
+
+
+async def migrate_cache_layout(
+    source: str,
+    target: str,
+    ttl_seconds: int = settings.LINK_CACHE_TTL_SECONDS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Progress | None = None,
+) -> int:
+    # Copies cached links between layouts and drops the originals. Missing-link
+    # markers are not carried over; they are short-lived and get recreated on demand.
+    progress = progress or Progress("Migrate")
+    redis = get_redis_client()
+    source_layout, target_layout = create_layout(source), create_layout(target)
+    # With cache nodes, a link's target key may hash to a different node than its source key
+    for client in link_cache_clients(redis):
+        async for links in source_layout.scan(client, chunk_size):
+            if not links:
+                continue
+            await cache_links(redis, links, ttl_seconds, target_layout)
+            await source_layout.delete(client, [short_link for short_link, _ in links])
+            progress.add(len(links))
+
+    progress.report(done=True)
+    return progress.rows
+
+
+async def consume_click_events(sink: str, directory: str):
+    consumer = ClickEventConsumer(
+        get_redis_client(), FileSink(directory) if sink == "file" else PostgresSink()
+    )
+    await consumer.run()
+
+
+async def write_link_snapshot(path: str, max_links: int):
+    started = time.monotonic()
+    links = await build_snapshot(path, max_links)
+    print(f"Snapshot of {links} links written to {path} in {time.monotonic() - started:.1f}s", file=sys.stderr)
+
+
+async def warm_cache(source: str, max_links: int, batch_size: int, progress: Progress | None = None) -> int:
+    # Redis only: the workers' in-process caches are not reachable from here
+    progress = progress or Progress("Warm-up")
+    await warm_links(
+        get_redis_client(), source, max_links, batch_size, local=False, progress=lambda links: progress.add(len(links))
+    )
+    progress.report(done=True)
+    return progress.rows
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m src.app.cli", description="ShortLink-py tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Stream a CSV/NDJSON file into the urls table")
+    import_parser.add_argument("path", help="Input file, or - for stdin")
+    import_parser.add_argument("--format", choices=["csv", "ndjson"])
+    import_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    import_parser.add_argument(
+        "--warm-redis", action="store_true", help="Also cache every imported link in Redis"
+    )
+
+    export_parser = commands.add_parser("export", help="Stream the urls table to a CSV/NDJSON file")
+    export_parser.add_argument("path", help="Output file, or - for stdout")
+    export_parser.add_argument("--format", choices=["csv", "ndjson"])
+    export_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    expire_parser = commands.add_parser(
+        "expire-cache", help="Give cached links without a TTL the default link cache TTL"
+    )
+    expire_parser.add_argument("--ttl", type=int, default=settings.LINK_CACHE_TTL_SECONDS)
+    expire_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    migrate_parser = commands.add_parser(
+        "migrate-cache-layout", help="Move cached links from one Redis layout to another"
+    )
+    migrate_parser.add_argument("source", choices=["string", "hash"])
+    migrate_parser.add_argument("target", choices=["string", "hash"])
+    migrate_parser.add_argument("--ttl", type=int, default=settings.LINK_CACHE_TTL_SECONDS)
+    migrate_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    consume_parser = commands.add_parser(
+        "consume-click-events", help="Write click events from the Redis Stream to Postgres or files"
+    )
+    consume_parser.add_argument("--sink", choices=["postgres", "file"], default="postgres")
+    consume_parser.add_argument(
+        "--dir", default="click_events", help="Directory for the gzipped NDJSON files of the file sink"
+    )
+
+    snapshot_parser = commands.add_parser(
+        "build-snapshot", help="Write the memory-mapped snapshot of the most accessed links"
+    )
+    snapshot_parser.add_argument("--path", default=settings.SNAPSHOT_PATH)
+    snapshot_parser.add_argument("--max-links", type=int, default=settings.SNAPSHOT_MAX_LINKS)
+
+    warm_parser = commands.add_parser("warm-cache", help="Preload the hottest links into Redis")
+    warm_parser.add_argument("--source", choices=["access_count", "clicks"], default=settings.WARMUP_SOURCE)
+    warm_parser.add_argument("--max-links", type=int, default=settings.WARMUP_MAX_LINKS)
+    warm_parser.add_argument("--batch-size", type=int, default=settings.WARMUP_BATCH_SIZE)
+
+    return parser.parse_args(argv)
+
+
+def open_path(path: str, mode: str):
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin if mode == "r" else sys.stdout)
+    return open(path, mode, newline="", encoding="utf-8")
+
+
+async def run(args: argparse.Namespace):
+    if args.command == "import":
+        with open_path(args.path, "r") as source:
+            await import_urls(source, detect_format(args.path, args.format), args.chunk_size, args.warm_redis)
+    elif args.command == "export":
+        with open_path(args.path, "w") as sink:
+            await export_urls(sink, detect_format(args.path, args.format), args.chunk_size)
+    elif args.command == "expire-cache":
+        await expire_cached_links(args.ttl, args.chunk_size)
+    elif args.command == "migrate-cache-layout":
+        await migrate_cache_layout(args.source, args.target, args.ttl, args.chunk_size)
+    elif args.command == "consume-click-events":
+        await consume_click_events(args.sink, args.dir)
+    elif args.command == "build-snapshot":
+        await write_link_snapshot(args.path, args.max_links)
+    elif args.command == "warm-cache":
+        await warm_cache(args.source, args.max_links, args.batch_size)
+
+
+def main(argv: list[str] | None = None):
+    asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
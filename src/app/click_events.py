@@ -0,0 +1,225 @@
+import asyncio
+import gzip
+import hashlib
+import ipaddress
+import os
+import socket
+import time
+from datetime import datetime, timezone
+import orjson
+from fastapi import Request
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ResponseError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import sessionmaker
+from .base62 import decode
+from .core.config import settings
+from .core.db import AsyncSessionLocal
+from .core.logger import get_logger
+from .models import ClickEvent
+
+logger = get_logger(__name__)
+
+
+def hash_user_agent(user_agent: str) -> str:
+    return hashlib.sha256(user_agent.encode()).hexdigest()[:16]
+
+
+def client_ip_prefix(host: str) -> str:
+    # Enough to group clicks by network without storing the address itself
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return ""
+    prefix = settings.CLICK_EVENTS_IPV4_PREFIX if address.version == 4 else settings.CLICK_EVENTS_IPV6_PREFIX
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def click_event(short_link: str, request: Request) -> dict[str, str]:
+    # Captured while handling the redirect; the XADD itself happens after the response
+    user_agent = request.headers.get("user-agent")
+    return {
+        "ts": str(int(time.time() * 1000)),
+        "link": short_link,
+        "ref": request.headers.get("referer", ""),
+        "ua": hash_user_agent(user_agent) if user_agent else "",
+        "ip": client_ip_prefix(request.client.host) if request.client else "",
+    }
+
+
+def add_click_event(pipe: Pipeline, event: dict[str, str]):
+    # MAXLEN ~ trims whole radix tree nodes, which keeps XADD O(1)
+    pipe.xadd(
+        settings.CLICK_EVENTS_STREAM,
+        event,
+        maxlen=settings.CLICK_EVENTS_MAX_LEN,
+        approximate=True,
+    )
+
+
+def event_row(id: str, event: dict[str, str]) -> dict:
+    return {
+        "id": id,
+        "clicked_at": datetime.fromtimestamp(int(event["ts"]) / 1000, timezone.utc),
+        "url_id": decode(event["link"]),
+        "referrer": event.get("ref") or None,
+        "user_agent_hash": event.get("ua") or None,
+        "client_ip_prefix": event.get("ip") or None,
+    }
+
+
+class PostgresSink:
+    def __init__(self, session_factory: sessionmaker = AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    async def write(self, entries: list[tuple[str, dict]]):
+        # Keyed by stream entry ID, so events delivered again after a crash are skipped
+        query = insert(ClickEvent).values([event_row(id, event) for id, event in entries])
+        async with self.session_factory() as db:
+            await db.execute(query.on_conflict_do_nothing(index_elements=[ClickEvent.id]))
+            await db.commit()
+
+
+class FileSink:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, moment: datetime) -> str:
+        return os.path.join(self.directory, f"click_events-{moment:%Y%m%d%H}.ndjson.gz")
+
+    async def write(self, entries: list[tuple[str, dict]]):
+        await asyncio.to_thread(self._write, entries)
+
+    def _write(self, entries: list[tuple[str, dict]]):
+        # One gzip member per batch; concatenated members read back as one stream.
+        # Appends are not idempotent: a batch replayed after a crash before XACK is
+        # written again, and readers dedup on the entry ID kept on every line.
+        lines = b"".join(
+            orjson.dumps({"id": id, **event}, option=orjson.OPT_APPEND_NEWLINE) for id, event in entries
+        )
+        with open(self.path(datetime.now(timezone.utc)), "ab") as f:
+            f.write(gzip.compress(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ClickEventConsumer:
+    # One member of the consumer group. Entries are acknowledged only after the
+    # sink has stored them, and a consumer never reads new entries while a batch
+    # is failing, so a slow or broken sink holds the backlog in the stream.
+    def __init__(
+        self,
+        redis: Redis,
+        sink: PostgresSink | FileSink,
+        name: str | None = None,
+        stream: str = settings.CLICK_EVENTS_STREAM,
+        group: str = settings.CLICK_EVENTS_CONSUMER_GROUP,
+        batch_size: int = settings.CLICK_EVENTS_BATCH_SIZE,
+        block_ms: int = settings.CLICK_EVENTS_BLOCK_MS,
+        claim_idle_ms: int = settings.CLICK_EVENTS_CLAIM_IDLE_MS,
+    ):
+        self.redis = redis
+        self.sink = sink
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.stream = stream
+        self.group = group
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        # "0" re-reads this consumer's own unacknowledged entries, ">" reads new ones
+        self._next_id = "0"
+        self._last_claim = 0.0
+        self.events_written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.claimed = 0
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _claim_stale(self) -> list[tuple[str, dict]]:
+        # Entries left pending by a consumer that died are taken over periodically
+        now = time.monotonic()
+        if now - self._last_claim < self.claim_idle_ms / 1000:
+            return []
+        self._last_claim = now
+        _, entries, *_ = await self.redis.xautoclaim(
+            self.stream, self.group, self.name, self.claim_idle_ms, count=self.batch_size
+        )
+        self.claimed += len(entries)
+        return entries
+
+    async def _read(self) -> list[tuple[str, dict]]:
+        block = self.block_ms if self._next_id == ">" else None
+        response = await self.redis.xreadgroup(
+            self.group, self.name, {self.stream: self._next_id}, count=self.batch_size, block=block
+        )
+        entries = response[0][1] if response else []
+        if self._next_id == "0" and not entries:
+            self._next_id = ">"
+        return entries
+
+    async def consume_once(self) -> int:
+        entries = await self._claim_stale() or await self._read()
+        if not entries:
+            return 0
+        # Pending entries that the MAXLEN cap trimmed come back without fields
+        events = [(id, event) for id, event in entries if event]
+        try:
+            if events:
+                await self.sink.write(events)
+        except Exception:
+            # Retry the same entries, which are still pending for this consumer
+            self._next_id = "0"
+            raise
+        await self.redis.xack(self.stream, self.group, *(id for id, _ in entries))
+        self.events_written += len(events)
+        self.batches += 1
+        return len(events)
+
+    async def run(self):
+        await self.ensure_group()
+        failures = 0
+        next_report = time.monotonic() + settings.CLICK_EVENTS_STATS_INTERVAL_SECONDS
+        while True:
+            try:
+                await self.consume_once()
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed_batches += 1
+                failures += 1
+                delay = min(2 ** failures * 0.1, settings.CLICK_EVENTS_RETRY_MAX_SECONDS)
+                logger.error(f"Failed to write click events, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + settings.CLICK_EVENTS_STATS_INTERVAL_SECONDS
+                logger.info(f"Click event consumer: {await self.stats()}")
+
+    async def stats(self) -> dict:
+        stats = {
+            "consumer": self.name,
+            "events_written": self.events_written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "claimed": self.claimed,
+        }
+        try:
+            groups = await self.redis.xinfo_groups(self.stream)
+            group = next(group for group in groups if group["name"] == self.group)
+            # lag: entries not yet delivered to the group (Redis 7+); pending: delivered, not acked
+            stats.update(
+                stream_length=await self.redis.xlen(self.stream),
+                lag=group.get("lag"),
+                pending=group["pending"],
+            )
+        except Exception as e:
+            logger.warning(f"Could not read click event stream lag: {e}")
+        return stats
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from enum import Enum
+from typing import Literal
 from dotenv import find_dotenv, load_dotenv
 
 load_dotenv(find_dotenv(".env"))
@@ -21,6 +22,23 @@ class PostgresSettings(BaseSettings):
     DB_USER: str = "postgres"
     DB_PASSWORD: str = "password"
     DB_NAME: str = "db"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WARM_CONNECTIONS: int = 5
+    # Comma-separated postgresql+asyncpg:// DSNs of read replicas. Redirect and stats
+    # lookups go to one of them and only fall back to the primary on a miss or error.
+    DB_REPLICA_URLS: str = ""
+    DB_REPLICA_SELECTION: Literal["round_robin", "least_latency"] = "round_robin"
+    # A replica that fails a read is skipped for this long
+    DB_REPLICA_RETRY_SECONDS: float = 5.0
+    # Comma-separated postgresql:// DSNs of shards 1..N; shard 0 is the DB_* database.
+    # A shard's position is part of every id it issued, so only ever append to the list.
+    DB_SHARD_URLS: str = ""
+    # Comma-separated shard numbers that take new links; empty for all of them
+    DB_WRITE_SHARDS: str = ""
 
     @property
     def POSTGRES_SYNC_URL(self) -> str:
@@ -30,19 +48,226 @@ class PostgresSettings(BaseSettings):
     def POSTGRES_ASYNC_URL(self) -> str:
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def POSTGRES_SHARD_SYNC_URLS(self) -> list[str]:
+        return [self.POSTGRES_SYNC_URL] + [url.strip() for url in self.DB_SHARD_URLS.split(",") if url.strip()]
+
+    @property
+    def POSTGRES_SHARD_ASYNC_URLS(self) -> list[str]:
+        return [self.POSTGRES_ASYNC_URL] + [
+            url.replace("postgresql://", "postgresql+asyncpg://", 1) for url in self.POSTGRES_SHARD_SYNC_URLS[1:]
+        ]
+
+    @property
+    def DB_WRITE_SHARD_LIST(self) -> list[int]:
+        shards = [int(shard) for shard in self.DB_WRITE_SHARDS.split(",") if shard.strip()]
+        return shards or list(range(len(self.POSTGRES_SHARD_SYNC_URLS)))
+
+    @property
+    def POSTGRES_REPLICA_URLS(self) -> list[str]:
+        return [url.strip() for url in self.DB_REPLICA_URLS.split(",") if url.strip()]
+
 
 class RedisSettings(BaseSettings):
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str | None = None
     REDIS_DB: int = 0
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0
+    # Read timeout stays unset by default: pub/sub connections block on reads indefinitely
+    REDIS_SOCKET_TIMEOUT: float | None = None
+    REDIS_SOCKET_CONNECT_TIMEOUT: float | None = 2.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    REDIS_POOL_WARM_CONNECTIONS: int = 5
 
     @property
     def REDIS_URL(self) -> str:
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}"
 
 
-class Settings(Environment, PostgresSettings, RedisSettings):
+class LocalCacheSettings(BaseSettings):
+    L1_CACHE_ENABLED: bool = True
+    L1_CACHE_MAX_SIZE: int = 10000
+    L1_CACHE_TTL_SECONDS: float = 60.0
+    L1_CACHE_INVALIDATION_CHANNEL: str = "shortlink:invalidate"
+
+
+class AccessCountSettings(BaseSettings):
+    ACCESS_COUNT_FLUSH_INTERVAL_SECONDS: float = 1.0
+    # Each row is two bind parameters; asyncpg allows at most 32767 per statement
+    ACCESS_COUNT_FLUSH_BATCH_SIZE: int = 1000
+    ACCESS_COUNT_FLUSH_LOCK_TIMEOUT_SECONDS: float = 30.0
+
+
+class CreateBatchSettings(BaseSettings):
+    CREATE_BATCH_ENABLED: bool = True
+    CREATE_BATCH_MAX_SIZE: int = 500
+    # Upper bound on the extra latency a create waits for others to join its batch
+    CREATE_BATCH_MAX_WAIT_MS: float = 2.0
+    # Maximum number of URLs accepted by one POST /create/batch call
+    CREATE_BATCH_ENDPOINT_MAX_URLS: int = 10000
+
+
+class LookupGuardSettings(BaseSettings):
+    # First id handed out by urls_id_seq; lower ids were never allocated
+    URL_ID_MIN: int = 100000000
+    # How often a worker may re-read the sequence to learn about newly reserved ids
+    URL_ID_RANGE_REFRESH_SECONDS: float = 1.0
+    NEGATIVE_CACHE_ENABLED: bool = True
+    NEGATIVE_CACHE_LOCAL_MAX_SIZE: int = 100000
+    NEGATIVE_CACHE_LOCAL_TTL_SECONDS: float = 5.0
+    NEGATIVE_CACHE_REDIS_TTL_SECONDS: int = 60
+
+
+class SingleFlightSettings(BaseSettings):
+    SINGLE_FLIGHT_ENABLED: bool = True
+    # Cross-worker lease: only the holder loads a missing link from the DB, the
+    # others poll Redis for the value it writes
+    SINGLE_FLIGHT_LEASE_ENABLED: bool = False
+    SINGLE_FLIGHT_LEASE_TTL_MS: int = 2000
+    SINGLE_FLIGHT_LEASE_WAIT_MS: int = 200
+    SINGLE_FLIGHT_LEASE_POLL_MS: int = 10
+
+
+class LinkCacheSettings(BaseSettings):
+    # Redis TTLs for shortlink:<code> keys; 0 keeps keys forever
+    # TTL of a link loaded on a miss, raised back to this value on every Redis hit
+    LINK_CACHE_TTL_SECONDS: int = 86400
+    # Links that are created but never accessed only occupy memory for this long
+    LINK_CACHE_NEW_LINK_TTL_SECONDS: int = 3600
+    # Links with at least LINK_CACHE_HOT_MIN_CLICKS clicks between two access count
+    # flushes are kept for this long
+    LINK_CACHE_HOT_TTL_SECONDS: int = 604800
+    LINK_CACHE_HOT_MIN_CLICKS: int = 10
+    # "string": one key per link. "hash": links grouped into hashes of
+    # LINK_CACHE_BUCKET_SIZE ids, which must not exceed Redis' hash-max-listpack-entries.
+    LINK_CACHE_LAYOUT: Literal["string", "hash"] = "string"
+    LINK_CACHE_BUCKET_SIZE: int = 100
+    # Comma-separated redis:// URLs of dedicated link cache nodes, spread over with
+    # consistent hashing. Empty keeps the link cache on the Redis configured above.
+    LINK_CACHE_REDIS_NODES: str = ""
+    LINK_CACHE_REDIS_VNODES: int = 160
+    # A node that fails a command is skipped, as a cache miss, for this long
+    LINK_CACHE_REDIS_RETRY_SECONDS: float = 5.0
+    # Short, so a hung node turns into a miss instead of a slow redirect
+    LINK_CACHE_REDIS_SOCKET_TIMEOUT: float = 0.25
+
+    @property
+    def LINK_CACHE_REDIS_NODE_URLS(self) -> list[str]:
+        return [url.strip() for url in self.LINK_CACHE_REDIS_NODES.split(",") if url.strip()]
+
+
+class DedupSettings(BaseSettings):
+    # Creating a link for a long URL that already has one returns the existing link
+    DEDUP_ENABLED: bool = False
+    # Redis TTL of the long URL digest -> short link entries in front of the index
+    DEDUP_REDIS_TTL_SECONDS: int = 86400
+
+
+class ClickRollupSettings(BaseSettings):
+    # Hourly click counts per link, flushed with the access counts into url_clicks_hourly
+    CLICK_ROLLUP_ENABLED: bool = True
+    # Largest number of buckets a single timeseries request may return
+    CLICK_TIMESERIES_MAX_POINTS: int = 2000
+
+
+class ClickEventSettings(BaseSettings):
+    # Raw click events appended to a Redis Stream by redirects and written out by
+    # the consume-click-events worker
+    CLICK_EVENTS_ENABLED: bool = False
+    CLICK_EVENTS_STREAM: str = "click_events"
+    # Approximate cap on the stream; the oldest events are trimmed when consumers fall behind
+    CLICK_EVENTS_MAX_LEN: int = 1000000
+    CLICK_EVENTS_CONSUMER_GROUP: str = "click_event_writers"
+    CLICK_EVENTS_BATCH_SIZE: int = 500
+    CLICK_EVENTS_BLOCK_MS: int = 1000
+    # Events read by a consumer that has been silent this long are taken over by another
+    CLICK_EVENTS_CLAIM_IDLE_MS: int = 60000
+    CLICK_EVENTS_RETRY_MAX_SECONDS: float = 30.0
+    CLICK_EVENTS_STATS_INTERVAL_SECONDS: float = 60.0
+    # Client addresses are truncated to these prefix lengths before they are stored
+    CLICK_EVENTS_IPV4_PREFIX: int = 24
+    CLICK_EVENTS_IPV6_PREFIX: int = 48
+
+
+class StatsCacheSettings(BaseSettings):
+    # Per-worker cache of the stats read from the DB. An entry is only reused until
+    # the next access count flush, so this TTL mostly bounds memory.
+    STATS_CACHE_ENABLED: bool = True
+    STATS_CACHE_MAX_SIZE: int = 10000
+    STATS_CACHE_TTL_SECONDS: float = 30.0
+    # Cache-Control max-age of stats responses; 0 makes clients revalidate every time
+    STATS_MAX_AGE_SECONDS: int = 1
+
+
+class RedirectSettings(BaseSettings):
+    # Serve GET /{short_link} from a plain ASGI handler in front of FastAPI
+    REDIRECT_FAST_PATH_ENABLED: bool = False
+    # 301/308 responses may be cached by browsers and CDNs for REDIRECT_MAX_AGE_SECONDS,
+    # so repeat clicks do not reach the service and are not counted. 302/307
+    # responses are sent with no-store, so every click is counted.
+    REDIRECT_STATUS_CODE: Literal[301, 302, 307, 308] = 307
+    REDIRECT_MAX_AGE_SECONDS: int = 86400
+
+
+class SnapshotSettings(BaseSettings):
+    # Read-only file of the most accessed links, memory-mapped by every worker on the host
+    SNAPSHOT_ENABLED: bool = False
+    # tmpfs keeps the file in memory; every worker on a host must use the same path
+    SNAPSHOT_PATH: str = "/dev/shm/shortlink-hot-links.snapshot"
+    SNAPSHOT_MAX_LINKS: int = 100000
+    # One worker per host rebuilds the file once it is this old
+    SNAPSHOT_REBUILD_SECONDS: float = 300.0
+    # How often workers look for a rebuilt file
+    SNAPSHOT_CHECK_SECONDS: float = 5.0
+
+
+class WarmupSettings(BaseSettings):
+    # Preload the hottest links into Redis and the L1 cache at startup. /health
+    # answers 503 until it finishes or WARMUP_BUDGET_SECONDS runs out.
+    WARMUP_ENABLED: bool = False
+    # Rank links by their total access_count, or by their clicks in the last
+    # WARMUP_CLICKS_WINDOW_HOURS of hourly rollups
+    WARMUP_SOURCE: Literal["access_count", "clicks"] = "access_count"
+    WARMUP_CLICKS_WINDOW_HOURS: int = 24
+    WARMUP_MAX_LINKS: int = 50000
+    # Rows per streamed page, and per Redis pipeline
+    WARMUP_BATCH_SIZE: int = 1000
+    WARMUP_BUDGET_SECONDS: float = 30.0
+
+
+class LoggingSettings(BaseSettings):
+    # Defaults to WARNING in production, INFO in staging and DEBUG elsewhere
+    LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR"] | None = None
+    # "json" writes one orjson object per line, for log shippers
+    LOG_FORMAT: Literal["text", "json"] = "text"
+    LOG_FILE_ENABLED: bool = True
+    # Records waiting for the writer thread; further records are dropped and counted
+    LOG_QUEUE_SIZE: int = 10000
+    # Share of per-request log lines below ERROR that are kept, from 0.0 to 1.0
+    LOG_REQUEST_SAMPLE_RATE: float = 1.0
+
+
+class Settings(
+    Environment,
+    PostgresSettings,
+    RedisSettings,
+    LocalCacheSettings,
+    AccessCountSettings,
+    CreateBatchSettings,
+    LookupGuardSettings,
+    SingleFlightSettings,
+    LinkCacheSettings,
+    DedupSettings,
+    ClickRollupSettings,
+    ClickEventSettings,
+    SnapshotSettings,
+    RedirectSettings,
+    StatsCacheSettings,
+    WarmupSettings,
+    LoggingSettings,
+):
     pass
 
 
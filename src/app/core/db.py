@@ -1,12 +1,129 @@
-from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import asyncio
+import contextlib
+import time
+from typing import AsyncGenerator, Awaitable, Callable, TypeVar
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, MappedAsDataclass, sessionmaker
 from .config import settings
 
-async_engine = create_async_engine(settings.POSTGRES_ASYNC_URL, echo=False, future=True)
-AsyncSessionLocal = sessionmaker(
-    autocommit=False, autoflush=False, bind=async_engine, class_=AsyncSession
-)
+T = TypeVar("T")
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+
+
+def _create_session_factory(engine: AsyncEngine) -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+
+
+# The engine owns the per-worker connection pool. Creating it does not connect;
+# connections are opened lazily or up front by warm_db_pool().
+async_engine = _create_engine(settings.POSTGRES_ASYNC_URL)
+AsyncSessionLocal = _create_session_factory(async_engine)
+
+
+class Shards:
+    # One engine per shard; shard 0 is the primary engine above
+    def __init__(self, urls: list[str]):
+        self.engines = [async_engine] + [_create_engine(url) for url in urls[1:]]
+        self.session_factories = [AsyncSessionLocal] + [
+            _create_session_factory(engine) for engine in self.engines[1:]
+        ]
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    @contextlib.asynccontextmanager
+    async def session(self, shard: int, db: AsyncSession | None = None) -> AsyncGenerator[AsyncSession, None]:
+        # Shard 0 reuses the request's session when there is one
+        if shard == 0 and db is not None:
+            yield db
+            return
+        async with self.session_factories[shard]() as session:
+            yield session
+
+    async def dispose(self):
+        await asyncio.gather(*(engine.dispose() for engine in self.engines[1:]))
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "host": f"{engine.url.host}:{engine.url.port}",
+                "idle": engine.pool.checkedin(),
+                "in_use": engine.pool.checkedout(),
+            }
+            for engine in self.engines
+        ]
+
+
+shards = Shards(settings.POSTGRES_SHARD_ASYNC_URLS)
+
+
+class ReadReplicas:
+    def __init__(self, urls: list[str], selection: str = settings.DB_REPLICA_SELECTION):
+        self.engines = [_create_engine(url) for url in urls]
+        self.session_factories = [_create_session_factory(engine) for engine in self.engines]
+        self.selection = selection
+        # Moving average of each replica's read latency, in seconds
+        self.latencies = [0.0] * len(urls)
+        self.failed_until = [0.0] * len(urls)
+        self.reads = [0] * len(urls)
+        self.failures = [0] * len(urls)
+        self._turn = 0
+
+    def choose(self) -> int | None:
+        now = time.monotonic()
+        healthy = [i for i, until in enumerate(self.failed_until) if until <= now]
+        if not healthy:
+            return None
+        if self.selection == "least_latency":
+            return min(healthy, key=lambda i: self.latencies[i])
+        self._turn += 1
+        return healthy[self._turn % len(healthy)]
+
+    async def run(self, index: int, read: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        started = time.monotonic()
+        try:
+            async with self.session_factories[index]() as session:
+                result = await read(session)
+        except Exception:
+            self.failures[index] += 1
+            self.failed_until[index] = time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+            raise
+        self.reads[index] += 1
+        self.latencies[index] = 0.8 * self.latencies[index] + 0.2 * (time.monotonic() - started)
+        return result
+
+    async def dispose(self):
+        await asyncio.gather(*(engine.dispose() for engine in self.engines))
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "host": f"{engine.url.host}:{engine.url.port}",
+                "healthy": self.failed_until[i] <= now,
+                "latency_ms": self.latencies[i] * 1000,
+                "reads": self.reads[i],
+                "failures": self.failures[i],
+                "in_use": engine.pool.checkedout(),
+            }
+            for i, engine in enumerate(self.engines)
+        ]
+
+
+read_replicas = ReadReplicas(settings.POSTGRES_REPLICA_URLS)
 
 
 class Base(DeclarativeBase, MappedAsDataclass):
@@ -16,3 +133,34 @@ class Base(DeclarativeBase, MappedAsDataclass):
 async def async_get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def _open_connection():
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def warm_db_pool(connections: int = settings.DB_POOL_WARM_CONNECTIONS):
+    # Open the connections concurrently so each one is a distinct pooled connection
+    connections = min(connections, settings.DB_POOL_SIZE)
+    await asyncio.gather(*(_open_connection() for _ in range(connections)))
+
+
+async def close_db_pool():
+    await async_engine.dispose()
+    await shards.dispose()
+    await read_replicas.dispose()
+
+
+def get_db_pool_stats() -> dict:
+    pool = async_engine.pool
+    checked_out = pool.checkedout()
+    capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "idle": pool.checkedin(),
+        "in_use": checked_out,
+        "overflow": pool.overflow(),
+        "utilization": checked_out / capacity if capacity else 0.0,
+    }
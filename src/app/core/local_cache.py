@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import OrderedDict
+from redis.asyncio import Redis
+from .config import settings
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Message published on the invalidation channel to drop every entry at once
+INVALIDATE_ALL = "*"
+
+
+class LocalCache:
+    def __init__(self, max_size: int, ttl_seconds: float, enabled: bool = True):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled and max_size > 0
+        # key -> (value, expires_at); ordered from least to most recently used
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def reset_stats(self) -> None:
+        self.hits = self.misses = self.evictions = 0
+        self.expirations = self.invalidations = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+local_cache = LocalCache(
+    max_size=settings.L1_CACHE_MAX_SIZE,
+    ttl_seconds=settings.L1_CACHE_TTL_SECONDS,
+    enabled=settings.L1_CACHE_ENABLED,
+)
+
+# Short links confirmed missing, so repeated lookups of unknown codes stay in-process
+negative_cache = LocalCache(
+    max_size=settings.NEGATIVE_CACHE_LOCAL_MAX_SIZE,
+    ttl_seconds=settings.NEGATIVE_CACHE_LOCAL_TTL_SECONDS,
+    enabled=settings.NEGATIVE_CACHE_ENABLED,
+)
+
+# Stats read from the DB, as (long URL, access count, access count flush generation)
+stats_cache = LocalCache(
+    max_size=settings.STATS_CACHE_MAX_SIZE,
+    ttl_seconds=settings.STATS_CACHE_TTL_SECONDS,
+    enabled=settings.STATS_CACHE_ENABLED,
+)
+
+
+def handle_invalidation_message(cache: LocalCache, key: str) -> None:
+    if key == INVALIDATE_ALL:
+        cache.clear()
+    else:
+        cache.invalidate(key)
+
+
+async def listen_for_invalidations(
+    redis: Redis, cache: LocalCache = local_cache, retry_delay: float = 1.0
+):
+    channel = settings.L1_CACHE_INVALIDATION_CHANNEL
+    while True:
+        try:
+            async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(channel)
+                # Anything published while we were not subscribed is lost, so start clean
+                cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        handle_invalidation_message(cache, message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"L1 cache invalidation listener failed, retrying: {e}")
+            cache.clear()
+            await asyncio.sleep(retry_delay)
@@ -1,35 +1,108 @@
+import atexit
 import os
 import logging
+import queue
+import random
 import sys
-from .config import settings
-from logging.handlers import RotatingFileHandler
+import orjson
+from .config import settings, EnvironmentOption
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # Use current working directory for logs
 LOG_DIR = os.path.join(os.getcwd(), "logs")
-if not os.path.exists(LOG_DIR):
+if settings.LOG_FILE_ENABLED and not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
 LOG_FILE_PATH = os.path.join(LOG_DIR, "app.log")
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        RotatingFileHandler(LOG_FILE_PATH, maxBytes=10485760, backupCount=5),
-    ],
+ENVIRONMENT_LEVELS = {
+    EnvironmentOption.PRODUCTION: logging.WARNING,
+    EnvironmentOption.STAGING: logging.INFO,
+}
+LOG_LEVEL = logging.getLevelName(settings.LOG_LEVEL) if settings.LOG_LEVEL else (
+    ENVIRONMENT_LEVELS.get(settings.ENVIRONMENT, logging.DEBUG)
 )
 
 
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    # Hands records to the writer thread as they are. The stock prepare() formats
+    # the message in the caller, which would put the formatting back on the event
+    # loop; the records stay in this process, so there is nothing to make picklable.
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        # A writer that falls behind costs log lines, never a blocked event loop
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SampledLogger(logging.LoggerAdapter):
+    # For per-request lines: keeps a `rate` share of the records below ERROR. The
+    # dice are rolled before the record is built, so a dropped line costs nothing.
+    def __init__(self, logger: logging.Logger, rate: float):
+        super().__init__(logger, {})
+        self.rate = rate
+
+    def isEnabledFor(self, level: int) -> bool:
+        if level < logging.ERROR and self.rate < 1.0 and random.random() >= self.rate:
+            return False
+        return self.logger.isEnabledFor(level)
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+
+def create_handlers() -> list[logging.Handler]:
+    formatter = JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT, DATE_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if settings.LOG_FILE_ENABLED:
+        handlers.append(RotatingFileHandler(LOG_FILE_PATH, maxBytes=10485760, backupCount=5))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+# Stream writes and file rotation happen on the listener's thread, off the event loop
+log_queue: queue.Queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+queue_handler = NonBlockingQueueHandler(log_queue)
+log_listener = QueueListener(log_queue, *create_handlers(), respect_handler_level=True)
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+log_listener.start()
+# Flushes the records still queued on shutdown
+atexit.register(log_listener.stop)
+
+
 def get_logger(name: str):
     logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    return logger
 
-    if settings.ENVIRONMENT == "PRODUCTION":
-        logger.setLevel(logging.WARNING)
-    elif settings.ENVIRONMENT == "STAGING":
-        logger.setLevel(logging.INFO)
-    else:  # Development and other environments
-        logger.setLevel(logging.DEBUG)
 
-    return logger
+def get_request_logger(name: str) -> SampledLogger:
+    return SampledLogger(get_logger(name), settings.LOG_REQUEST_SAMPLE_RATE)
+
+
+def logging_stats() -> dict:
+    return {"queued": log_queue.qsize(), "dropped": queue_handler.dropped}
@@ -1,17 +1,197 @@
-from typing import AsyncGenerator
+import asyncio
+import bisect
+import hashlib
+import time
+import uuid
+from typing import AsyncGenerator, Awaitable, Callable, TypeVar
 import redis.asyncio as redis
+from redis import exceptions
 from .config import settings
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# One pool per worker process, shared by every request. Creating it does not open
+# any connection; they are opened lazily or up front by warm_redis_pool().
+redis_pool = redis.BlockingConnectionPool(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    password=settings.REDIS_PASSWORD,
+    db=settings.REDIS_DB,
+    decode_responses=True,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+
+def get_redis_client() -> redis.Redis:
+    return redis_client
 
 
 async def async_get_redis() -> AsyncGenerator[redis.Redis, None]:
-    session = redis.Redis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        password=settings.REDIS_PASSWORD,
-        db=settings.REDIS_DB,
-        decode_responses=True,
+    # The client only borrows connections from the shared pool, so there is
+    # nothing to close at the end of the request
+    yield redis_client
+
+
+async def warm_redis_pool(connections: int = settings.REDIS_POOL_WARM_CONNECTIONS):
+    connections = min(connections, redis_pool.max_connections)
+    acquired = await asyncio.gather(
+        *(redis_pool.get_connection("PING") for _ in range(connections)),
+        return_exceptions=True,
     )
-    try:
-        yield session
-    finally:
-        await session.aclose()
+    errors = [conn for conn in acquired if isinstance(conn, BaseException)]
+    for conn in acquired:
+        if not isinstance(conn, BaseException):
+            await redis_pool.release(conn)
+    if errors:
+        raise errors[0]
+
+
+async def close_redis_pool():
+    await redis_pool.disconnect()
+    await link_cache_nodes.disconnect()
+
+
+def get_redis_pool_stats() -> dict:
+    idle = len(redis_pool._available_connections)
+    in_use = len(redis_pool._in_use_connections)
+    return {
+        "max_connections": redis_pool.max_connections,
+        "open": idle + in_use,
+        "idle": idle,
+        "in_use": in_use,
+        "utilization": in_use / redis_pool.max_connections,
+    }
+
+
+def ring_hash(data: str) -> bytes:
+    return hashlib.md5(data.encode()).digest()
+
+
+def ring_points(name: str, vnodes: int) -> list[int]:
+    # Ketama: each MD5 digest yields four 32-bit points
+    points = []
+    for i in range(max(vnodes // 4, 1)):
+        digest = ring_hash(f"{name}-{i}")
+        points.extend(int.from_bytes(digest[j:j + 4], "little") for j in range(0, 16, 4))
+    return points
+
+
+class RedisRing:
+    # Client-side consistent hashing over several Redis nodes. A node's points on
+    # the ring are derived from its host:port, not its position in the list, so
+    # adding or removing a node only moves the keys on that node's arcs.
+    def __init__(
+        self,
+        urls: list[str],
+        vnodes: int = settings.LINK_CACHE_REDIS_VNODES,
+        retry_seconds: float = settings.LINK_CACHE_REDIS_RETRY_SECONDS,
+    ):
+        self.pools = [
+            redis.BlockingConnectionPool.from_url(
+                url,
+                decode_responses=True,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                timeout=settings.REDIS_POOL_TIMEOUT,
+                socket_timeout=settings.LINK_CACHE_REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            )
+            for url in urls
+        ]
+        self.clients = [redis.Redis(connection_pool=pool) for pool in self.pools]
+        self.names = [
+            f"{pool.connection_kwargs.get('host', 'localhost')}:{pool.connection_kwargs.get('port', 6379)}"
+            for pool in self.pools
+        ]
+        ring = sorted((point, node) for node, name in enumerate(self.names) for point in ring_points(name, vnodes))
+        self._points = [point for point, _ in ring]
+        self._nodes = [node for _, node in ring]
+        self.retry_seconds = retry_seconds
+        self.failed_until = [0.0] * len(urls)
+        self.failures = [0] * len(urls)
+        self.skipped = [0] * len(urls)
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def node(self, key: str) -> int:
+        # The first point at or after the key's hash, wrapping around
+        index = bisect.bisect_left(self._points, int.from_bytes(ring_hash(key)[:4], "little"))
+        return self._nodes[index % len(self._points)]
+
+    async def run(self, node: int, command: Callable[[redis.Redis], Awaitable[T]], default: T = None) -> T:
+        # An unreachable node answers with the default for retry_seconds instead of
+        # failing the request; other nodes keep their keys
+        if self.failed_until[node] > time.monotonic():
+            self.skipped[node] += 1
+            return default
+        try:
+            return await command(self.clients[node])
+        except (exceptions.ConnectionError, exceptions.TimeoutError) as e:
+            self.failures[node] += 1
+            self.failed_until[node] = time.monotonic() + self.retry_seconds
+            logger.warning(f"Redis node {self.names[node]} failed, skipping it for {self.retry_seconds}s: {e}")
+            return default
+
+    async def disconnect(self):
+        await asyncio.gather(*(pool.disconnect() for pool in self.pools))
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "host": name,
+                "healthy": self.failed_until[i] <= now,
+                "failures": self.failures[i],
+                "skipped": self.skipped[i],
+                "in_use": len(self.pools[i]._in_use_connections),
+            }
+            for i, name in enumerate(self.names)
+        ]
+
+
+link_cache_nodes = RedisRing(settings.LINK_CACHE_REDIS_NODE_URLS)
+
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+# Pushes the expiry of a lock back, as long as it is still held with this token
+EXTEND_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+async def acquire_lock(client: redis.Redis, key: str, ttl_ms: int) -> str | None:
+    # Returns the token needed to release the lock, or None if someone else holds it.
+    # The lock expires after ttl_ms in case its holder dies.
+    token = uuid.uuid4().hex
+    if await client.set(key, token, nx=True, px=ttl_ms):
+        return token
+    return None
+
+
+async def release_lock(client: redis.Redis, key: str, token: str):
+    # Only deletes the lock if it is still ours and has not expired and been re-taken
+    await client.eval(RELEASE_LOCK_SCRIPT, 1, key, token)
+
+
+async def extend_lock(client: redis.Redis, key: str, token: str, ttl_ms: int) -> bool:
+    # False once the lock has expired, and possibly been taken by someone else
+    return bool(await client.eval(EXTEND_LOCK_SCRIPT, 1, key, token, ttl_ms))
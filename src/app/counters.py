@@ -0,0 +1,228 @@
+import asyncio
+import contextlib
+from typing import Awaitable, Callable
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from .analytics import apply_click_rollups, parse_rollup_field
+from .base62 import encode
+from .core.config import settings
+from .core.db import AsyncSessionLocal
+from .core.logger import get_logger
+from .core.redis import acquire_lock, extend_lock, get_redis_client, release_lock
+from .link_cache import extend_link_ttls
+from .services import (
+    REDIS_ACCESS_COUNT_FLUSHING_KEY,
+    REDIS_ACCESS_COUNT_GENERATION_KEY,
+    REDIS_ACCESS_COUNT_PENDING_KEY,
+    REDIS_CLICK_ROLLUP_FLUSHING_KEY,
+    REDIS_CLICK_ROLLUP_PENDING_KEY,
+    apply_access_count_deltas,
+)
+from .sharding import shard_of
+
+logger = get_logger(__name__)
+
+# Only one worker flushes at a time; the lock expires in case the holder dies
+REDIS_ACCESS_COUNT_LOCK_KEY = "access_count:flush_lock"
+REDIS_CLICK_ROLLUP_LOCK_KEY = "click_rollup:flush_lock"
+
+
+async def _claim_pending(redis: Redis, pending_key: str, flushing_key: str) -> bool:
+    # A flushing hash left behind by a worker that died mid-flush is applied first
+    if await redis.exists(flushing_key):
+        return True
+    try:
+        await redis.rename(pending_key, flushing_key)
+    except ResponseError:
+        # No such key: nothing was clicked since the last flush
+        return False
+    return True
+
+
+async def _flush_pending(
+    redis: Redis,
+    pending_key: str,
+    flushing_key: str,
+    lock_key: str,
+    apply_batch: Callable[[dict[str, str], AsyncSession], Awaitable[int]],
+    session_factory: sessionmaker,
+    batch_size: int,
+    split_batch: Callable[[dict[str, str]], list[dict[str, str]]] = lambda batch: [batch],
+) -> int:
+    lock_timeout_ms = int(settings.ACCESS_COUNT_FLUSH_LOCK_TIMEOUT_SECONDS * 1000)
+    token = await acquire_lock(redis, lock_key, lock_timeout_ms)
+    if token is None:
+        return 0
+
+    flushed = 0
+    try:
+        if not await _claim_pending(redis, pending_key, flushing_key):
+            return 0
+
+        async with session_factory() as db:
+            cursor = 0
+            while True:
+                cursor, items = await redis.hscan(flushing_key, cursor, count=batch_size)
+                fields = list(items.items())
+                for start in range(0, len(fields), batch_size):
+                    # A long flush, such as a backlog drained after a DB outage, must
+                    # not outlive its lock: another worker would then apply the same
+                    # fields. Whatever is left stays in the flushing hash for the next holder.
+                    if not await extend_lock(redis, lock_key, token, lock_timeout_ms):
+                        logger.warning(f"Lost {lock_key} after flushing {flushed}; leaving the rest to its holder")
+                        return flushed
+                    batch = dict(fields[start:start + batch_size])
+                    # Each part commits on its own. Its fields are dropped right after
+                    # that commit, so a failure in a later part or later in the flush
+                    # never applies them a second time.
+                    for part in split_batch(batch):
+                        flushed += await apply_batch(part, db)
+                        await redis.hdel(flushing_key, *part.keys())
+                if cursor == 0:
+                    break
+
+        await redis.delete(flushing_key)
+    finally:
+        await release_lock(redis, lock_key, token)
+
+    return flushed
+
+
+async def flush_access_counts(
+    redis: Redis,
+    session_factory: sessionmaker = AsyncSessionLocal,
+    batch_size: int = settings.ACCESS_COUNT_FLUSH_BATCH_SIZE,
+) -> int:
+    async def apply_batch(batch: dict[str, str], db: AsyncSession) -> int:
+        deltas = {int(id): int(delta) for id, delta in batch.items()}
+        await apply_access_count_deltas(deltas, db)
+        # After the commit, so stats cached from then on already include the batch
+        await redis.incr(REDIS_ACCESS_COUNT_GENERATION_KEY)
+        await _retain_hot_links(deltas, redis)
+        return sum(deltas.values())
+
+    return await _flush_pending(
+        redis,
+        REDIS_ACCESS_COUNT_PENDING_KEY,
+        REDIS_ACCESS_COUNT_FLUSHING_KEY,
+        REDIS_ACCESS_COUNT_LOCK_KEY,
+        apply_batch,
+        session_factory,
+        batch_size,
+        _split_by_shard,
+    )
+
+
+def _split_by_shard(batch: dict[str, str]) -> list[dict[str, str]]:
+    # Every shard commits separately, so each shard's deltas are applied and dropped as one part
+    by_shard: dict[int, dict[str, str]] = {}
+    for id, delta in batch.items():
+        by_shard.setdefault(shard_of(int(id)), {})[id] = delta
+    return list(by_shard.values())
+
+
+async def flush_click_rollups(
+    redis: Redis,
+    session_factory: sessionmaker = AsyncSessionLocal,
+    batch_size: int = settings.ACCESS_COUNT_FLUSH_BATCH_SIZE,
+) -> int:
+    async def apply_batch(batch: dict[str, str], db: AsyncSession) -> int:
+        counts = {parse_rollup_field(field): int(clicks) for field, clicks in batch.items()}
+        await apply_click_rollups(counts, db)
+        return sum(counts.values())
+
+    return await _flush_pending(
+        redis,
+        REDIS_CLICK_ROLLUP_PENDING_KEY,
+        REDIS_CLICK_ROLLUP_FLUSHING_KEY,
+        REDIS_CLICK_ROLLUP_LOCK_KEY,
+        apply_batch,
+        session_factory,
+        batch_size,
+    )
+
+
+async def _retain_hot_links(deltas: dict[int, int], redis: Redis):
+    # The deltas are the clicks since the last flush, which makes them a cheap
+    # popularity signal for keeping frequently used links cached longer
+    hot = [encode(id) for id, delta in deltas.items() if delta >= settings.LINK_CACHE_HOT_MIN_CLICKS]
+    if not hot or not settings.LINK_CACHE_HOT_TTL_SECONDS:
+        return
+    try:
+        await extend_link_ttls(redis, hot, settings.LINK_CACHE_HOT_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Failed to extend the cache TTL of {len(hot)} hot links: {e}")
+
+
+class AccessCountFlusher:
+    def __init__(
+        self,
+        redis: Redis,
+        interval: float = settings.ACCESS_COUNT_FLUSH_INTERVAL_SECONDS,
+        batch_size: int = settings.ACCESS_COUNT_FLUSH_BATCH_SIZE,
+        session_factory: sessionmaker = AsyncSessionLocal,
+    ):
+        self.redis = redis
+        self.interval = interval
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+        self.flushed_total = 0
+        self.failed_flushes = 0
+        self.rollup_clicks_total = 0
+        self.failed_rollup_flushes = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        # Drain whatever is pending so the DB is up to date on shutdown
+        await self.flush()
+
+    async def flush(self) -> int:
+        try:
+            flushed = await flush_access_counts(
+                self.redis, self.session_factory, self.batch_size
+            )
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error(f"Failed to flush access counts: {e}", exc_info=True)
+            return 0
+        self.flushed_total += flushed
+        if settings.CLICK_ROLLUP_ENABLED:
+            await self.flush_rollups()
+        return flushed
+
+    async def flush_rollups(self):
+        try:
+            self.rollup_clicks_total += await flush_click_rollups(
+                self.redis, self.session_factory, self.batch_size
+            )
+        except Exception as e:
+            self.failed_rollup_flushes += 1
+            logger.error(f"Failed to flush click rollups: {e}", exc_info=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "batch_size": self.batch_size,
+            "flushed_total": self.flushed_total,
+            "failed_flushes": self.failed_flushes,
+            "rollup_clicks_total": self.rollup_clicks_total,
+            "failed_rollup_flushes": self.failed_rollup_flushes,
+        }
+
+
+access_count_flusher = AccessCountFlusher(get_redis_client())
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from .base62 import encode
+from .core.config import settings
+from .core.db import shards
+from .core.logger import get_logger
+from .models import URL
+from .sharding import write_shard_for
+
+logger = get_logger(__name__)
+
+# Long URLs are indexed by a truncated SHA-256 rather than by the URL itself, so
+# index entries stay small and fixed size whatever the URL length. Must match the
+# backfill in the 3_add_long_url_digest migration.
+URL_DIGEST_SIZE = 16
+REDIS_URL_DIGEST_PREFIX = "urldigest:"
+
+
+def url_digest(long_url: str) -> bytes:
+    return hashlib.sha256(long_url.encode()).digest()[:URL_DIGEST_SIZE]
+
+
+def url_digest_key(long_url: str) -> str:
+    return f"{REDIS_URL_DIGEST_PREFIX}{url_digest(long_url).hex()}"
+
+
+async def find_existing_links(long_urls: list[str], db: AsyncSession) -> dict[str, str]:
+    # long URL -> short link, for the long URLs that already have one. Each URL
+    # is only looked for on the shard that new links for it are written to.
+    by_shard: dict[int, dict[bytes, str]] = {}
+    for long_url in long_urls:
+        digest = url_digest(long_url)
+        by_shard.setdefault(write_shard_for(digest), {})[digest] = long_url
+    found = await asyncio.gather(
+        *(_find_on_shard(shard, digests, db) for shard, digests in by_shard.items())
+    )
+    return {long_url: short_link for links in found for long_url, short_link in links.items()}
+
+
+async def _find_on_shard(shard: int, digests: dict[bytes, str], db: AsyncSession) -> dict[str, str]:
+    query = (
+        select(URL.id, URL.long_url)
+        .where(URL.long_url_digest.in_(digests.keys()))
+        .order_by(URL.id)
+    )
+    async with shards.session(shard, db) as session:
+        result = await session.execute(query)
+        rows = result.all()
+    wanted = set(digests.values())
+    existing = {}
+    for id, long_url in rows:
+        # The digest is truncated, so the URL itself has the final say; the
+        # oldest link wins if concurrent creates left more than one
+        if long_url in wanted and long_url not in existing:
+            existing[long_url] = encode(id)
+    return existing
+
+
+async def find_existing_link(long_url: str, db: AsyncSession, redis: Redis) -> str | None:
+    short_link = await redis.get(url_digest_key(long_url))
+    if short_link:
+        return short_link
+    short_link = (await find_existing_links([long_url], db)).get(long_url)
+    if short_link is not None:
+        await remember_links(redis, {long_url: short_link})
+    return short_link
+
+
+async def remember_links(redis: Redis, links: dict[str, str]):
+    if not links:
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for long_url, short_link in links.items():
+                pipe.set(url_digest_key(long_url), short_link, ex=settings.DEDUP_REDIS_TTL_SECONDS or None)
+            await pipe.execute()
+    except Exception as e:
+        # Only a shortcut in front of the index, which still finds the links
+        logger.warning(f"Failed to cache the digests of {len(links)} long URLs: {e}")
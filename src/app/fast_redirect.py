@@ -0,0 +1,71 @@
+from urllib.parse import quote
+import orjson
+from fastapi import BackgroundTasks, Request
+from sqlalchemy.exc import NoResultFound
+from .base62 import is_canonical
+from .click_events import click_event
+from .core.config import settings
+from .core.logger import get_logger, get_request_logger
+from .core.redis import get_redis_client
+from .http_caching import NOT_MODIFIED, redirect_response
+from .services import get_long_url
+
+logger = get_logger(__name__)
+request_logger = get_request_logger(__name__)
+
+# Same quoting as RedirectResponse
+LOCATION_SAFE_CHARS = ":/%#?=@[]!$&'()*+,;"
+NOT_FOUND_BODY = orjson.dumps({"detail": "Short link not found"})
+NOT_FOUND_START = {
+    "type": "http.response.start",
+    "status": 404,
+    "headers": [(b"content-length", str(len(NOT_FOUND_BODY)).encode()), (b"content-type", b"application/json")],
+}
+EMPTY_BODY = {"type": "http.response.body", "body": b""}
+
+
+def if_none_match(scope) -> str | None:
+    for name, value in scope["headers"]:
+        if name == b"if-none-match":
+            return value.decode("latin-1")
+    return None
+
+
+class FastRedirectMiddleware:
+    # Answers GET /{short_link} ahead of FastAPI: no dependency injection, no
+    # Request or Response objects, and no DB session unless the link misses every
+    # cache. Any other request, or a redirect that fails unexpectedly, goes to the app.
+    def __init__(self, app, reserved_paths: set[str] = frozenset()):
+        self.app = app
+        # Fixed single-segment routes such as /health that are valid base62 as well
+        self.reserved_paths = reserved_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        short_link = path[1:]
+        if path in self.reserved_paths or not is_canonical(short_link):
+            return await self.app(scope, receive, send)
+
+        background_tasks = BackgroundTasks()
+        click = click_event(short_link, Request(scope)) if settings.CLICK_EVENTS_ENABLED else None
+        try:
+            value = await get_long_url(short_link, None, get_redis_client(), background_tasks, click)
+        except NoResultFound:
+            request_logger.warning("Short link not found: %s", short_link)
+            await send(NOT_FOUND_START)
+            await send({"type": "http.response.body", "body": NOT_FOUND_BODY})
+            return
+        except Exception as e:
+            logger.warning(f"Fast redirect of {short_link} failed, handing it to the app: {e}")
+            return await self.app(scope, receive, send)
+
+        status_code, long_url, headers = redirect_response(short_link, value, if_none_match(scope))
+        raw_headers = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+        if status_code != NOT_MODIFIED:
+            location = quote(long_url, safe=LOCATION_SAFE_CHARS).encode()
+            raw_headers += [(b"location", location), (b"content-length", b"0")]
+        await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+        await send(EMPTY_BODY)
+        await background_tasks()
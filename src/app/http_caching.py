@@ -0,0 +1,34 @@
+from .core.config import settings
+from .link_cache import split_redirect_value
+
+# Permanent redirects that browsers and CDNs may cache; temporary ones reach the
+# service, and get counted, on every click
+CACHEABLE_REDIRECT_STATUSES = frozenset({301, 308})
+NOT_MODIFIED = 304
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def redirect_cache_control(status_code: int) -> str:
+    if status_code in CACHEABLE_REDIRECT_STATUSES and settings.REDIRECT_MAX_AGE_SECONDS > 0:
+        return f"public, max-age={settings.REDIRECT_MAX_AGE_SECONDS}"
+    return "no-store"
+
+
+def redirect_response(short_link: str, value: str, if_none_match: str | None) -> tuple[int, str, dict[str, str]]:
+    # Status, long URL and headers for a cached link value. A revalidation of a
+    # cacheable redirect gets a 304 without a Location.
+    status_code, long_url = split_redirect_value(value)
+    status_code = status_code or settings.REDIRECT_STATUS_CODE
+    headers = {"Cache-Control": redirect_cache_control(status_code)}
+    if headers["Cache-Control"] != "no-store":
+        # A link's target never changes, only how it is redirected
+        headers["ETag"] = f'"{status_code}-{short_link}"'
+        if etag_matches(headers["ETag"], if_none_match):
+            return NOT_MODIFIED, long_url, headers
+    return status_code, long_url, headers
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from .core.config import settings
+from .core.db import AsyncSessionLocal, shards
+from .core.logger import get_logger
+from .sharding import local_id, shard_id, shard_of
+
+logger = get_logger(__name__)
+
+URLS_ID_SEQUENCE = "urls_id_seq"
+SEQUENCE_STATE_QUERY = text(
+    "SELECT last_value, increment_by FROM pg_sequences "
+    "WHERE schemaname = current_schema() AND sequencename = :sequence"
+)
+
+
+class IdAllocator:
+    # Hi/lo id allocation: every nextval() on the sequence reserves a whole block of
+    # ids (the sequence's INCREMENT BY), which this worker then hands out locally.
+    # Ids of a block that is not used up before the worker stops are never reused.
+    # Each shard has its own sequence; the shard number is added to the ids handed out.
+    def __init__(
+        self,
+        session_factory: sessionmaker = AsyncSessionLocal,
+        sequence: str = URLS_ID_SEQUENCE,
+        shard: int = 0,
+    ):
+        self.session_factory = session_factory
+        self.sequence = sequence
+        self.shard = shard
+        self.block_size: int | None = None
+        self.blocks_reserved = 0
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def remaining(self) -> int:
+        return self._end - self._next
+
+    async def allocate(self) -> int:
+        return (await self.allocate_many(1))[0]
+
+    async def allocate_many(self, count: int) -> list[int]:
+        ids = []
+        while len(ids) < count:
+            if not self.remaining:
+                async with self._lock:
+                    # Another caller may have reserved a block while we waited
+                    if not self.remaining:
+                        await self._reserve_block()
+            take = min(count - len(ids), self.remaining)
+            ids.extend(shard_id(self.shard, id) for id in range(self._next, self._next + take))
+            self._next += take
+        return ids
+
+    async def _reserve_block(self):
+        async with self.session_factory() as db:
+            if self.block_size is None:
+                result = await db.execute(SEQUENCE_STATE_QUERY, {"sequence": self.sequence})
+                self.block_size = result.one().increment_by
+            result = await db.execute(text(f"SELECT nextval('{self.sequence}')"))
+            start = result.scalar_one()
+        self._next, self._end = start, start + self.block_size
+        self.blocks_reserved += 1
+
+    def stats(self) -> dict:
+        return {
+            "shard": self.shard,
+            "block_size": self.block_size,
+            "blocks_reserved": self.blocks_reserved,
+            "remaining": self.remaining,
+        }
+
+
+class ShardedIdAllocator:
+    def __init__(self, allocators: list[IdAllocator]):
+        self.allocators = allocators
+
+    def __getitem__(self, shard: int) -> IdAllocator:
+        return self.allocators[shard]
+
+    async def allocate(self, shard: int = 0) -> int:
+        return await self.allocators[shard].allocate()
+
+    async def allocate_many(self, count: int, shard: int = 0) -> list[int]:
+        return await self.allocators[shard].allocate_many(count)
+
+    def stats(self) -> list[dict]:
+        return [allocator.stats() for allocator in self.allocators]
+
+
+class IdRange:
+    # Ids that can exist: from the sequence start up to the end of the most recently
+    # reserved block, per shard. Ids beyond the known end trigger a re-read of that
+    # shard's sequence, at most once per refresh_interval, so floods of random codes
+    # cost no DB queries.
+    def __init__(
+        self,
+        session_factories: list[sessionmaker] = shards.session_factories,
+        sequence: str = URLS_ID_SEQUENCE,
+        min_id: int = settings.URL_ID_MIN,
+        refresh_interval: float = settings.URL_ID_RANGE_REFRESH_SECONDS,
+    ):
+        self.session_factories = session_factories
+        self.sequence = sequence
+        self.min_id = min_id
+        self.refresh_interval = refresh_interval
+        # Largest local id per shard
+        self.max_ids: list[int | None] = [None] * len(session_factories)
+        self._refreshed_at = [float("-inf")] * len(session_factories)
+        self._locks = [asyncio.Lock() for _ in session_factories]
+
+    def in_bounds(self, id: int) -> bool:
+        # Checks that need no I/O: a known shard and a local id past the sequence start
+        return shard_of(id) < len(self.session_factories) and local_id(id) >= self.min_id
+
+    async def contains(self, id: int) -> bool:
+        if not self.in_bounds(id):
+            return False
+        shard, id = shard_of(id), local_id(id)
+        max_id = self.max_ids[shard]
+        if max_id is not None and id <= max_id:
+            return True
+        if time.monotonic() - self._refreshed_at[shard] >= self.refresh_interval:
+            async with self._locks[shard]:
+                if time.monotonic() - self._refreshed_at[shard] >= self.refresh_interval:
+                    await self._refresh(shard)
+        # If the sequence could not be read at all, let the lookup decide
+        max_id = self.max_ids[shard]
+        return max_id is None or id <= max_id
+
+    async def _refresh(self, shard: int):
+        self._refreshed_at[shard] = time.monotonic()
+        try:
+            async with self.session_factories[shard]() as db:
+                result = await db.execute(SEQUENCE_STATE_QUERY, {"sequence": self.sequence})
+                state = result.one()
+        except Exception as e:
+            logger.warning(f"Could not read the id range from {self.sequence} on shard {shard}: {e}")
+            return
+        if state.last_value is None:
+            # Nothing was reserved yet
+            self.max_ids[shard] = self.min_id - 1
+        else:
+            self.max_ids[shard] = state.last_value + state.increment_by - 1
+
+
+id_allocator = ShardedIdAllocator(
+    [IdAllocator(session_factory, shard=shard) for shard, session_factory in enumerate(shards.session_factories)]
+)
+id_range = IdRange()
@@ -0,0 +1,303 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from .base62 import decode, encode
+from .core.config import settings
+from .core.redis import get_redis_client, link_cache_nodes
+
+REDIS_SHORTLINK_PREFIX = "shortlink:"
+REDIS_SHORTLINK_BUCKET_PREFIX = f"{REDIS_SHORTLINK_PREFIX}b:"
+# Stored in place of the URL for short links confirmed missing. Creating the link
+# overwrites it, and a lookup reads either kind of entry with one round trip.
+MISSING_LINK = ""
+
+# GET with a sliding TTL: a link that is read gets its TTL raised back to ARGV[1].
+# TTLs are only ever raised, so hot links keep their longer retention, and missing
+# link markers keep their short one.
+GET_AND_REFRESH_SCRIPT = """
+local value = redis.call("GET", KEYS[1])
+if value and value ~= "" and tonumber(ARGV[1]) > 0 then
+    local ttl = redis.call("TTL", KEYS[1])
+    if ttl >= 0 and ttl < tonumber(ARGV[1]) then
+        redis.call("EXPIRE", KEYS[1], ARGV[1])
+    end
+end
+return value
+"""
+
+# Same as above for one field of a bucket hash; the TTL belongs to the whole bucket.
+# A link that is not in its bucket may have a missing-link marker under KEYS[2].
+HGET_AND_REFRESH_SCRIPT = """
+local value = redis.call("HGET", KEYS[1], ARGV[1])
+if not value then
+    return redis.call("GET", KEYS[2])
+end
+if value ~= "" and tonumber(ARGV[2]) > 0 then
+    local ttl = redis.call("TTL", KEYS[1])
+    if ttl >= 0 and ttl < tonumber(ARGV[2]) then
+        redis.call("EXPIRE", KEYS[1], ARGV[2])
+    end
+end
+return value
+"""
+
+
+class StringLayout:
+    # One top-level string key per link: shortlink:<code> -> long URL
+    name = "string"
+
+    def __init__(self):
+        self.get_and_refresh = get_redis_client().register_script(GET_AND_REFRESH_SCRIPT)
+
+    def key(self, short_link: str) -> str:
+        return f"{REDIS_SHORTLINK_PREFIX}{short_link}"
+
+    def node_key(self, short_link: str) -> str:
+        return self.key(short_link)
+
+    async def get(self, redis: Redis, short_link: str, ttl_seconds: int) -> str | None:
+        return await self.get_and_refresh(keys=[self.key(short_link)], args=[ttl_seconds], client=redis)
+
+    async def set(self, redis: Redis, short_link: str, long_url: str, ttl_seconds: int):
+        await redis.set(self.key(short_link), long_url, ex=ttl_seconds or None)
+
+    async def set_missing(self, redis: Redis, short_link: str, ttl_seconds: int):
+        # NX so a link created in the meantime is never masked
+        await redis.set(self.key(short_link), MISSING_LINK, ex=ttl_seconds, nx=True)
+
+    async def delete(self, redis: Redis, short_links: list[str]):
+        await redis.delete(*(self.key(short_link) for short_link in short_links))
+
+    def add_set(self, pipe: Pipeline, short_link: str, long_url: str, ttl_seconds: int):
+        pipe.set(self.key(short_link), long_url, ex=ttl_seconds or None)
+
+    def add_get(self, pipe: Pipeline, short_link: str):
+        pipe.get(self.key(short_link))
+
+    def add_extend_ttls(self, pipe: Pipeline, short_links: list[str], ttl_seconds: int):
+        # GT only ever raises a TTL (Redis 7+), and skips keys without one
+        for short_link in short_links:
+            pipe.expire(self.key(short_link), ttl_seconds, gt=True)
+
+    async def scan(self, redis: Redis, count: int) -> AsyncIterator[list[tuple[str, str]]]:
+        keys = []
+        async for key in redis.scan_iter(match=f"{REDIS_SHORTLINK_PREFIX}*", count=count):
+            # Codes are base62, so anything else under the prefix (buckets, leases) has a ':'
+            if ":" not in key[len(REDIS_SHORTLINK_PREFIX):]:
+                keys.append(key)
+            if len(keys) >= count:
+                yield await self._read(redis, keys)
+                keys = []
+        if keys:
+            yield await self._read(redis, keys)
+
+    async def _read(self, redis: Redis, keys: list[str]) -> list[tuple[str, str]]:
+        values = await redis.mget(keys)
+        return [
+            (key[len(REDIS_SHORTLINK_PREFIX):], value)
+            for key, value in zip(keys, values)
+            if value
+        ]
+
+
+class HashBucketLayout:
+    # Links grouped into hashes of bucket_size ids: shortlink:b:<id // N> holds
+    # field <id % N> -> long URL. Small hashes are stored as listpacks, which costs
+    # a few bytes per field instead of a full top-level key per link.
+    name = "hash"
+
+    def __init__(self, bucket_size: int):
+        self.bucket_size = bucket_size
+        self.hget_and_refresh = get_redis_client().register_script(HGET_AND_REFRESH_SCRIPT)
+
+    def key_and_field(self, short_link: str) -> tuple[str, str]:
+        bucket, field = divmod(decode(short_link), self.bucket_size)
+        return f"{REDIS_SHORTLINK_BUCKET_PREFIX}{bucket}", str(field)
+
+    def missing_key(self, short_link: str) -> str:
+        # Missing-link markers get a key of their own: in the bucket they would
+        # live as long as its hottest link instead of their own short TTL
+        return f"{REDIS_SHORTLINK_PREFIX}missing:{short_link}"
+
+    def node_key(self, short_link: str) -> str:
+        # A whole bucket lives on one node, and so do the markers for its links
+        return self.key_and_field(short_link)[0]
+
+    async def get(self, redis: Redis, short_link: str, ttl_seconds: int) -> str | None:
+        key, field = self.key_and_field(short_link)
+        return await self.hget_and_refresh(
+            keys=[key, self.missing_key(short_link)], args=[field, ttl_seconds], client=redis
+        )
+
+    def _add_raise_ttl(self, pipe: Pipeline, key: str, ttl_seconds: int):
+        # NX covers a bucket that was just created, GT one that expires too soon
+        if ttl_seconds:
+            pipe.expire(key, ttl_seconds, nx=True)
+            pipe.expire(key, ttl_seconds, gt=True)
+
+    async def set(self, redis: Redis, short_link: str, long_url: str, ttl_seconds: int):
+        async with redis.pipeline(transaction=False) as pipe:
+            self.add_set(pipe, short_link, long_url, ttl_seconds)
+            await pipe.execute()
+
+    async def set_missing(self, redis: Redis, short_link: str, ttl_seconds: int):
+        # Lookups read the bucket first, so a link created in the meantime is never masked
+        await redis.set(self.missing_key(short_link), MISSING_LINK, ex=ttl_seconds, nx=True)
+
+    async def delete(self, redis: Redis, short_links: list[str]):
+        async with redis.pipeline(transaction=False) as pipe:
+            for short_link in short_links:
+                pipe.hdel(*self.key_and_field(short_link))
+                pipe.delete(self.missing_key(short_link))
+            await pipe.execute()
+
+    def add_set(self, pipe: Pipeline, short_link: str, long_url: str, ttl_seconds: int):
+        key, field = self.key_and_field(short_link)
+        pipe.hset(key, field, long_url)
+        self._add_raise_ttl(pipe, key, ttl_seconds)
+
+    def add_get(self, pipe: Pipeline, short_link: str):
+        pipe.hget(*self.key_and_field(short_link))
+
+    def add_extend_ttls(self, pipe: Pipeline, short_links: list[str], ttl_seconds: int):
+        for key in {self.key_and_field(short_link)[0] for short_link in short_links}:
+            pipe.expire(key, ttl_seconds, gt=True)
+
+    async def scan(self, redis: Redis, count: int) -> AsyncIterator[list[tuple[str, str]]]:
+        async for key in redis.scan_iter(match=f"{REDIS_SHORTLINK_BUCKET_PREFIX}*", count=count):
+            bucket = int(key[len(REDIS_SHORTLINK_BUCKET_PREFIX):])
+            fields = await redis.hgetall(key)
+            yield [
+                (encode(bucket * self.bucket_size + int(field)), value)
+                for field, value in fields.items()
+                if value
+            ]
+
+
+def create_layout(name: str, bucket_size: int = settings.LINK_CACHE_BUCKET_SIZE):
+    if name == HashBucketLayout.name:
+        return HashBucketLayout(bucket_size)
+    return StringLayout()
+
+
+layout = create_layout(settings.LINK_CACHE_LAYOUT)
+
+
+def link_lease_key(short_link: str) -> str:
+    return f"{REDIS_SHORTLINK_PREFIX}lease:{short_link}"
+
+
+def link_cache_clients(redis: Redis) -> list[Redis]:
+    return link_cache_nodes.clients if link_cache_nodes else [redis]
+
+
+async def _on_node(redis: Redis, short_link: str, command: Callable[[Redis], Awaitable]):
+    # With dedicated cache nodes, a link lives on the node its key hashes to, and a
+    # node that is down reads as a miss. Otherwise everything is on the shared client.
+    if not link_cache_nodes:
+        return await command(redis)
+    return await link_cache_nodes.run(link_cache_nodes.node(layout.node_key(short_link)), command)
+
+
+async def _on_nodes(
+    redis: Redis,
+    links: list,
+    command: Callable[[Redis, list], Awaitable],
+    short_link: Callable = lambda link: link,
+    cache_layout=None,
+):
+    # One command per node holding some of the links, run concurrently
+    if not link_cache_nodes:
+        await command(redis, links)
+        return
+    cache_layout = cache_layout or layout
+    by_node: dict[int, list] = {}
+    for link in links:
+        by_node.setdefault(link_cache_nodes.node(cache_layout.node_key(short_link(link))), []).append(link)
+    await asyncio.gather(
+        *(
+            link_cache_nodes.run(node, lambda client, node_links=node_links: command(client, node_links))
+            for node, node_links in by_node.items()
+        )
+    )
+
+
+def redirect_value(long_url: str, redirect_status: int | None) -> str:
+    # A link with its own redirect status is cached as "<status> <long URL>", so
+    # every cache tier keeps serving it from a single value. Stored URLs start
+    # with their scheme, never with three digits and a space.
+    return f"{redirect_status} {long_url}" if redirect_status else long_url
+
+
+def split_redirect_value(value: str) -> tuple[int | None, str]:
+    if value[3:4] == " " and value[:3].isdigit():
+        return int(value[:3]), value[4:]
+    return None, value
+
+
+async def get_cached_link(
+    redis: Redis, short_link: str, ttl_seconds: int = settings.LINK_CACHE_TTL_SECONDS
+) -> str | None:
+    return await _on_node(redis, short_link, lambda client: layout.get(client, short_link, ttl_seconds))
+
+
+async def cache_link(
+    redis: Redis, short_link: str, long_url: str, ttl_seconds: int = settings.LINK_CACHE_TTL_SECONDS
+):
+    await _on_node(redis, short_link, lambda client: layout.set(client, short_link, long_url, ttl_seconds))
+
+
+async def cache_missing_link(redis: Redis, short_link: str, ttl_seconds: int):
+    await _on_node(redis, short_link, lambda client: layout.set_missing(client, short_link, ttl_seconds))
+
+
+async def cache_links(
+    redis: Redis,
+    links: list[tuple[str, str]],
+    ttl_seconds: int = settings.LINK_CACHE_TTL_SECONDS,
+    cache_layout=None,
+):
+    cache_layout = cache_layout or layout
+
+    async def write(client: Redis, node_links: list[tuple[str, str]]):
+        # One round trip per node for the whole batch
+        async with client.pipeline(transaction=False) as pipe:
+            for short_link, long_url in node_links:
+                cache_layout.add_set(pipe, short_link, long_url, ttl_seconds)
+            await pipe.execute()
+
+    await _on_nodes(redis, links, write, short_link=lambda link: link[0], cache_layout=cache_layout)
+
+
+async def get_cached_links(redis: Redis, short_links: list[str]) -> dict[str, str]:
+    # Plain reads, one pipeline per node; TTLs are left as they are
+    found = {}
+
+    async def read(client: Redis, node_links: list[str]):
+        async with client.pipeline(transaction=False) as pipe:
+            for short_link in node_links:
+                layout.add_get(pipe, short_link)
+            values = await pipe.execute()
+        found.update((short_link, value) for short_link, value in zip(node_links, values) if value)
+
+    await _on_nodes(redis, short_links, read)
+    return found
+
+
+async def extend_link_ttls(redis: Redis, short_links: list[str], ttl_seconds: int):
+    async def extend(client: Redis, node_links: list[str]):
+        async with client.pipeline(transaction=False) as pipe:
+            layout.add_extend_ttls(pipe, node_links, ttl_seconds)
+            await pipe.execute()
+
+    await _on_nodes(redis, short_links, extend)
+
+
+async def uncache_link(redis: Redis, short_link: str):
+    await _on_node(redis, short_link, lambda client: layout.delete(client, [short_link]))
+
+
+async def uncache_links(redis: Redis, short_links: list[str]):
+    if short_links:
+        await _on_nodes(redis, short_links, lambda client, node_links: layout.delete(client, node_links))
@@ -1,9 +1,61 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from .batching import create_link_batcher
+from .counters import access_count_flusher
+from .fast_redirect import FastRedirectMiddleware
 from .routes import router as url_router
+from .snapshot import snapshot_refresher
+from .warmup import cache_warmer
 from .core.config import settings, EnvironmentOption
+from .core.db import close_db_pool, warm_db_pool
+from .core.local_cache import listen_for_invalidations
+from .core.logger import get_logger
+from .core.redis import close_redis_pool, get_redis_client, warm_redis_pool
 
+logger = get_logger(__name__)
 
-def create_app() -> FastAPI:
+
+async def warm_pools():
+    # A backend that is down at startup must not keep the app from starting;
+    # connections are then opened lazily once it is reachable again
+    for name, warm in (("Postgres", warm_db_pool), ("Redis", warm_redis_pool)):
+        try:
+            await warm()
+        except Exception as e:
+            logger.warning(f"Could not warm {name} connection pool: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_pools()
+    redis = get_redis_client()
+    invalidation_listener = None
+    if settings.L1_CACHE_ENABLED:
+        invalidation_listener = asyncio.create_task(listen_for_invalidations(redis))
+    access_count_flusher.start()
+    if settings.WARMUP_ENABLED:
+        # In the background, so the app serves requests while /health reports it as not ready
+        cache_warmer.start()
+    if settings.SNAPSHOT_ENABLED:
+        snapshot_refresher.start()
+    try:
+        yield
+    finally:
+        await cache_warmer.stop()
+        await snapshot_refresher.stop()
+        await create_link_batcher.close()
+        await access_count_flusher.stop()
+        if invalidation_listener:
+            invalidation_listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await invalidation_listener
+        await close_redis_pool()
+        await close_db_pool()
+
+
+def create_app(fast_redirect: bool = settings.REDIRECT_FAST_PATH_ENABLED) -> FastAPI:
     docs_url = None if settings.ENVIRONMENT == EnvironmentOption.PRODUCTION else "/docs"
     redoc_url = (
         None if settings.ENVIRONMENT == EnvironmentOption.PRODUCTION else "/redoc"
@@ -15,9 +67,15 @@ def create_app() -> FastAPI:
         version="0.1.0",
         docs_url=docs_url,
         redoc_url=redoc_url,
+        lifespan=lifespan,
     )
 
     app.include_router(url_router)
+    if fast_redirect:
+        app.add_middleware(
+            FastRedirectMiddleware,
+            reserved_paths={route.path for route in app.routes if "{" not in route.path},
+        )
 
     return app
 
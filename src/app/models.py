@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import BigInteger, Column, DateTime, Integer, LargeBinary, SmallInteger, String
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -6,6 +6,30 @@ Base = declarative_base()
 
 class URL(Base):
     __tablename__ = "urls"
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
     long_url = Column(String, nullable=False)
     access_count = Column(Integer, default=0, nullable=False)
+    # Truncated SHA-256 of long_url, see dedup.url_digest
+    long_url_digest = Column(LargeBinary(16), index=True)
+    # Overrides REDIRECT_STATUS_CODE for this link; NULL follows the deployment setting
+    redirect_status = Column(SmallInteger)
+
+
+class ClickRollup(Base):
+    # Range-partitioned by month on hour, see analytics.ensure_partitions
+    __tablename__ = "url_clicks_hourly"
+    __table_args__ = {"postgresql_partition_by": "RANGE (hour)"}
+    url_id = Column(BigInteger, primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    clicks = Column(BigInteger, default=0, nullable=False)
+
+
+class ClickEvent(Base):
+    __tablename__ = "click_events"
+    # Redis Stream entry ID; makes redelivered events a no-op
+    id = Column(String, primary_key=True)
+    clicked_at = Column(DateTime(timezone=True), nullable=False)
+    url_id = Column(BigInteger, nullable=False)
+    referrer = Column(String)
+    user_agent_hash = Column(String)
+    client_ip_prefix = Column(String)
@@ -1,24 +1,80 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from datetime import datetime
+from typing import Literal
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import NoResultFound
 from redis.asyncio import Redis
-from .core.db import async_get_db
-from .core.redis import async_get_redis
-from .schemas import CreateLinkRequest, CreateLinkResponse, LinkStatsResponse
-from .services import create_short_link, get_long_url, get_link_stats
-from .core.logger import get_logger
+from .click_events import click_event
+from .http_caching import NOT_MODIFIED, etag_matches, redirect_response
+from .core.config import settings
+from .core.db import async_get_db, get_db_pool_stats, read_replicas, shards
+from .core.redis import async_get_redis, get_redis_pool_stats, link_cache_nodes
+from .schemas import (
+    CreateLinkRequest,
+    CreateLinkResponse,
+    CreateLinksBatchRequest,
+    CreateLinksBatchResponse,
+    LinkStatsResponse,
+    LinkTimeseriesResponse,
+)
+from .services import (
+    create_short_link,
+    create_short_links,
+    get_long_url,
+    get_link_stats,
+    get_link_timeseries,
+    lease_waits,
+    link_loads,
+    rejected_lookups,
+    replica_reads,
+)
+from .core.local_cache import local_cache, negative_cache, stats_cache
+from .batching import create_link_batcher
+from .counters import access_count_flusher
+from .id_allocator import id_allocator
+from .snapshot import snapshot_refresher
+from .warmup import cache_warmer
+from .core.logger import get_logger, get_request_logger, logging_stats
 
 router = APIRouter(tags=["Endpoints"])
 logger = get_logger(__name__)
+# Per-request lines: sampled, and formatted on the log writer thread only if kept
+request_logger = get_request_logger(__name__)
 
 
 @router.get("/health")
-async def health_check():
-    logger.debug("Health check requested")
+async def health_check(response: Response):
+    request_logger.debug("Health check requested")
+    if not cache_warmer.ready:
+        # Kept out of rotation until the cache warm-up finishes or runs out of time
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "warming"}
     return {"status": "ok"}
 
 
+@router.get("/metrics")
+async def metrics():
+    return {
+        "l1_cache": local_cache.stats(),
+        "negative_cache": negative_cache.stats(),
+        "stats_cache": stats_cache.stats(),
+        "rejected_lookups": rejected_lookups,
+        "single_flight": {**link_loads.stats(), "lease": lease_waits},
+        "db_pool": get_db_pool_stats(),
+        "read_replicas": {"replicas": read_replicas.stats(), "reads": replica_reads},
+        "shards": shards.stats(),
+        "redis_pool": get_redis_pool_stats(),
+        "link_cache_nodes": link_cache_nodes.stats(),
+        "access_count_flusher": access_count_flusher.stats(),
+        "create_batcher": create_link_batcher.stats(),
+        "id_allocator": id_allocator.stats(),
+        "snapshot": snapshot_refresher.stats(),
+        "warmup": cache_warmer.stats(),
+        "logging": logging_stats(),
+    }
+
+
 @router.post(
     "/create", response_model=CreateLinkResponse, status_code=status.HTTP_201_CREATED
 )
@@ -28,8 +84,8 @@ async def create_short_link_endpoint(
     redis: Redis = Depends(async_get_redis),
 ):
     try:
-        short_link = await create_short_link(str(request.long_url), db, redis)
-        logger.info(f"Short link created: {short_link} for URL {request.long_url}")
+        short_link = await create_short_link(str(request.long_url), db, redis, request.redirect_status)
+        request_logger.info("Short link created: %s for URL %s", short_link, request.long_url)
         return CreateLinkResponse(short_link=short_link)
     except Exception as e:
         logger.error(
@@ -41,19 +97,49 @@ async def create_short_link_endpoint(
         )
 
 
+@router.post(
+    "/create/batch",
+    response_model=CreateLinksBatchResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_short_links_endpoint(
+    request: CreateLinksBatchRequest,
+    db: AsyncSession = Depends(async_get_db),
+    redis: Redis = Depends(async_get_redis),
+):
+    try:
+        results = await create_short_links(request.long_urls, db, redis)
+        request_logger.info("Batch of %d short links processed", len(results))
+        return CreateLinksBatchResponse(results=results)
+    except Exception as e:
+        logger.error(
+            f"Internal server error on creating a batch of short links: {str(e)}",
+            exc_info=True,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while processing your request.",
+        )
+
+
 @router.get("/{short_link}", response_class=RedirectResponse)
 async def redirect_to_long_url(
     short_link: str,
+    request: Request,
     background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(async_get_db),
     redis: Redis = Depends(async_get_redis),
 ):
     try:
-        long_url = await get_long_url(short_link, db, redis, background_tasks)
-        logger.debug(f"Redirecting short link {short_link} to {long_url}")
-        return RedirectResponse(url=long_url)
+        click = click_event(short_link, request) if settings.CLICK_EVENTS_ENABLED else None
+        value = await get_long_url(short_link, db, redis, background_tasks, click)
+        status_code, long_url, headers = redirect_response(short_link, value, request.headers.get("if-none-match"))
+        request_logger.debug("Redirecting short link %s to %s with %d", short_link, long_url, status_code)
+        if status_code == NOT_MODIFIED:
+            return Response(status_code=status_code, headers=headers)
+        return RedirectResponse(url=long_url, status_code=status_code, headers=headers)
     except NoResultFound:
-        logger.warning(f"Short link not found: {short_link}")
+        request_logger.warning("Short link not found: %s", short_link)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Short link not found"
         )
@@ -68,14 +154,35 @@ async def redirect_to_long_url(
         )
 
 
+STATS_CACHE_CONTROL = f"max-age={settings.STATS_MAX_AGE_SECONDS}" if settings.STATS_MAX_AGE_SECONDS else "no-cache"
+
+
+def stats_etag(stats: dict) -> str:
+    # The long URL never changes, so the count alone tells versions apart
+    return f'"{stats["short_link"]}-{stats["access_count"]}"'
+
+
 @router.get("/stats/{short_link}", response_model=LinkStatsResponse)
-async def get_stats(short_link: str, db: AsyncSession = Depends(async_get_db)):
+async def get_stats(
+    short_link: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(async_get_db),
+    redis: Redis = Depends(async_get_redis),
+):
     try:
-        stats = await get_link_stats(short_link, db)
-        logger.info(f"Stats requested for short link {short_link}")
+        stats = await get_link_stats(short_link, db, redis)
+        request_logger.info("Stats requested for short link %s", short_link)
+        headers = {
+            "ETag": stats_etag(stats),
+            "Cache-Control": STATS_CACHE_CONTROL,
+        }
+        if etag_matches(headers["ETag"], request.headers.get("if-none-match")):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
         return stats
     except NoResultFound:
-        logger.warning(f"Stats not found for short link: {short_link}")
+        request_logger.warning("Stats not found for short link: %s", short_link)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Short link not found"
         )
@@ -88,3 +195,37 @@ async def get_stats(short_link: str, db: AsyncSession = Depends(async_get_db)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while processing your request.",
         )
+
+
+@router.get(
+    "/stats/{short_link}/timeseries",
+    response_model=LinkTimeseriesResponse,
+    response_model_by_alias=True,
+)
+async def get_timeseries(
+    short_link: str,
+    granularity: Literal["hour", "day"] = "hour",
+    start: datetime | None = Query(None, alias="from"),
+    end: datetime | None = Query(None, alias="to"),
+    db: AsyncSession = Depends(async_get_db),
+):
+    try:
+        timeseries = await get_link_timeseries(short_link, granularity, start, end, db)
+        request_logger.info("Timeseries requested for short link %s", short_link)
+        return timeseries
+    except NoResultFound:
+        request_logger.warning("Stats not found for short link: %s", short_link)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Short link not found"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(
+            f"Internal server error on getting the timeseries for short link {short_link}: {str(e)}",
+            exc_info=True,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while processing your request.",
+        )
@@ -1,4 +1,7 @@
-from pydantic import BaseModel, HttpUrl
+from datetime import datetime
+from typing import Literal
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
+from .core.config import settings
 
 
 class URL(BaseModel):
@@ -9,13 +12,45 @@ class URL(BaseModel):
 
 class CreateLinkRequest(BaseModel):
     long_url: HttpUrl
+    # 301/308 let browsers and CDNs cache the redirect; 302/307 send every click here
+    redirect_status: Literal[301, 302, 307, 308] | None = None
 
 
 class CreateLinkResponse(BaseModel):
     short_link: str
 
 
+class CreateLinksBatchRequest(BaseModel):
+    # Items are validated one by one so a bad URL does not reject the whole batch
+    long_urls: list[str] = Field(min_length=1, max_length=settings.CREATE_BATCH_ENDPOINT_MAX_URLS)
+
+
+class CreateLinkResult(BaseModel):
+    long_url: str
+    short_link: str | None = None
+    error: str | None = None
+
+
+class CreateLinksBatchResponse(BaseModel):
+    results: list[CreateLinkResult]
+
+
 class LinkStatsResponse(BaseModel):
     long_url: str
     short_link: str
     access_count: int
+
+
+class TimeseriesPoint(BaseModel):
+    timestamp: datetime
+    clicks: int
+
+
+class LinkTimeseriesResponse(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    short_link: str
+    granularity: Literal["hour", "day"]
+    start: datetime = Field(alias="from")
+    end: datetime = Field(alias="to")
+    points: list[TimeseriesPoint]
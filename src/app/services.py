@@ -1,70 +1,459 @@
+import asyncio
+import time
+from datetime import datetime, timezone
 from fastapi import BackgroundTasks
 from redis.asyncio import Redis
+from sqlalchemy import BigInteger, Integer, Row, bindparam, column, update, values
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import NoResultFound
+from pydantic import ValidationError
 from .models import URL
-from .base62 import encode, decode
+from .schemas import CreateLinkRequest
+from .base62 import MAX_ID, encode, decode, is_canonical
+from .core.config import settings
+from .core.db import read_replicas, shards
+from .core.local_cache import local_cache, negative_cache, stats_cache, INVALIDATE_ALL
+from .core.logger import get_logger
+from .core.redis import acquire_lock, release_lock
+from .analytics import GRANULARITIES, floor_to, get_click_timeseries, rollup_field
+from .batching import create_link_batcher
+from .click_events import add_click_event
+from .dedup import find_existing_link, find_existing_links, remember_links, url_digest
+from .id_allocator import id_allocator, id_range
+from .link_cache import (
+    MISSING_LINK,
+    cache_link,
+    cache_links,
+    cache_missing_link,
+    get_cached_link,
+    link_lease_key,
+    redirect_value,
+    uncache_link,
+)
+from .sharding import shard_of, write_shard_for
+from .single_flight import SingleFlight
+from .snapshot import link_snapshot
 
-REDIS_SHORTLINK_PREFIX = "shortlink:"
+logger = get_logger(__name__)
 
+# Clicks not yet written to the DB, as a hash of URL id -> pending delta. The flusher
+# renames it to the flushing key before applying it, so new clicks keep accumulating.
+REDIS_ACCESS_COUNT_PENDING_KEY = "access_count:pending"
+REDIS_ACCESS_COUNT_FLUSHING_KEY = "access_count:flushing"
+# Bumped after every batch of deltas the flusher commits; cached DB counts are
+# only combined with the pending ones while it stays the same
+REDIS_ACCESS_COUNT_GENERATION_KEY = "access_count:generation"
+# Same for hourly click counts, as a hash of "<URL id>:<hour>" -> pending delta
+REDIS_CLICK_ROLLUP_PENDING_KEY = "click_rollup:pending"
+REDIS_CLICK_ROLLUP_FLUSHING_KEY = "click_rollup:flushing"
 
-async def create_short_link(long_url: str, db: AsyncSession, redis: Redis) -> str:
-    new_url = URL(long_url=long_url, access_count=0)
-    db.add(new_url)
-    await db.commit()
-    await db.refresh(new_url)
-    # Get the ID of the new row of DB and encode it to generate the short link
-    short_link = encode(new_url.id)
+# Lookups answered with a 404 without reaching the DB, by reason
+rejected_lookups = {"malformed": 0, "out_of_range": 0, "negative_cache": 0}
+# Misses that found another node holding the lease, and those that gave up waiting
+lease_waits = {"waited": 0, "timed_out": 0}
+
+# Replica lookups that found the link, missed it, or failed; the last two retry on the primary
+replica_reads = {"hits": 0, "misses": 0, "errors": 0}
+# In-flight cache misses, keyed by short link
+link_loads = SingleFlight()
+
+# Redirect and stats lookups select their few columns from the table rather than
+# the mapped class, so there is no ORM compile step or identity map and rows come
+# back as plain tuples. Built once, the statement is compiled once per process and
+# asyncpg keeps it prepared on each connection.
+FIND_URL_QUERY = select(
+    URL.__table__.c.long_url, URL.__table__.c.access_count, URL.__table__.c.redirect_status
+).where(URL.__table__.c.id == bindparam("id"))
 
-    await redis.set(f"{REDIS_SHORTLINK_PREFIX}{short_link}", long_url)
 
+async def create_short_link(
+    long_url: str, db: AsyncSession, redis: Redis, redirect_status: int | None = None
+) -> str:
+    if redirect_status is not None:
+        # A link with its own redirect status is never shared, so it skips dedup,
+        # and is rare enough not to need the batcher
+        return await insert_short_link(long_url, db, redis, redirect_status)
+
+    if settings.DEDUP_ENABLED:
+        short_link = await find_existing_link(long_url, db, redis)
+        if short_link is not None:
+            return short_link
+
+    if settings.CREATE_BATCH_ENABLED:
+        # Coalesced with concurrent creates into one INSERT and one COMMIT
+        short_link = await create_link_batcher.submit(long_url, write_shard_for(url_digest(long_url)))
+    else:
+        short_link = await insert_short_link(long_url, db, redis)
+
+    if settings.DEDUP_ENABLED:
+        await remember_links(redis, {long_url: short_link})
     return short_link
 
 
-async def get_long_url(
-    short_link: str, db: AsyncSession, redis: Redis, background_tasks: BackgroundTasks
+async def insert_short_link(
+    long_url: str, db: AsyncSession, redis: Redis, redirect_status: int | None = None
 ) -> str:
+    # The ID comes from this worker's pre-allocated block, so the short link is
+    # known before the row is written and the INSERT and cache write run concurrently
+    digest = url_digest(long_url)
+    shard = write_shard_for(digest)
+    id = await id_allocator.allocate(shard)
+    short_link = encode(id)
+    url_obj = URL(
+        id=id,
+        long_url=long_url,
+        access_count=0,
+        # Without a digest, dedup never hands this link out for the same URL
+        long_url_digest=digest if redirect_status is None else None,
+        redirect_status=redirect_status,
+    )
+    committed, cached = await asyncio.gather(
+        insert_url(url_obj, shard, db),
+        cache_link(
+            redis, short_link, redirect_value(long_url, redirect_status), settings.LINK_CACHE_NEW_LINK_TTL_SECONDS
+        ),
+        return_exceptions=True,
+    )
+    if isinstance(committed, BaseException):
+        if not isinstance(cached, BaseException):
+            await uncache_link(redis, short_link)
+        raise committed
+    if isinstance(cached, BaseException):
+        raise cached
+
+    return short_link
+
+
+async def insert_url(url_obj: URL, shard: int, db: AsyncSession):
+    async with shards.session(shard, db) as session:
+        session.add(url_obj)
+        await session.commit()
+
+
+async def create_short_links(long_urls: list[str], db: AsyncSession, redis: Redis) -> list[dict]:
+    results = [{"long_url": long_url, "short_link": None, "error": None} for long_url in long_urls]
+    valid = []
+    for result in results:
+        try:
+            long_url = str(CreateLinkRequest(long_url=result["long_url"]).long_url)
+        except ValidationError as e:
+            result["error"] = e.errors()[0]["msg"]
+            continue
+        valid.append((result, long_url))
+    if not valid:
+        return results
+
+    new_urls = [long_url for _, long_url in valid]
+    existing = {}
+    if settings.DEDUP_ENABLED:
+        existing = await find_existing_links(new_urls, db)
+        # Repeats within the batch share one new link as well
+        new_urls = [long_url for long_url in dict.fromkeys(new_urls) if long_url not in existing]
+
+    links = []
+    if new_urls:
+        by_shard: dict[int, list[str]] = {}
+        for long_url in new_urls:
+            by_shard.setdefault(write_shard_for(url_digest(long_url)), []).append(long_url)
+        # One COPY per shard, run concurrently
+        copied = await asyncio.gather(
+            *(copy_new_urls(shard, long_urls, db) for shard, long_urls in by_shard.items())
+        )
+        short_links = {long_url: short_link for shard_links in copied for short_link, long_url in shard_links}
+        links = [(short_links[long_url], long_url) for long_url in new_urls]
+
+    if settings.DEDUP_ENABLED:
+        short_links = {**existing, **{long_url: short_link for short_link, long_url in links}}
+        for result, long_url in valid:
+            result["short_link"] = short_links[long_url]
+        await remember_links(redis, short_links)
+    else:
+        for (result, _), (short_link, _) in zip(valid, links):
+            result["short_link"] = short_link
+
+    if links:
+        try:
+            await cache_links(redis, links, settings.LINK_CACHE_NEW_LINK_TTL_SECONDS)
+        except Exception as e:
+            # The links are in the DB and the caller needs them; redirects repopulate the cache
+            logger.warning(f"Failed to cache a batch of {len(links)} links: {e}")
+
+    return results
+
+
+async def copy_new_urls(shard: int, long_urls: list[str], db: AsyncSession) -> list[tuple[str, str]]:
+    ids = await id_allocator.allocate_many(len(long_urls), shard)
+    async with shards.session(shard, db) as session:
+        await copy_urls(session, [(id, long_url, 0, url_digest(long_url)) for id, long_url in zip(ids, long_urls)])
+    return [(encode(id), long_url) for id, long_url in zip(ids, long_urls)]
+
+
+async def copy_urls(db: AsyncSession, records: list[tuple[int, str, int, bytes]]):
+    # COPY is a single atomic statement and far cheaper than row-by-row INSERTs
+    conn = await db.connection()
+    raw_conn = await conn.get_raw_connection()
+    await raw_conn.driver_connection.copy_records_to_table(
+        URL.__tablename__, records=records, columns=["id", "long_url", "access_count", "long_url_digest"]
+    )
+    await db.commit()
+
+
+def decode_short_link(short_link: str) -> int:
+    # Rejects codes that no allocated id can produce, before any I/O
+    if not is_canonical(short_link):
+        rejected_lookups["malformed"] += 1
+        raise NoResultFound(f"Malformed short link: {short_link}")
     id = decode(short_link)
-    # Try to find the short link in Redis
-    long_url = await redis.get(f"{REDIS_SHORTLINK_PREFIX}{short_link}")
+    if id > MAX_ID or not id_range.in_bounds(id):
+        rejected_lookups["out_of_range"] += 1
+        raise NoResultFound(f"Short link outside the allocated range: {short_link}")
+    return id
+
+
+async def get_long_url(
+    short_link: str,
+    db: AsyncSession | None,
+    redis: Redis,
+    background_tasks: BackgroundTasks,
+    click: dict[str, str] | None = None,
+) -> str:
+    id = decode_short_link(short_link)
+    if negative_cache.get(short_link) is not None:
+        rejected_lookups["negative_cache"] += 1
+        raise NoResultFound(f"No URL found for short link: {short_link}")
+
+    # Try the host-wide snapshot of hot links and the in-process cache first, then Redis, then the DB
+    long_url = link_snapshot.get(id) or local_cache.get(short_link)
     if not long_url:
-        id = decode(short_link)
-        query = select(URL).where(URL.id == id)
-        result = await db.execute(query)
-        url_obj = result.scalars().first()
-        if not url_obj:
-            raise NoResultFound(f"No URL found for short link: {short_link}")
-        long_url = url_obj.long_url
-        await redis.set(f"{REDIS_SHORTLINK_PREFIX}{short_link}", long_url)
+        if settings.SINGLE_FLIGHT_ENABLED:
+            # Concurrent misses for the same link share one Redis and DB round trip
+            long_url = await link_loads.do(
+                short_link, lambda: fetch_long_url(short_link, id, db, redis)
+            )
+        else:
+            long_url = await fetch_long_url(short_link, id, db, redis)
+        local_cache.set(short_link, long_url)
 
-    background_tasks.add_task(increment_access_count, short_link, db)
+    background_tasks.add_task(increment_access_count, short_link, redis, click)
 
+    # Prefixed with the link's own redirect status when it has one; see split_redirect_value
     return long_url
 
 
-async def get_link_stats(short_link: str, db: AsyncSession) -> dict:
-    id = decode(short_link)
-    query = select(URL).where(URL.id == id)
-    result = await db.execute(query)
-    url_obj = result.scalars().first()
+async def fetch_long_url(short_link: str, id: int, db: AsyncSession | None, redis: Redis) -> str:
+    long_url = await get_cached_link(redis, short_link)
+    if long_url is None:
+        if settings.SINGLE_FLIGHT_LEASE_ENABLED:
+            long_url = await load_long_url_with_lease(short_link, id, db, redis)
+        else:
+            long_url = await load_long_url(short_link, id, db, redis)
+    if long_url == MISSING_LINK:
+        negative_cache.set(short_link, MISSING_LINK)
+        rejected_lookups["negative_cache"] += 1
+        raise NoResultFound(f"No URL found for short link: {short_link}")
+    return long_url
+
 
+async def load_long_url_with_lease(short_link: str, id: int, db: AsyncSession | None, redis: Redis) -> str:
+    # Only one node loads a missing link from the DB; the rest wait for it in Redis
+    lease_key = link_lease_key(short_link)
+    token = await acquire_lock(redis, lease_key, settings.SINGLE_FLIGHT_LEASE_TTL_MS)
+    if token is None:
+        lease_waits["waited"] += 1
+        long_url = await wait_for_cached_link(short_link, redis)
+        if long_url is not None:
+            return long_url
+        # The holder is slow or gone: load it ourselves rather than fail the redirect
+        lease_waits["timed_out"] += 1
+        return await load_long_url(short_link, id, db, redis)
+    try:
+        return await load_long_url(short_link, id, db, redis)
+    finally:
+        await release_lock(redis, lease_key, token)
+
+
+async def wait_for_cached_link(short_link: str, redis: Redis) -> str | None:
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_LEASE_WAIT_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.SINGLE_FLIGHT_LEASE_POLL_MS / 1000)
+        long_url = await get_cached_link(redis, short_link)
+        if long_url is not None:
+            return long_url
+    return None
+
+
+async def load_long_url(short_link: str, id: int, db: AsyncSession | None, redis: Redis) -> str:
+    if not await id_range.contains(id):
+        # Not remembered as missing: the range is only refreshed now and then, so
+        # the id may belong to a block another worker just reserved
+        rejected_lookups["out_of_range"] += 1
+        raise NoResultFound(f"Short link outside the allocated range: {short_link}")
+
+    # Without a session from the caller, one is opened here, on a cache miss only
+    async with shards.session(0, db) as session:
+        url_obj = await read_url(id, session)
     if not url_obj:
+        await remember_missing_link(short_link, redis)
+        raise NoResultFound(f"No URL found for short link: {short_link}")
+    value = redirect_value(url_obj.long_url, url_obj.redirect_status)
+    await cache_link(redis, short_link, value)
+    return value
+
+
+async def find_url(id: int, db: AsyncSession) -> Row | None:
+    result = await db.execute(FIND_URL_QUERY, {"id": id})
+    return result.first()
+
+
+async def read_primary_url(id: int, db: AsyncSession) -> Row | None:
+    # Stats add the pending clicks in Redis to this count, and the flusher drops
+    # clicks from Redis as soon as the primary commits them. A lagging replica
+    # could still hold the count from before, so the total would go backwards.
+    async with shards.session(shard_of(id), db) as session:
+        return await find_url(id, session)
+
+
+async def read_url(id: int, db: AsyncSession) -> Row | None:
+    shard = shard_of(id)
+    if shard != 0:
+        async with shards.session(shard) as session:
+            return await find_url(id, session)
+    # Read from a replica when there is one. A miss there may only be replica lag
+    # on a link created moments ago, so it is confirmed on the primary.
+    index = read_replicas.choose()
+    if index is None:
+        return await find_url(id, db)
+    try:
+        url_obj = await read_replicas.run(index, lambda session: find_url(id, session))
+    except Exception as e:
+        replica_reads["errors"] += 1
+        logger.warning(f"Read replica lookup failed, using the primary: {e}")
+        return await find_url(id, db)
+    if url_obj is None:
+        replica_reads["misses"] += 1
+        return await find_url(id, db)
+    replica_reads["hits"] += 1
+    return url_obj
+
+
+async def remember_missing_link(short_link: str, redis: Redis):
+    if not settings.NEGATIVE_CACHE_ENABLED:
+        return
+    negative_cache.set(short_link, MISSING_LINK)
+    await cache_missing_link(redis, short_link, settings.NEGATIVE_CACHE_REDIS_TTL_SECONDS)
+
+
+async def invalidate_short_link(short_link: str, redis: Redis):
+    # Drop the link from Redis and tell every worker to evict it from its L1 cache
+    await uncache_link(redis, short_link)
+    local_cache.invalidate(short_link)
+    stats_cache.invalidate(short_link)
+    await redis.publish(settings.L1_CACHE_INVALIDATION_CHANNEL, short_link)
+
+
+async def invalidate_all_short_links(redis: Redis):
+    local_cache.clear()
+    await redis.publish(settings.L1_CACHE_INVALIDATION_CHANNEL, INVALIDATE_ALL)
+
+
+async def get_link_stats(short_link: str, db: AsyncSession, redis: Redis) -> dict:
+    id = decode_short_link(short_link)
+    pending, generation = await get_pending_access_count(id, redis)
+
+    # The DB only changes when the flusher applies clicks, so until the next
+    # flush a polled link is answered from the cache and Redis alone
+    cached = stats_cache.get(short_link)
+    if cached is not None and cached[2] == generation:
+        long_url, access_count = cached[0], cached[1]
+    else:
+        url_obj = await read_primary_url(id, db)
+        if not url_obj:
+            raise NoResultFound(f"No stats found for short link: {short_link}")
+        long_url, access_count = url_obj.long_url, url_obj.access_count
+        stats_cache.set(short_link, (long_url, access_count, generation))
+
+    return {
+        "long_url": long_url,
+        "short_link": short_link,
+        "access_count": access_count + pending,
+    }
+
+
+async def get_link_timeseries(
+    short_link: str,
+    granularity: str,
+    start: datetime | None,
+    end: datetime | None,
+    db: AsyncSession,
+) -> dict:
+    id = decode_short_link(short_link)
+    if await read_url(id, db) is None:
         raise NoResultFound(f"No stats found for short link: {short_link}")
 
+    step = GRANULARITIES[granularity]
+    # Buckets cover [start, end); by default the last 24 hours or 30 days, current one included
+    end = floor_to(end, granularity) if end else floor_to(datetime.now(timezone.utc), granularity) + step
+    start = floor_to(start, granularity) if start else end - step * (30 if granularity == "day" else 24)
+    if start >= end:
+        raise ValueError("from must be before to")
+    if (end - start) / step > settings.CLICK_TIMESERIES_MAX_POINTS:
+        raise ValueError(f"At most {settings.CLICK_TIMESERIES_MAX_POINTS} buckets can be requested at once")
+
+    points = await get_click_timeseries(id, granularity, start, end, db)
     return {
-        "long_url": url_obj.long_url,
         "short_link": short_link,
-        "access_count": url_obj.access_count,
+        "granularity": granularity,
+        "from": start,
+        "to": end,
+        "points": [{"timestamp": bucket, "clicks": clicks} for bucket, clicks in points],
     }
 
 
-async def increment_access_count(short_link: str, db: AsyncSession):
+async def increment_access_count(short_link: str, redis: Redis, click: dict[str, str] | None = None):
+    # Counted in Redis and written to the DB in batches by the access count flusher
     id = decode(short_link)
-    query = select(URL).where(URL.id == id)
-    result = await db.execute(query)
-    url_obj = result.scalars().first()
+    if not settings.CLICK_ROLLUP_ENABLED and click is None:
+        await redis.hincrby(REDIS_ACCESS_COUNT_PENDING_KEY, id, 1)
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hincrby(REDIS_ACCESS_COUNT_PENDING_KEY, id, 1)
+        if settings.CLICK_ROLLUP_ENABLED:
+            pipe.hincrby(REDIS_CLICK_ROLLUP_PENDING_KEY, rollup_field(id, time.time()), 1)
+        if click is not None:
+            add_click_event(pipe, click)
+        await pipe.execute()
+
+
+async def get_pending_access_count(id: int, redis: Redis) -> tuple[int, str | None]:
+    # Clicks not in the DB yet, and the flush generation they were read at
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hget(REDIS_ACCESS_COUNT_PENDING_KEY, id)
+        pipe.hget(REDIS_ACCESS_COUNT_FLUSHING_KEY, id)
+        pipe.get(REDIS_ACCESS_COUNT_GENERATION_KEY)
+        pending, flushing, generation = await pipe.execute()
+    return int(pending or 0) + int(flushing or 0), generation
 
-    if url_obj:
-        url_obj.access_count += 1
-        await db.commit()
+
+async def apply_access_count_deltas(deltas: dict[int, int], db: AsyncSession):
+    by_shard: dict[int, dict[int, int]] = {}
+    for id, delta in deltas.items():
+        by_shard.setdefault(shard_of(id), {})[id] = delta
+    for shard, shard_deltas in by_shard.items():
+        async with shards.session(shard, db) as session:
+            await apply_shard_access_count_deltas(shard_deltas, session)
+
+
+async def apply_shard_access_count_deltas(deltas: dict[int, int], db: AsyncSession):
+    # One set-based UPDATE ... FROM (VALUES ...) for the whole batch
+    rows = values(
+        column("id", BigInteger), column("delta", Integer), name="deltas"
+    ).data(list(deltas.items()))
+    query = (
+        update(URL)
+        .where(URL.id == rows.c.id)
+        .values(access_count=URL.access_count + rows.c.delta)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(query)
+    await db.commit()
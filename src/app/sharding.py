@@ -0,0 +1,29 @@
+from .core.config import settings
+
+# Ids carry their shard in the bits above SHARD_ID_BITS, so any short link routes to
+# its shard with no lookup. Shard 0 ids are plain sequence values, which keeps every
+# id issued before sharding valid. Must never change once a shard holds links.
+SHARD_ID_BITS = 40
+LOCAL_ID_MASK = (1 << SHARD_ID_BITS) - 1
+
+
+def shard_id(shard: int, local_id: int) -> int:
+    # A larger local id would spill into the shard bits and collide with another shard's ids
+    if not 0 <= local_id <= LOCAL_ID_MASK:
+        raise ValueError(f"Local id {local_id} does not fit in {SHARD_ID_BITS} bits")
+    return (shard << SHARD_ID_BITS) | local_id
+
+
+def shard_of(id: int) -> int:
+    return id >> SHARD_ID_BITS
+
+
+def local_id(id: int) -> int:
+    return id & LOCAL_ID_MASK
+
+
+def write_shard_for(digest: bytes) -> int:
+    # Spread by long URL digest rather than round-robin, so the dedup lookup for a
+    # URL knows the one shard to ask
+    write_shards = settings.DB_WRITE_SHARD_LIST
+    return write_shards[int.from_bytes(digest[:8], "big") % len(write_shards)]
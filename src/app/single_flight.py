@@ -0,0 +1,41 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    # Per-key request coalescing: while a call for a key is in flight, later callers
+    # for the same key wait for its result instead of starting their own
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            # The call runs in a task of its own, so it outlives its first caller
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._finish(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        # Shielded so a caller that goes away, the first one included, does not
+        # cancel the call the others are waiting for
+        return await asyncio.shield(call)
+
+    def _finish(self, key: str, call: asyncio.Task):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark a failure retrieved so a call whose callers all went away does not log a warning
+        if not call.cancelled():
+            call.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,245 @@
+import asyncio
+import bisect
+import contextlib
+import fcntl
+import heapq
+import mmap
+import os
+import struct
+import time
+from array import array
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+from .core.config import settings
+from .core.db import read_replicas, shards
+from .core.logger import get_logger
+from .link_cache import redirect_value
+from .models import URL
+
+logger = get_logger(__name__)
+
+# Snapshot file layout, in native byte order since it never leaves the host:
+#   header   magic, link count
+#   ids      count sorted uint64 link ids
+#   ends     count uint64 offsets where each link's URL ends in the blob
+#   blob     the UTF-8 long URLs, back to back
+SNAPSHOT_MAGIC = b"SLSNAP01"
+SNAPSHOT_HEADER = struct.Struct("=8sQ")
+
+
+def write_snapshot(path: str, links: list[tuple[int, str]]):
+    # Written next to the target and renamed over it, so readers only ever see a
+    # complete file. Workers that still map the old one keep reading it until they reload.
+    links = sorted(links)
+    ids = array("Q", (id for id, _ in links))
+    urls = [long_url.encode() for _, long_url in links]
+    ends = array("Q")
+    end = 0
+    for url in urls:
+        end += len(url)
+        ends.append(end)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(links)))
+        f.write(ids.tobytes())
+        f.write(ends.tobytes())
+        f.write(b"".join(urls))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+async def top_links(
+    max_links: int, session_factories: list[sessionmaker] | None = None
+) -> list[tuple[int, str]]:
+    # The most accessed links of each shard, then the most accessed of those. Each
+    # shard runs one scan with a bounded top-N sort; access_count has no index, which
+    # would cost every access count flush its HOT updates.
+    query = (
+        select(URL.id, URL.long_url, URL.access_count, URL.redirect_status)
+        .order_by(URL.access_count.desc())
+        .limit(max_links)
+    )
+
+    async def run(db) -> list:
+        return (await db.execute(query)).all()
+
+    async def read(shard: int, session_factory: sessionmaker) -> list:
+        # The first shard's read replicas take this off the primary; a lagging
+        # replica only costs a few clicks of ranking accuracy
+        index = read_replicas.choose() if shard == 0 else None
+        if index is not None:
+            try:
+                return await read_replicas.run(index, run)
+            except Exception as e:
+                logger.warning(f"Read replica top links query failed, using the primary: {e}")
+        async with session_factory() as db:
+            return await run(db)
+
+    factories = session_factories or shards.session_factories
+    rows = await asyncio.gather(*(read(shard, factory) for shard, factory in enumerate(factories)))
+    top = heapq.nlargest(max_links, (row for shard_rows in rows for row in shard_rows), key=lambda row: row[2])
+    return [(id, redirect_value(long_url, redirect_status)) for id, long_url, _, redirect_status in top]
+
+
+async def build_snapshot(path: str = settings.SNAPSHOT_PATH, max_links: int = settings.SNAPSHOT_MAX_LINKS) -> int:
+    links = await top_links(max_links)
+    await asyncio.to_thread(write_snapshot, path, links)
+    return len(links)
+
+
+class LinkSnapshot:
+    # Lookups binary search the mapped id array, so every worker on the host shares
+    # the same page cache pages and nothing is copied in until a link is read
+    def __init__(self, path: str = settings.SNAPSHOT_PATH):
+        self.path = path
+        self._mmap: mmap.mmap | None = None
+        self._view: memoryview | None = None
+        self._ids: memoryview | None = None
+        self._ends: memoryview | None = None
+        self._blob_start = 0
+        self._version: tuple | None = None
+        self.loaded_at = 0.0
+        self.loads = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._ids) if self._ids is not None else 0
+
+    def load(self) -> bool:
+        # Maps the file again only if it was replaced since the last load
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if version == self._version:
+            return False
+
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = SNAPSHOT_HEADER.unpack_from(mapped)
+        if magic != SNAPSHOT_MAGIC:
+            mapped.close()
+            raise ValueError(f"Not a link snapshot: {self.path}")
+        view = memoryview(mapped)
+        ids_start = SNAPSHOT_HEADER.size
+        ends_start = ids_start + 8 * count
+
+        self.close()
+        self._mmap, self._view = mapped, view
+        self._ids = view[ids_start:ends_start].cast("Q")
+        self._ends = view[ends_start:ends_start + 8 * count].cast("Q")
+        self._blob_start = ends_start + 8 * count
+        self._version = version
+        self.loaded_at = time.time()
+        self.loads += 1
+        return True
+
+    def get(self, id: int) -> str | None:
+        ids = self._ids
+        if ids is None:
+            return None
+        i = bisect.bisect_left(ids, id)
+        if i == len(ids) or ids[i] != id:
+            self.misses += 1
+            return None
+        self.hits += 1
+        start = self._ends[i - 1] if i else 0
+        return self._mmap[self._blob_start + start:self._blob_start + self._ends[i]].decode()
+
+    def close(self):
+        # Views into the map must be released before it can be closed
+        for view in (self._ids, self._ends, self._view):
+            if view is not None:
+                view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = self._view = self._ids = self._ends = None
+        self._version = None
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "links": len(self),
+            "loads": self.loads,
+            "loaded_at": self.loaded_at,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class SnapshotRefresher:
+    def __init__(
+        self,
+        snapshot: LinkSnapshot,
+        interval: float = settings.SNAPSHOT_CHECK_SECONDS,
+        rebuild_seconds: float = settings.SNAPSHOT_REBUILD_SECONDS,
+        max_links: int = settings.SNAPSHOT_MAX_LINKS,
+    ):
+        self.snapshot = snapshot
+        self.interval = interval
+        self.rebuild_seconds = rebuild_seconds
+        self.max_links = max_links
+        self.rebuilds = 0
+        self.failed_rebuilds = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self.snapshot.close()
+
+    def _is_stale(self) -> bool:
+        try:
+            return time.time() - os.stat(self.snapshot.path).st_mtime >= self.rebuild_seconds
+        except FileNotFoundError:
+            return True
+
+    async def refresh(self):
+        if self._is_stale():
+            await self._rebuild()
+        self.snapshot.load()
+
+    async def _rebuild(self):
+        # A host-wide file lock picks the worker that rebuilds; the others keep
+        # using the current file and pick up the new one on a later check
+        with open(f"{self.snapshot.path}.lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            # Another worker may have rebuilt it while we waited for our turn
+            if not self._is_stale():
+                return
+            try:
+                links = await build_snapshot(self.snapshot.path, self.max_links)
+            except Exception as e:
+                self.failed_rebuilds += 1
+                logger.error(f"Failed to rebuild the link snapshot: {e}", exc_info=True)
+                return
+            self.rebuilds += 1
+            logger.info(f"Rebuilt the link snapshot with {links} links")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Failed to load the link snapshot: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {**self.snapshot.stats(), "rebuilds": self.rebuilds, "failed_rebuilds": self.failed_rebuilds}
+
+
+link_snapshot = LinkSnapshot()
+snapshot_refresher = SnapshotRefresher(link_snapshot)
@@ -0,0 +1,229 @@
+import asyncio
+import contextlib
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable
+from redis.asyncio import Redis
+from sqlalchemy import func, tuple_
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+from .base62 import encode
+from .core.config import settings
+from .core.db import read_replicas, shards
+from .core.local_cache import local_cache
+from .core.logger import get_logger
+from .core.redis import acquire_lock, get_redis_client, release_lock
+from .link_cache import cache_links, get_cached_links, redirect_value
+from .models import URL, ClickRollup
+from .sharding import shard_of
+
+logger = get_logger(__name__)
+
+# Held by the worker that streams the hot links from Postgres, so a deploy warms
+# Redis once rather than once per worker
+WARMUP_LOCK_KEY = "warmup:lock"
+# The short links the lock holder put into its L1 cache, comma-separated, so the
+# other workers can fill theirs from Redis rather than from Postgres
+WARMUP_LOCAL_LINKS_KEY = "warmup:local_links"
+WARMUP_LOCK_POLL_SECONDS = 0.5
+
+TOP_LINKS_QUERY = select(URL.id, URL.long_url, URL.redirect_status).order_by(URL.access_count.desc())
+
+
+async def stream_top_links(
+    session_factory: sessionmaker, max_links: int, batch_size: int
+) -> AsyncIterator[list[tuple[int, str]]]:
+    # access_count is deliberately not indexed: an index on it would turn off HOT
+    # updates for every access count flush. One top-N query is one scan with a
+    # bounded sort, and its rows are streamed from a server-side cursor in pages.
+    async with session_factory() as db:
+        result = await db.stream(TOP_LINKS_QUERY.limit(max_links))
+        async for rows in result.partitions(batch_size):
+            yield [(id, redirect_value(long_url, redirect_status)) for id, long_url, redirect_status in rows]
+
+
+async def links_by_access_count(
+    max_links: int, batch_size: int, session_factories: list[sessionmaker] | None = None
+) -> AsyncIterator[list[tuple[int, str]]]:
+    # Links are spread over the shards by a hash of their URL, so each shard's
+    # equal share of the top links is close to the global top. Pages are taken
+    # from the shards in turn, so a warm-up cut short by its budget covers all of them.
+    if session_factories is None:
+        session_factories = list(shards.session_factories)
+        # The scan of the first shard goes to a read replica when there is one
+        index = read_replicas.choose()
+        if index is not None:
+            session_factories[0] = read_replicas.session_factories[index]
+    per_shard = math.ceil(max_links / len(session_factories))
+    streams = [stream_top_links(factory, per_shard, batch_size) for factory in session_factories]
+    while streams:
+        for stream in list(streams):
+            try:
+                yield await anext(stream)
+            except StopAsyncIteration:
+                streams.remove(stream)
+
+
+async def links_by_recent_clicks(
+    max_links: int, batch_size: int, window_hours: int = settings.WARMUP_CLICKS_WINDOW_HOURS
+) -> AsyncIterator[list[tuple[int, str]]]:
+    # Hourly rollups live on the first shard; only the partitions in the window are read
+    since = datetime.now(timezone.utc) - timedelta(hours=window_hours)
+    clicks = (
+        select(ClickRollup.url_id, func.sum(ClickRollup.clicks).label("clicks"))
+        .where(ClickRollup.hour >= since)
+        .group_by(ClickRollup.url_id)
+        .subquery()
+    )
+    query = select(clicks.c.url_id, clicks.c.clicks).order_by(clicks.c.clicks.desc(), clicks.c.url_id.desc())
+    after = None
+    while max_links > 0:
+        limit = min(batch_size, max_links)
+        page = query.limit(limit)
+        if after is not None:
+            page = page.where(tuple_(clicks.c.clicks, clicks.c.url_id) < after)
+        async with shards.session_factories[0]() as db:
+            rows = (await db.execute(page)).all()
+        if rows:
+            yield await read_links([url_id for url_id, _ in rows])
+        if len(rows) < limit:
+            return
+        max_links -= len(rows)
+        after = (rows[-1].clicks, rows[-1].url_id)
+
+
+async def read_links(ids: list[int]) -> list[tuple[int, str]]:
+    by_shard: dict[int, list[int]] = {}
+    for id in ids:
+        by_shard.setdefault(shard_of(id), []).append(id)
+
+    async def read(shard: int, shard_ids: list[int]) -> list:
+        async with shards.session(shard) as db:
+            query = select(URL.id, URL.long_url, URL.redirect_status).where(URL.id.in_(shard_ids))
+            return (await db.execute(query)).all()
+
+    rows = await asyncio.gather(*(read(shard, shard_ids) for shard, shard_ids in by_shard.items()))
+    values = {id: redirect_value(long_url, status) for shard_rows in rows for id, long_url, status in shard_rows}
+    # Clicked links that have since been deleted are skipped
+    return [(id, values[id]) for id in ids if id in values]
+
+
+def hot_links(
+    source: str = settings.WARMUP_SOURCE,
+    max_links: int = settings.WARMUP_MAX_LINKS,
+    batch_size: int = settings.WARMUP_BATCH_SIZE,
+) -> AsyncIterator[list[tuple[int, str]]]:
+    if source == "clicks":
+        return links_by_recent_clicks(max_links, batch_size)
+    return links_by_access_count(max_links, batch_size)
+
+
+async def warm_links(
+    redis: Redis,
+    source: str = settings.WARMUP_SOURCE,
+    max_links: int = settings.WARMUP_MAX_LINKS,
+    batch_size: int = settings.WARMUP_BATCH_SIZE,
+    local: bool = True,
+    progress: Callable[[list[tuple[str, str]]], None] | None = None,
+) -> int:
+    # Every page is written to Redis with one pipeline per cache node. The L1 cache
+    # only takes the hottest links it has room for, so colder ones never evict them.
+    warmed = 0
+    async for batch in hot_links(source, max_links, batch_size):
+        links = [(encode(id), value) for id, value in batch]
+        await cache_links(redis, links, settings.LINK_CACHE_TTL_SECONDS)
+        if local:
+            for short_link, value in links[: max(local_cache.max_size - warmed, 0)]:
+                local_cache.set(short_link, value)
+        warmed += len(links)
+        if progress:
+            progress(links)
+    return warmed
+
+
+class CacheWarmer:
+    def __init__(self, budget_seconds: float = settings.WARMUP_BUDGET_SECONDS):
+        self.budget_seconds = budget_seconds
+        # Ready until a warm-up is started, so a disabled warm-up never holds back /health
+        self.ready = True
+        self.links = 0
+        self.seconds = 0.0
+        self.timed_out = False
+        self.failed = False
+        self._local_links: list[str] = []
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self.ready = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self):
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self.warm(get_redis_client()), self.budget_seconds)
+            logger.info(f"Cache warm-up done: {self.links} links in {time.monotonic() - started:.1f}s")
+        except asyncio.TimeoutError:
+            # Whatever was loaded stays cached; the rest is loaded on demand
+            self.timed_out = True
+            logger.warning(f"Cache warm-up stopped after {self.budget_seconds}s with {self.links} links loaded")
+        except Exception as e:
+            self.failed = True
+            logger.error(f"Cache warm-up failed: {e}", exc_info=True)
+        finally:
+            self.seconds = time.monotonic() - started
+            self.ready = True
+
+    async def warm(self, redis: Redis):
+        token = await acquire_lock(redis, WARMUP_LOCK_KEY, int(self.budget_seconds * 1000))
+        if token is None:
+            # Another worker is warming Redis; once it is done, this one fills its L1 cache from there
+            while await redis.exists(WARMUP_LOCK_KEY):
+                await asyncio.sleep(WARMUP_LOCK_POLL_SECONDS)
+            await self.warm_local(redis)
+            return
+        try:
+            await warm_links(redis, progress=self._add_links)
+            if self._local_links:
+                await redis.set(
+                    WARMUP_LOCAL_LINKS_KEY, ",".join(self._local_links), ex=settings.LINK_CACHE_TTL_SECONDS
+                )
+        finally:
+            await release_lock(redis, WARMUP_LOCK_KEY, token)
+
+    async def warm_local(self, redis: Redis):
+        local_links = await redis.get(WARMUP_LOCAL_LINKS_KEY)
+        if not local_links:
+            return
+        short_links = local_links.split(",")
+        for start in range(0, len(short_links), settings.WARMUP_BATCH_SIZE):
+            batch = short_links[start:start + settings.WARMUP_BATCH_SIZE]
+            found = await get_cached_links(redis, batch)
+            for short_link in batch:
+                if short_link in found:
+                    local_cache.set(short_link, found[short_link])
+            self.links += len(found)
+
+    def _add_links(self, links: list[tuple[str, str]]):
+        self.links += len(links)
+        room = max(local_cache.max_size - len(self._local_links), 0)
+        self._local_links.extend(short_link for short_link, _ in links[:room])
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "links": self.links,
+            "seconds": self.seconds,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+        }
+
+
+cache_warmer = CacheWarmer()
@@ -62,17 +62,19 @@ def run_migrations_online():
     In this scenario we need to create an Engine
     and associate a connection with the context.
     """
-    connectable = create_engine(
-        f"{settings.POSTGRES_SYNC_URL}",
-        poolclass=pool.NullPool,
-    )
-
-    with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
-        with context.begin_transaction():
-            context.run_migrations()
-
-    connectable.dispose()
+    # Every shard gets the same schema; shard 0 is the primary database
+    for url in settings.POSTGRES_SHARD_SYNC_URLS:
+        connectable = create_engine(
+            f"{url}",
+            poolclass=pool.NullPool,
+        )
+
+        with connectable.connect() as connection:
+            context.configure(connection=connection, target_metadata=target_metadata)
+            with context.begin_transaction():
+                context.run_migrations()
+
+        connectable.dispose()
 
 
 if context.is_offline_mode():
@@ -0,0 +1,92 @@
+"""Widen urls.id to BIGINT
+
+Revision ID: 2e8b6f4a7c13
+Revises: 9c1d7e3a5b82
+Create Date: 2026-10-18 11:47:09.208416
+
+"""
+
+import os
+import time
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2e8b6f4a7c13"
+down_revision: Union[str, None] = "9c1d7e3a5b82"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# ALTER COLUMN ... TYPE bigint would rewrite the table under an ACCESS EXCLUSIVE lock.
+# Instead ids are copied into a shadow column in small transactions while the app
+# keeps running, and only the final swap takes a brief lock. The backfill pauses
+# between batches so replicas and concurrent writes keep up.
+BACKFILL_BATCH_SIZE = int(os.getenv("URLS_ID_BACKFILL_BATCH_SIZE", 50000))
+BACKFILL_PAUSE_SECONDS = float(os.getenv("URLS_ID_BACKFILL_PAUSE_SECONDS", 0.1))
+
+SYNC_ID_FUNCTION = """
+CREATE OR REPLACE FUNCTION urls_sync_id_new() RETURNS trigger AS $$
+BEGIN
+    NEW.id_new := NEW.id;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    # Rows written from now on get id_new from the trigger, so the backfill only
+    # has to cover the rows that exist when it starts
+    op.add_column("urls", sa.Column("id_new", sa.BigInteger(), nullable=True))
+    op.execute(SYNC_ID_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER urls_sync_id_new BEFORE INSERT OR UPDATE ON urls "
+        "FOR EACH ROW EXECUTE FUNCTION urls_sync_id_new()"
+    )
+
+    with op.get_context().autocommit_block():
+        backfill_id_new()
+        op.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS urls_id_new_key ON urls (id_new)")
+        # A validated CHECK lets SET NOT NULL below skip its full table scan
+        op.execute("ALTER TABLE urls ADD CONSTRAINT urls_id_new_not_null CHECK (id_new IS NOT NULL) NOT VALID")
+        op.execute("ALTER TABLE urls VALIDATE CONSTRAINT urls_id_new_not_null")
+        # Redundant with the primary key, and doubled the index writes of every insert
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_urls_id")
+
+    # The swap: metadata-only changes under one short lock
+    op.execute("LOCK TABLE urls IN ACCESS EXCLUSIVE MODE")
+    op.execute("ALTER TABLE urls ALTER COLUMN id_new SET NOT NULL")
+    op.execute("ALTER TABLE urls DROP CONSTRAINT urls_id_new_not_null")
+    op.execute("ALTER TABLE urls DROP CONSTRAINT urls_pkey")
+    op.execute("ALTER TABLE urls ADD CONSTRAINT urls_pkey PRIMARY KEY USING INDEX urls_id_new_key")
+    # Re-owned first, or dropping the old column would drop the sequence with it
+    op.execute("ALTER SEQUENCE urls_id_seq AS bigint OWNED BY urls.id_new")
+    op.execute("ALTER TABLE urls ALTER COLUMN id_new SET DEFAULT nextval('urls_id_seq')")
+    op.execute("DROP TRIGGER urls_sync_id_new ON urls")
+    op.execute("DROP FUNCTION urls_sync_id_new()")
+    op.drop_column("urls", "id")
+    op.alter_column("urls", "id_new", new_column_name="id")
+
+
+def backfill_id_new() -> None:
+    conn = op.get_bind()
+    min_id, max_id = conn.execute(sa.text("SELECT min(id), max(id) FROM urls")).one()
+    if min_id is None:
+        return
+    query = sa.text(
+        "UPDATE urls SET id_new = id WHERE id >= :start AND id < :end AND id_new IS NULL"
+    )
+    for start in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+        # Each statement commits on its own inside the autocommit block
+        conn.execute(query, {"start": start, "end": start + BACKFILL_BATCH_SIZE})
+        time.sleep(BACKFILL_PAUSE_SECONDS)
+
+
+def downgrade() -> None:
+    # Rewrites the table, and fails if any id no longer fits in 32 bits
+    op.execute("ALTER SEQUENCE urls_id_seq AS integer")
+    op.alter_column("urls", "id", type_=sa.Integer(), existing_type=sa.BigInteger(), existing_nullable=False)
+    op.create_index(op.f("ix_urls_id"), "urls", ["id"], unique=False)
@@ -0,0 +1,32 @@
+"""Reserve urls ids in blocks
+
+Revision ID: 4f7c2d9e8a61
+Revises: b21ba5023297
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4f7c2d9e8a61"
+down_revision: Union[str, None] = "b21ba5023297"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Every nextval() reserves this many ids for the calling worker (hi/lo allocation).
+# The app reads the increment from the sequence, so it can be changed later with
+# ALTER SEQUENCE without touching the app.
+ID_BLOCK_SIZE = 1000
+
+
+def upgrade() -> None:
+    op.execute(f"ALTER SEQUENCE urls_id_seq INCREMENT BY {ID_BLOCK_SIZE}")
+
+
+def downgrade() -> None:
+    op.execute("ALTER SEQUENCE urls_id_seq INCREMENT BY 1")
@@ -0,0 +1,47 @@
+"""Create url_clicks_hourly rollup table
+
+Revision ID: 6b4f2a8d1e57
+Revises: 2e8b6f4a7c13
+Create Date: 2026-10-18 12:31:52.774103
+
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "6b4f2a8d1e57"
+down_revision: Union[str, None] = "2e8b6f4a7c13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Partitioned by month, so a time range query only scans the months it covers and
+    # old months can be detached or dropped whole. The flusher creates later
+    # partitions as clicks for them arrive.
+    op.create_table(
+        "url_clicks_hourly",
+        sa.Column("url_id", sa.BigInteger(), nullable=False),
+        sa.Column("hour", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("clicks", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("url_id", "hour"),
+        postgresql_partition_by="RANGE (hour)",
+    )
+    month = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(2):
+        following = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+        op.execute(
+            f"CREATE TABLE url_clicks_hourly_{month:%Y%m} PARTITION OF url_clicks_hourly "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+
+
+def downgrade() -> None:
+    # Drops every partition with it
+    op.drop_table("url_clicks_hourly")
@@ -0,0 +1,59 @@
+"""Add long_url_digest to urls
+
+Revision ID: 9c1d7e3a5b82
+Revises: 4f7c2d9e8a61
+Create Date: 2026-10-18 11:04:27.512930
+
+"""
+
+import os
+import time
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9c1d7e3a5b82"
+down_revision: Union[str, None] = "4f7c2d9e8a61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The digest is backfilled in small id-range transactions while the app keeps
+# running, pausing between batches, and the index is built without blocking writes.
+# A single UPDATE would hold row locks on the whole table until it committed.
+BACKFILL_BATCH_SIZE = int(os.getenv("URLS_DIGEST_BACKFILL_BATCH_SIZE", 50000))
+BACKFILL_PAUSE_SECONDS = float(os.getenv("URLS_DIGEST_BACKFILL_PAUSE_SECONDS", 0.1))
+
+
+def upgrade() -> None:
+    # Nullable without a default: metadata only
+    op.add_column("urls", sa.Column("long_url_digest", sa.LargeBinary(length=16), nullable=True))
+
+    with op.get_context().autocommit_block():
+        backfill_long_url_digest()
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_urls_long_url_digest ON urls (long_url_digest)")
+
+
+def backfill_long_url_digest() -> None:
+    conn = op.get_bind()
+    min_id, max_id = conn.execute(sa.text("SELECT min(id), max(id) FROM urls")).one()
+    if min_id is None:
+        return
+    # Same digest as dedup.url_digest: the first 16 bytes of SHA-256 over the UTF-8 URL
+    query = sa.text(
+        "UPDATE urls SET long_url_digest = substring(sha256(convert_to(long_url, 'UTF8')) FROM 1 FOR 16) "
+        "WHERE id >= :start AND id < :end AND long_url_digest IS NULL"
+    )
+    for start in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+        # Each statement commits on its own inside the autocommit block
+        conn.execute(query, {"start": start, "end": start + BACKFILL_BATCH_SIZE})
+        time.sleep(BACKFILL_PAUSE_SECONDS)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_urls_long_url_digest")
+    op.drop_column("urls", "long_url_digest")
@@ -0,0 +1,28 @@
+"""Add per-link redirect status to urls
+
+Revision ID: a7e2c4b9d316
+Revises: d3a9c5e1f7b0
+Create Date: 2026-10-18 17:02:44.518203
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7e2c4b9d316"
+down_revision: Union[str, None] = "d3a9c5e1f7b0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nullable without a default, so adding it does not rewrite the table
+    op.add_column("urls", sa.Column("redirect_status", sa.SmallInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("urls", "redirect_status")
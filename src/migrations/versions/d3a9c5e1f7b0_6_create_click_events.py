@@ -0,0 +1,40 @@
+"""Create click_events table
+
+Revision ID: d3a9c5e1f7b0
+Revises: 6b4f2a8d1e57
+Create Date: 2026-10-18 13:15:06.381927
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d3a9c5e1f7b0"
+down_revision: Union[str, None] = "6b4f2a8d1e57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "click_events",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("clicked_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("url_id", sa.BigInteger(), nullable=False),
+        sa.Column("referrer", sa.String(), nullable=True),
+        sa.Column("user_agent_hash", sa.String(), nullable=True),
+        sa.Column("client_ip_prefix", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_click_events_url_id_clicked_at"), "click_events", ["url_id", "clicked_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_click_events_url_id_clicked_at"), table_name="click_events")
+    op.drop_table("click_events")
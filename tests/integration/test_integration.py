@@ -77,3 +77,20 @@ class TestIntegration:
 
         assert stats_response.status_code == 404
         assert stats_response.json() == {"detail": "Short link not found"}
+
+    def test_create_short_links_batch(self):
+        long_urls = ["https://example4.com/", "not a url", "https://example5.com/"]
+        response = httpx.post(
+            f"{self.APP_URL}/create/batch", json={"long_urls": long_urls}
+        )
+        assert response.status_code == 201
+        results = response.json()["results"]
+        assert [result["long_url"] for result in results] == long_urls
+        assert results[1]["short_link"] is None
+        assert results[1]["error"]
+        TestIntegration.current_id += 2
+
+        for result in (results[0], results[2]):
+            redirect_response = httpx.get(f"{self.APP_URL}/{result['short_link']}")
+            assert redirect_response.status_code == 307
+            assert redirect_response.headers["Location"] == result["long_url"]
@@ -0,0 +1,23 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.app.core.local_cache import local_cache, negative_cache, stats_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    for cache in (local_cache, negative_cache, stats_cache):
+        cache.clear()
+        cache.reset_stats()
+    yield
+    for cache in (local_cache, negative_cache, stats_cache):
+        cache.clear()
+        cache.reset_stats()
+
+
+@pytest.fixture(autouse=True)
+def allocated_id_range():
+    # Every canonical id in range unless a test says otherwise, so no test reads the sequence
+    with patch(
+        "src.app.services.id_range.contains", new=AsyncMock(return_value=True)
+    ) as contains:
+        yield contains
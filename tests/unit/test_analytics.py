@@ -0,0 +1,86 @@
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.app.analytics import (
+    apply_click_rollups,
+    ensure_partitions,
+    floor_to,
+    get_click_timeseries,
+    next_month,
+    parse_rollup_field,
+    rollup_field,
+)
+
+
+def test_rollup_field_round_trip():
+    field = rollup_field(100000000, 1792319400.5)
+
+    assert field == "100000000:1792317600"
+    assert parse_rollup_field(field) == (100000000, datetime(2026, 10, 18, 10, tzinfo=timezone.utc))
+
+
+def test_floor_to_and_next_month():
+    moment = datetime(2026, 12, 18, 10, 42, 7)
+
+    assert floor_to(moment, "hour") == datetime(2026, 12, 18, 10, tzinfo=timezone.utc)
+    assert floor_to(moment, "day") == datetime(2026, 12, 18, tzinfo=timezone.utc)
+    assert next_month(moment) == datetime(2027, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_ensure_partitions_creates_each_month_once():
+    db_mock = AsyncMock()
+    october = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+    with patch("src.app.analytics.known_partitions", set()):
+        await ensure_partitions({october}, db_mock)
+        await ensure_partitions({october}, db_mock)
+
+    db_mock.execute.assert_awaited_once()
+    query = str(db_mock.execute.await_args.args[0])
+    assert "url_clicks_hourly_202610 PARTITION OF url_clicks_hourly" in query
+    assert "TO ('2026-11-01T00:00:00+00:00')" in query
+
+
+@pytest.mark.asyncio
+async def test_apply_click_rollups_creates_the_partition_again_after_a_failed_commit():
+    db_mock = AsyncMock()
+    # Partition commit fails on the first flush; the retry commits both
+    db_mock.commit = AsyncMock(side_effect=[OSError("db down"), None, None])
+    counts = {(100000000, datetime(2026, 10, 18, 10, tzinfo=timezone.utc)): 3}
+
+    with patch("src.app.analytics.known_partitions", set()) as known:
+        with pytest.raises(OSError):
+            await apply_click_rollups(counts, db_mock)
+        assert not known
+
+        await apply_click_rollups(counts, db_mock)
+        assert known == {datetime(2026, 10, 1, tzinfo=timezone.utc)}
+
+    creates = [call for call in db_mock.execute.await_args_list if "CREATE TABLE" in str(call.args[0])]
+    assert len(creates) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_click_timeseries_sums_hours_into_zero_filled_days():
+    db_mock = AsyncMock()
+    result = MagicMock()
+    result.all.return_value = [
+        (datetime(2026, 10, 17, 9, tzinfo=timezone.utc), 3),
+        (datetime(2026, 10, 17, 23, tzinfo=timezone.utc), 4),
+    ]
+    db_mock.execute = AsyncMock(return_value=result)
+
+    points = await get_click_timeseries(
+        100000000,
+        "day",
+        datetime(2026, 10, 16, tzinfo=timezone.utc),
+        datetime(2026, 10, 19, tzinfo=timezone.utc),
+        db_mock,
+    )
+
+    assert points == [
+        (datetime(2026, 10, 16, tzinfo=timezone.utc), 0),
+        (datetime(2026, 10, 17, tzinfo=timezone.utc), 7),
+        (datetime(2026, 10, 18, tzinfo=timezone.utc), 0),
+    ]
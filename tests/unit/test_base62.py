@@ -0,0 +1,22 @@
+import pytest
+from src.app.base62 import MAX_ENCODED_LEN, MAX_ID, decode, encode, is_canonical
+
+
+@pytest.mark.parametrize("num", [0, 1, 61, 62, 100000000, 2**31 - 1, 2**31, 2**32, 2**53 + 1, MAX_ID])
+def test_round_trip(num):
+    assert decode(encode(num)) == num
+
+
+def test_max_id_fits_max_encoded_len():
+    assert encode(MAX_ID) == "AzL8n0Y58m7"
+    assert len(encode(MAX_ID)) == MAX_ENCODED_LEN
+    assert is_canonical(encode(MAX_ID))
+
+
+def test_is_canonical():
+    assert is_canonical(encode(100000000))
+    assert is_canonical("0")
+    assert not is_canonical("")
+    assert not is_canonical("06LAze")
+    assert not is_canonical("6LA-ze")
+    assert not is_canonical("z" * 12)
@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.app.base62 import encode
+from src.app.batching import CreateLinkBatcher
+
+
+def mock_session_factory():
+    db = AsyncMock()
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=db)
+    session.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=session), db
+
+
+def mock_allocator(first_id):
+    allocator = MagicMock()
+    next_id = [first_id]
+
+    async def allocate_many(count):
+        ids = list(range(next_id[0], next_id[0] + count))
+        next_id[0] += count
+        return ids
+
+    allocator.allocate_many = allocate_many
+    return allocator
+
+
+def make_batcher(max_size=10, max_wait_ms=5, first_id=100000000):
+    session_factory, db = mock_session_factory()
+    batcher = CreateLinkBatcher(
+        AsyncMock(),
+        max_size=max_size,
+        max_wait_ms=max_wait_ms,
+        session_factory=session_factory,
+        allocator=mock_allocator(first_id),
+    )
+    return batcher, db
+
+
+@pytest.mark.asyncio
+async def test_concurrent_creates_share_one_insert():
+    batcher, db = make_batcher()
+
+    with patch("src.app.batching.cache_links", new=AsyncMock()) as cache_mock:
+        short_links = await asyncio.gather(
+            batcher.submit("https://a.com"),
+            batcher.submit("https://b.com"),
+            batcher.submit("https://c.com"),
+        )
+
+    assert short_links == [encode(100000000), encode(100000001), encode(100000002)]
+    db.execute.assert_awaited_once()
+    assert [row["id"] for row in db.execute.await_args.args[1]] == [100000000, 100000001, 100000002]
+    db.commit.assert_awaited_once()
+    cache_mock.assert_awaited_once()
+    assert cache_mock.await_args.args[1][1] == (encode(100000001), "https://b.com")
+    assert batcher.stats()["largest_batch"] == 3
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_written_without_waiting():
+    batcher, db = make_batcher(max_size=2, max_wait_ms=10000, first_id=1)
+
+    with patch("src.app.batching.cache_links", new=AsyncMock()):
+        first_batch = asyncio.gather(batcher.submit("https://a.com"), batcher.submit("https://b.com"))
+        assert await asyncio.wait_for(first_batch, timeout=1) == [encode(1), encode(2)]
+
+        third = asyncio.create_task(batcher.submit("https://c.com"))
+        await asyncio.sleep(0)
+        await batcher.close()
+        assert await third == encode(3)
+
+    assert db.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_insert_failure_is_raised_to_every_caller():
+    batcher, db = make_batcher(max_wait_ms=1)
+    db.execute = AsyncMock(side_effect=OSError("db down"))
+
+    with patch("src.app.batching.cache_links", new=AsyncMock()), patch(
+        "src.app.batching.uncache_links", new=AsyncMock()
+    ) as uncache_mock:
+        results = await asyncio.gather(
+            batcher.submit("https://a.com"), batcher.submit("https://b.com"), return_exceptions=True
+        )
+
+    assert all(isinstance(result, OSError) for result in results)
+    # The links were cached concurrently with the failed INSERT and must not resolve
+    assert uncache_mock.await_args.args[1] == [encode(100000000), encode(100000001)]
+
+
+@pytest.mark.asyncio
+async def test_cache_failure_still_returns_short_links():
+    batcher, _ = make_batcher(max_wait_ms=1)
+
+    with patch("src.app.batching.cache_links", new=AsyncMock(side_effect=OSError("redis down"))):
+        assert await batcher.submit("https://a.com") == encode(100000000)
@@ -0,0 +1,135 @@
+import io
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.app.base62 import decode, encode
+from src.app.cli import (
+    ADVANCE_SEQUENCE_QUERY,
+    Progress,
+    chunked,
+    detect_format,
+    export_urls,
+    import_urls,
+    migrate_cache_layout,
+    parse_args,
+    read_rows,
+    to_record,
+)
+from src.app.dedup import url_digest
+
+
+def test_detect_format():
+    assert detect_format("urls.ndjson", None) == "ndjson"
+    assert detect_format("urls.jsonl", None) == "ndjson"
+    assert detect_format("urls.csv", None) == "csv"
+    assert detect_format("-", "ndjson") == "ndjson"
+
+
+def test_read_rows_csv_and_ndjson():
+    csv_source = io.StringIO(
+        "id,long_url,access_count,redirect_status\n100000000,https://a.com/,3,\n,https://b.com/,,301\n"
+    )
+    ndjson_source = io.StringIO(
+        '{"long_url": "https://a.com/"}\n\n{"id": 5, "long_url": "https://b.com/", "redirect_status": 308}\n'
+    )
+
+    assert [to_record(row) for row in read_rows(csv_source, "csv")] == [
+        (100000000, "https://a.com/", 3, url_digest("https://a.com/"), None),
+        (None, "https://b.com/", 0, None, 301),
+    ]
+    assert [to_record(row) for row in read_rows(ndjson_source, "ndjson")] == [
+        (None, "https://a.com/", 0, url_digest("https://a.com/"), None),
+        (5, "https://b.com/", 0, None, 308),
+    ]
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_parse_args():
+    args = parse_args(["import", "urls.csv", "--warm-redis", "--chunk-size", "500"])
+
+    assert args.command == "import"
+    assert args.warm_redis
+    assert args.chunk_size == 500
+
+
+@pytest.mark.asyncio
+async def test_import_urls_copies_in_chunks():
+    source = io.StringIO(
+        '{"id": 100000000, "long_url": "https://a.com/"}\n{"long_url": "https://b.com/", "redirect_status": 301}\n'
+    )
+    conn = AsyncMock()
+    redis_mock = AsyncMock()
+
+    with patch("src.app.cli.asyncpg.connect", new=AsyncMock(return_value=conn)), patch(
+        "src.app.cli.id_allocator.allocate_many", new=AsyncMock(return_value=[100001000])
+    ), patch("src.app.cli.get_redis_client", return_value=redis_mock), patch(
+        "src.app.cli.cache_links", new=AsyncMock()
+    ) as cache_mock:
+        rows = await import_urls(
+            source, "ndjson", chunk_size=1, warm_redis=True, progress=Progress("Import", io.StringIO())
+        )
+
+    assert rows == 2
+    assert conn.copy_records_to_table.await_count == 2
+    assert conn.copy_records_to_table.await_args_list[1].kwargs["records"] == [
+        (100001000, "https://b.com/", 0, None, 301)
+    ]
+    cache_mock.assert_awaited_with(redis_mock, [(encode(100001000), "301 https://b.com/")])
+    conn.execute.assert_awaited_once_with(ADVANCE_SEQUENCE_QUERY, 0)
+    conn.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_export_urls_streams_rows_with_short_links():
+    async def cursor_rows():
+        for row in [(100000000, "https://a.com/", 3, None), (100000001, "https://b.com/", 0, 308)]:
+            yield row
+
+    transaction = MagicMock()
+    transaction.__aenter__ = AsyncMock()
+    transaction.__aexit__ = AsyncMock(return_value=False)
+    conn = AsyncMock()
+    conn.transaction = MagicMock(return_value=transaction)
+    conn.cursor = MagicMock(return_value=cursor_rows())
+    sink = io.StringIO()
+
+    with patch("src.app.cli.asyncpg.connect", new=AsyncMock(return_value=conn)):
+        rows = await export_urls(sink, "csv", progress=Progress("Export", io.StringIO()))
+
+    assert rows == 2
+    assert sink.getvalue().splitlines() == [
+        "id,short_link,long_url,access_count,redirect_status",
+        f"100000000,{encode(100000000)},https://a.com/,3,",
+        f"100000001,{encode(100000001)},https://b.com/,0,308",
+    ]
+    conn.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_migrate_cache_layout_moves_links_to_buckets():
+    redis_mock = MagicMock()
+
+    async def scan_iter(**kwargs):
+        for key in ("shortlink:a4BhE", "shortlink:lease:a4BhE", "shortlink:missing"):
+            yield key
+
+    redis_mock.scan_iter = scan_iter
+    redis_mock.mget = AsyncMock(return_value=["https://a.com/", ""])
+    redis_mock.delete = AsyncMock()
+    pipe = MagicMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    pipe.execute = AsyncMock()
+    redis_mock.pipeline = MagicMock(return_value=pipe)
+
+    with patch("src.app.cli.get_redis_client", return_value=redis_mock):
+        migrated = await migrate_cache_layout("string", "hash", 600, progress=Progress("Migrate", io.StringIO()))
+
+    # Lease keys are skipped and missing-link markers are not carried over
+    assert migrated == 1
+    redis_mock.mget.assert_awaited_once_with(["shortlink:a4BhE", "shortlink:missing"])
+    bucket, field = divmod(decode("a4BhE"), 100)
+    pipe.hset.assert_called_once_with(f"shortlink:b:{bucket}", str(field), "https://a.com/")
+    redis_mock.delete.assert_awaited_once_with("shortlink:a4BhE")
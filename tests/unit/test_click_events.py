@@ -0,0 +1,99 @@
+import gzip
+import os
+import orjson
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.app.base62 import encode
+from src.app.click_events import ClickEventConsumer, FileSink, client_ip_prefix, event_row
+
+EVENT = {"ts": "1792317600000", "link": encode(100000000), "ref": "", "ua": "ab12", "ip": "203.0.113.0/24"}
+
+
+def test_client_ip_prefix():
+    assert client_ip_prefix("203.0.113.7") == "203.0.113.0/24"
+    assert client_ip_prefix("2001:db8:1234:5678::1") == "2001:db8:1234::/48"
+    assert client_ip_prefix("testclient") == ""
+
+
+def test_event_row():
+    row = event_row("1792317600000-0", EVENT)
+
+    assert row["url_id"] == 100000000
+    assert row["referrer"] is None
+    assert row["clicked_at"].isoformat() == "2026-10-18T10:00:00+00:00"
+
+
+def make_consumer(read=None):
+    redis_mock = AsyncMock()
+    redis_mock.xreadgroup = AsyncMock(return_value=[["click_events", read or []]])
+    redis_mock.xautoclaim = AsyncMock(return_value=["0-0", [], []])
+    sink = AsyncMock()
+    return ClickEventConsumer(redis_mock, sink, name="worker-1"), redis_mock, sink
+
+
+@pytest.mark.asyncio
+async def test_consumer_acks_only_after_the_sink_wrote():
+    consumer, redis_mock, sink = make_consumer([("1-0", EVENT), ("2-0", {})])
+
+    assert await consumer.consume_once() == 1
+
+    # Own pending entries are replayed first after a restart
+    assert redis_mock.xreadgroup.await_args.args[2] == {"click_events": "0"}
+    sink.write.assert_awaited_once_with([("1-0", EVENT)])
+    # The trimmed entry is acknowledged too, so it does not come back
+    redis_mock.xack.assert_awaited_once_with("click_events", "click_event_writers", "1-0", "2-0")
+
+
+@pytest.mark.asyncio
+async def test_consumer_retries_failed_batch_before_reading_new_entries():
+    consumer, redis_mock, sink = make_consumer([("1-0", EVENT)])
+    consumer._next_id = ">"
+    sink.write = AsyncMock(side_effect=OSError("db down"))
+
+    with pytest.raises(OSError):
+        await consumer.consume_once()
+
+    redis_mock.xack.assert_not_awaited()
+    assert consumer._next_id == "0"
+
+
+@pytest.mark.asyncio
+async def test_consumer_switches_to_new_entries_once_pending_is_drained():
+    consumer, redis_mock, _ = make_consumer()
+    redis_mock.xreadgroup = AsyncMock(return_value=[])
+
+    assert await consumer.consume_once() == 0
+    assert consumer._next_id == ">"
+
+
+@pytest.mark.asyncio
+async def test_consumer_reports_lag():
+    consumer, redis_mock, _ = make_consumer()
+    redis_mock.xinfo_groups = AsyncMock(
+        return_value=[{"name": "click_event_writers", "pending": 3, "lag": 42}]
+    )
+    redis_mock.xlen = AsyncMock(return_value=1000)
+
+    stats = await consumer.stats()
+
+    assert stats["lag"] == 42
+    assert stats["pending"] == 3
+    assert stats["stream_length"] == 1000
+
+
+@pytest.mark.asyncio
+async def test_file_sink_appends_gzip_members(tmp_path):
+    sink = FileSink(str(tmp_path))
+
+    await sink.write([("1-0", EVENT)])
+    await sink.write([("2-0", EVENT)])
+
+    [path] = tmp_path.iterdir()
+    lines = gzip.decompress(path.read_bytes()).splitlines()
+    assert [orjson.loads(line)["id"] for line in lines] == ["1-0", "2-0"]
+
+
+def test_consumer_defaults_to_a_per_process_name():
+    consumer = ClickEventConsumer(MagicMock(), MagicMock())
+
+    assert consumer.name.endswith(str(os.getpid()))
@@ -0,0 +1,188 @@
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from redis.exceptions import ResponseError
+from src.app.base62 import encode
+from src.app.counters import AccessCountFlusher, flush_access_counts, flush_click_rollups
+from src.app.sharding import shard_id
+
+
+def mock_session_factory():
+    db = AsyncMock()
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=db)
+    session.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=session), db
+
+
+def mock_redis(items=None, locked=True, flushing_exists=False):
+    redis_mock = AsyncMock()
+    redis_mock.set = AsyncMock(return_value=locked)
+    redis_mock.exists = AsyncMock(return_value=int(flushing_exists))
+    redis_mock.hscan = AsyncMock(return_value=(0, items or {}))
+    return redis_mock
+
+
+@pytest.mark.asyncio
+async def test_flush_access_counts_applies_pending_deltas():
+    redis_mock = mock_redis({"100000000": "3", "100000001": "1"})
+    session_factory, db = mock_session_factory()
+
+    with patch(
+        "src.app.counters.apply_access_count_deltas", new=AsyncMock()
+    ) as apply_mock:
+        flushed = await flush_access_counts(redis_mock, session_factory, batch_size=10)
+
+    assert flushed == 4
+    redis_mock.rename.assert_awaited_once_with("access_count:pending", "access_count:flushing")
+    apply_mock.assert_awaited_once_with({100000000: 3, 100000001: 1}, db)
+    redis_mock.hdel.assert_awaited_once_with("access_count:flushing", "100000000", "100000001")
+    redis_mock.incr.assert_awaited_once_with("access_count:generation")
+    redis_mock.delete.assert_awaited_once_with("access_count:flushing")
+    # Lock extended before the batch, then released
+    assert redis_mock.eval.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_flush_access_counts_splits_into_batches():
+    items = {str(100000000 + i): "1" for i in range(5)}
+    redis_mock = mock_redis(items)
+    session_factory, _ = mock_session_factory()
+
+    with patch(
+        "src.app.counters.apply_access_count_deltas", new=AsyncMock()
+    ) as apply_mock:
+        flushed = await flush_access_counts(redis_mock, session_factory, batch_size=2)
+
+    assert flushed == 5
+    assert apply_mock.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_flush_access_counts_stops_when_the_lock_is_lost():
+    items = {str(100000000 + i): "1" for i in range(5)}
+    redis_mock = mock_redis(items)
+    # Extended for the first batch, expired before the second, then the release
+    redis_mock.eval = AsyncMock(side_effect=[1, 0, 0])
+    session_factory, _ = mock_session_factory()
+
+    with patch(
+        "src.app.counters.apply_access_count_deltas", new=AsyncMock()
+    ) as apply_mock:
+        flushed = await flush_access_counts(redis_mock, session_factory, batch_size=2)
+
+    assert flushed == 2
+    apply_mock.assert_awaited_once()
+    redis_mock.hdel.assert_awaited_once()
+    # The rest stays in the flushing hash for whoever holds the lock now
+    redis_mock.delete.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_flush_access_counts_drops_each_shard_after_its_commit():
+    shard1_id = str(shard_id(1, 100000000))
+    redis_mock = mock_redis({"100000000": "3", shard1_id: "1"})
+    session_factory, _ = mock_session_factory()
+
+    with patch(
+        "src.app.counters.apply_access_count_deltas", new=AsyncMock(side_effect=[None, OSError("shard 1 down")])
+    ):
+        with pytest.raises(OSError):
+            await flush_access_counts(redis_mock, session_factory, batch_size=10)
+
+    # Shard 0 committed and is gone from the flushing hash; shard 1 is left for the next flush
+    redis_mock.hdel.assert_awaited_once_with("access_count:flushing", "100000000")
+    redis_mock.delete.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_flush_access_counts_resumes_leftover_flush():
+    redis_mock = mock_redis({"100000000": "2"}, flushing_exists=True)
+    session_factory, _ = mock_session_factory()
+
+    with patch("src.app.counters.apply_access_count_deltas", new=AsyncMock()):
+        flushed = await flush_access_counts(redis_mock, session_factory)
+
+    assert flushed == 2
+    redis_mock.rename.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_flush_access_counts_nothing_pending():
+    redis_mock = mock_redis()
+    redis_mock.rename = AsyncMock(side_effect=ResponseError("no such key"))
+    session_factory, _ = mock_session_factory()
+
+    assert await flush_access_counts(redis_mock, session_factory) == 0
+    session_factory.assert_not_called()
+    redis_mock.eval.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_flush_access_counts_skips_when_locked():
+    redis_mock = mock_redis(locked=None)
+    session_factory, _ = mock_session_factory()
+
+    assert await flush_access_counts(redis_mock, session_factory) == 0
+    redis_mock.rename.assert_not_awaited()
+    redis_mock.eval.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_flusher_drains_on_stop():
+    flusher = AccessCountFlusher(AsyncMock(), interval=3600)
+
+    with patch(
+        "src.app.counters.flush_access_counts", new=AsyncMock(return_value=7)
+    ) as flush_mock:
+        flusher.start()
+        await flusher.stop()
+
+    flush_mock.assert_awaited_once()
+    assert flusher.stats()["flushed_total"] == 7
+
+
+@pytest.mark.asyncio
+async def test_flusher_survives_flush_errors():
+    flusher = AccessCountFlusher(AsyncMock(), interval=3600)
+
+    with patch(
+        "src.app.counters.flush_access_counts",
+        new=AsyncMock(side_effect=OSError("db down")),
+    ):
+        assert await flusher.flush() == 0
+
+    assert flusher.stats()["failed_flushes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_access_counts_extends_ttl_of_hot_links():
+    redis_mock = mock_redis({"100000000": "50", "100000001": "1"})
+    session_factory, _ = mock_session_factory()
+
+    with patch("src.app.counters.apply_access_count_deltas", new=AsyncMock()), patch(
+        "src.app.counters.extend_link_ttls", new=AsyncMock()
+    ) as extend_mock:
+        await flush_access_counts(redis_mock, session_factory)
+
+    extend_mock.assert_awaited_once_with(redis_mock, [encode(100000000)], 604800)
+
+
+@pytest.mark.asyncio
+async def test_flush_click_rollups_applies_hourly_counts():
+    redis_mock = mock_redis({"100000000:1792317600": "3", "100000000:1792321200": "2"})
+    session_factory, db = mock_session_factory()
+
+    with patch("src.app.counters.apply_click_rollups", new=AsyncMock()) as apply_mock:
+        flushed = await flush_click_rollups(redis_mock, session_factory)
+
+    assert flushed == 5
+    redis_mock.rename.assert_awaited_once_with("click_rollup:pending", "click_rollup:flushing")
+    apply_mock.assert_awaited_once_with(
+        {
+            (100000000, datetime(2026, 10, 18, 10, tzinfo=timezone.utc)): 3,
+            (100000000, datetime(2026, 10, 18, 11, tzinfo=timezone.utc)): 2,
+        },
+        db,
+    )
+    redis_mock.delete.assert_awaited_once_with("click_rollup:flushing")
@@ -0,0 +1,43 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.app.base62 import encode
+from src.app.dedup import find_existing_link, find_existing_links, url_digest
+
+
+def test_url_digest_is_truncated_sha256():
+    assert url_digest("https://example.com/").hex() == "0f115db062b7c0dd030b16878c99dea5"
+
+
+@pytest.mark.asyncio
+async def test_find_existing_links_keeps_oldest_and_checks_the_url():
+    db_mock = AsyncMock()
+    result = MagicMock()
+    # Ordered by id; the third row stands in for a digest collision
+    result.all.return_value = [
+        (1000, "https://a.com/"),
+        (1001, "https://a.com/"),
+        (1002, "https://collision.com/"),
+    ]
+    db_mock.execute = AsyncMock(return_value=result)
+
+    existing = await find_existing_links(["https://a.com/", "https://b.com/"], db_mock)
+
+    assert existing == {"https://a.com/": encode(1000)}
+
+
+@pytest.mark.asyncio
+async def test_find_existing_link_caches_index_hits():
+    redis_mock = AsyncMock()
+    redis_mock.get = AsyncMock(return_value=None)
+    pipe = MagicMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    pipe.execute = AsyncMock()
+    redis_mock.pipeline = MagicMock(return_value=pipe)
+    db_mock = AsyncMock()
+    result = MagicMock()
+    result.all.return_value = [(1000, "https://a.com/")]
+    db_mock.execute = AsyncMock(return_value=result)
+
+    assert await find_existing_link("https://a.com/", db_mock, redis_mock) == encode(1000)
+    pipe.set.assert_called_once_with(f"urldigest:{url_digest('https://a.com/').hex()}", encode(1000), ex=86400)
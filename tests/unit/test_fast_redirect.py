@@ -0,0 +1,73 @@
+import httpx
+import pytest
+from httpx import AsyncClient
+from unittest.mock import ANY, AsyncMock, patch
+from sqlalchemy.exc import NoResultFound
+from src.app.main import create_app
+
+app = create_app(fast_redirect=True)
+
+
+def client() -> AsyncClient:
+    return AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_fast_redirect_serves_the_link_without_a_db_session():
+    async with client() as ac:
+        with patch(
+            "src.app.fast_redirect.get_long_url", new=AsyncMock(return_value="https://example.com/a b")
+        ) as mock_service, patch("src.app.routes.get_long_url", new=AsyncMock()) as route_mock:
+            response = await ac.get("/abc123")
+
+    assert response.status_code == 307
+    assert response.headers["location"] == "https://example.com/a%20b"
+    mock_service.assert_awaited_once_with("abc123", None, ANY, ANY, None)
+    route_mock.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_fast_redirect_not_found():
+    async with client() as ac:
+        with patch("src.app.fast_redirect.get_long_url", new=AsyncMock(side_effect=NoResultFound())):
+            response = await ac.get("/abc123")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Short link not found"}
+
+
+@pytest.mark.asyncio
+async def test_fast_redirect_leaves_other_routes_to_the_app():
+    async with client() as ac:
+        with patch("src.app.fast_redirect.get_long_url", new=AsyncMock()) as mock_service:
+            # Valid base62, but a route of its own
+            assert (await ac.get("/health")).json() == {"status": "ok"}
+            assert (await ac.get("/not-base62")).status_code == 404
+
+    mock_service.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_fast_redirect_hands_failures_to_the_app():
+    async with client() as ac:
+        with patch(
+            "src.app.fast_redirect.get_long_url", new=AsyncMock(side_effect=OSError("redis down"))
+        ), patch("src.app.routes.get_long_url", new=AsyncMock(return_value="https://example.com")):
+            response = await ac.get("/abc123")
+
+    assert response.status_code == 307
+    assert response.headers["location"] == "https://example.com"
+
+
+@pytest.mark.asyncio
+async def test_fast_redirect_permanent_and_revalidated():
+    async with client() as ac:
+        with patch("src.app.fast_redirect.get_long_url", new=AsyncMock(return_value="301 https://example.com")):
+            response = await ac.get("/abc123")
+            revalidated = await ac.get("/abc123", headers={"If-None-Match": f'W/{response.headers["etag"]}'})
+
+    assert response.status_code == 301
+    assert response.headers["location"] == "https://example.com"
+    assert response.headers["cache-control"] == "public, max-age=86400"
+    assert revalidated.status_code == 304
+    assert "location" not in revalidated.headers
@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.app.id_allocator import IdAllocator, IdRange
+from src.app.sharding import local_id, shard_id, shard_of
+
+
+def mock_session_factory(block_size, block_starts):
+    db = AsyncMock()
+    results = []
+    for start in block_starts:
+        result = MagicMock()
+        result.scalar_one.return_value = start
+        results.append(result)
+    increment = MagicMock()
+    increment.one.return_value.increment_by = block_size
+    db.execute = AsyncMock(side_effect=[increment] + results)
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=db)
+    session.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=session), db
+
+
+@pytest.mark.asyncio
+async def test_allocates_from_reserved_block():
+    session_factory, db = mock_session_factory(1000, [100000000])
+    allocator = IdAllocator(session_factory)
+
+    ids = [await allocator.allocate() for _ in range(3)]
+
+    assert ids == [100000000, 100000001, 100000002]
+    # One query for the block size and one nextval for the whole block
+    assert db.execute.await_count == 2
+    assert allocator.stats()["remaining"] == 997
+
+
+@pytest.mark.asyncio
+async def test_allocate_many_spans_blocks():
+    session_factory, _ = mock_session_factory(3, [100, 200])
+    allocator = IdAllocator(session_factory)
+
+    assert await allocator.allocate_many(5) == [100, 101, 102, 200, 201]
+    assert allocator.stats()["blocks_reserved"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_reserve_one_block():
+    session_factory, db = mock_session_factory(10, [500])
+    allocator = IdAllocator(session_factory)
+
+    ids = await asyncio.gather(*(allocator.allocate() for _ in range(5)))
+
+    assert sorted(ids) == [500, 501, 502, 503, 504]
+    assert allocator.stats()["blocks_reserved"] == 1
+
+
+def mock_sequence_state(last_value, increment_by=1000):
+    db = AsyncMock()
+    result = MagicMock()
+    result.one.return_value = MagicMock(last_value=last_value, increment_by=increment_by)
+    db.execute = AsyncMock(return_value=result)
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=db)
+    session.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=session), db
+
+
+@pytest.mark.asyncio
+async def test_id_range_rejects_ids_below_sequence_start_without_io():
+    session_factory, db = mock_sequence_state(100005000)
+    id_range = IdRange([session_factory], min_id=100000000)
+
+    assert not await id_range.contains(99999999)
+    db.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_id_range_reads_end_of_last_reserved_block():
+    session_factory, db = mock_sequence_state(100005000)
+    id_range = IdRange([session_factory], min_id=100000000, refresh_interval=60)
+
+    assert await id_range.contains(100005999)
+    assert not await id_range.contains(100006000)
+    assert not await id_range.contains(100007000)
+    # The first lookup refreshed the range; the rest are answered from memory
+    db.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_id_range_nothing_reserved_yet():
+    session_factory, _ = mock_sequence_state(None)
+    id_range = IdRange([session_factory], min_id=100000000)
+
+    assert not await id_range.contains(100000000)
+
+
+@pytest.mark.asyncio
+async def test_id_range_allows_lookups_when_sequence_is_unreadable():
+    session_factory, db = mock_sequence_state(None)
+    db.execute = AsyncMock(side_effect=OSError("db down"))
+    id_range = IdRange([session_factory], min_id=100000000)
+
+    assert await id_range.contains(100000000)
+
+
+@pytest.mark.asyncio
+async def test_allocator_tags_ids_with_its_shard():
+    session_factory, _ = mock_session_factory(1000, [100000000])
+    allocator = IdAllocator(session_factory, shard=2)
+
+    id = await allocator.allocate()
+
+    assert shard_of(id) == 2
+    assert local_id(id) == 100000000
+
+
+@pytest.mark.asyncio
+async def test_id_range_checks_each_shard_against_its_own_sequence():
+    shard0, _ = mock_sequence_state(100005000)
+    shard1, shard1_db = mock_sequence_state(100000000)
+    id_range = IdRange([shard0, shard1], min_id=100000000)
+
+    assert await id_range.contains(shard_id(0, 100005999))
+    assert await id_range.contains(shard_id(1, 100000999))
+    assert not await id_range.contains(shard_id(1, 100001000))
+    shard1_db.execute.assert_awaited_once()
+    # Codes for shards that do not exist never reach a DB
+    assert not id_range.in_bounds(shard_id(2, 100000000))
+    assert not await id_range.contains(shard_id(2, 100000000))
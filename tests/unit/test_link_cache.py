@@ -0,0 +1,164 @@
+import pytest
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
+from redis.exceptions import ConnectionError as RedisConnectionError
+from src.app.base62 import encode
+from src.app.core.redis import RedisRing
+from src.app.link_cache import (
+    HashBucketLayout,
+    cache_link,
+    cache_links,
+    extend_link_ttls,
+    get_cached_link,
+    get_cached_links,
+    redirect_value,
+    split_redirect_value,
+)
+
+
+def mock_pipeline(redis_mock):
+    pipe = MagicMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    pipe.execute = AsyncMock()
+    redis_mock.pipeline = MagicMock(return_value=pipe)
+    return pipe
+
+
+@pytest.mark.asyncio
+async def test_get_cached_link_refreshes_ttl_in_one_round_trip():
+    redis_mock = AsyncMock()
+    redis_mock.evalsha = AsyncMock(return_value="https://example.com")
+
+    assert await get_cached_link(redis_mock, "abc123", 600) == "https://example.com"
+    redis_mock.evalsha.assert_awaited_once_with(ANY, 1, "shortlink:abc123", 600)
+
+
+def test_redirect_value_round_trip():
+    assert redirect_value("https://example.com/301", None) == "https://example.com/301"
+    assert split_redirect_value("https://example.com/301") == (None, "https://example.com/301")
+    assert split_redirect_value(redirect_value("https://example.com/", 308)) == (308, "https://example.com/")
+
+
+@pytest.mark.asyncio
+async def test_cache_link_sets_ttl():
+    redis_mock = AsyncMock()
+
+    await cache_link(redis_mock, "abc123", "https://example.com", 600)
+    redis_mock.set.assert_awaited_with("shortlink:abc123", "https://example.com", ex=600)
+
+    # A TTL of 0 keeps the key forever
+    await cache_link(redis_mock, "abc123", "https://example.com", 0)
+    redis_mock.set.assert_awaited_with("shortlink:abc123", "https://example.com", ex=None)
+
+
+@pytest.mark.asyncio
+async def test_cache_links_pipelines_with_ttl():
+    redis_mock = AsyncMock()
+    pipe = mock_pipeline(redis_mock)
+
+    await cache_links(redis_mock, [("a", "https://a.com"), ("b", "https://b.com")], 60)
+
+    pipe.set.assert_any_call("shortlink:a", "https://a.com", ex=60)
+    pipe.set.assert_any_call("shortlink:b", "https://b.com", ex=60)
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_cached_links_reads_in_one_pipeline():
+    redis_mock = AsyncMock()
+    pipe = mock_pipeline(redis_mock)
+    pipe.execute = AsyncMock(return_value=["https://a.com", None, ""])
+
+    assert await get_cached_links(redis_mock, ["a", "b", "c"]) == {"a": "https://a.com"}
+    pipe.get.assert_any_call("shortlink:b")
+
+
+@pytest.mark.asyncio
+async def test_extend_link_ttls_only_raises_ttls():
+    redis_mock = AsyncMock()
+    pipe = mock_pipeline(redis_mock)
+
+    await extend_link_ttls(redis_mock, ["a"], 604800)
+
+    pipe.expire.assert_called_once_with("shortlink:a", 604800, gt=True)
+
+
+def test_hash_layout_groups_ids_into_buckets():
+    layout = HashBucketLayout(100)
+
+    assert layout.key_and_field(encode(100000042)) == ("shortlink:b:1000000", "42")
+    assert layout.key_and_field(encode(100000142)) == ("shortlink:b:1000001", "42")
+
+
+@pytest.mark.asyncio
+async def test_hash_layout_reads_and_writes_fields():
+    layout = HashBucketLayout(100)
+    short_link = encode(100000042)
+    redis_mock = AsyncMock()
+    redis_mock.evalsha = AsyncMock(return_value="https://example.com")
+    pipe = mock_pipeline(redis_mock)
+
+    assert await layout.get(redis_mock, short_link, 600) == "https://example.com"
+    redis_mock.evalsha.assert_awaited_once_with(
+        ANY, 2, "shortlink:b:1000000", f"shortlink:missing:{short_link}", "42", 600
+    )
+
+    await layout.set(redis_mock, short_link, "https://example.com", 600)
+    pipe.hset.assert_called_once_with("shortlink:b:1000000", "42", "https://example.com")
+    # The bucket TTL is only ever raised, never shortened by a newer link
+    pipe.expire.assert_any_call("shortlink:b:1000000", 600, nx=True)
+    pipe.expire.assert_any_call("shortlink:b:1000000", 600, gt=True)
+
+    await layout.delete(redis_mock, [short_link])
+    pipe.hdel.assert_called_once_with("shortlink:b:1000000", "42")
+
+
+@pytest.mark.asyncio
+async def test_hash_layout_keeps_missing_markers_out_of_the_bucket():
+    layout = HashBucketLayout(100)
+    short_link = encode(100000042)
+    redis_mock = AsyncMock()
+
+    await layout.set_missing(redis_mock, short_link, 60)
+
+    # The marker keeps its own short TTL whatever the bucket's TTL is
+    redis_mock.set.assert_awaited_once_with(f"shortlink:missing:{short_link}", "", ex=60, nx=True)
+    redis_mock.hsetnx.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_hash_layout_scans_buckets_back_into_links():
+    layout = HashBucketLayout(100)
+    redis_mock = MagicMock()
+
+    async def scan_iter(**kwargs):
+        yield "shortlink:b:1000000"
+
+    redis_mock.scan_iter = scan_iter
+    redis_mock.hgetall = AsyncMock(return_value={"42": "https://a.com", "43": ""})
+
+    batches = [batch async for batch in layout.scan(redis_mock, 100)]
+
+    assert batches == [[(encode(100000042), "https://a.com")]]
+
+
+@pytest.mark.asyncio
+async def test_link_cache_nodes_route_by_key_and_miss_when_a_node_is_down():
+    ring = RedisRing(["redis://cache1:6379", "redis://cache2:6379"])
+    nodes = [AsyncMock(), AsyncMock()]
+    pipes = [mock_pipeline(node) for node in nodes]
+    ring.clients = nodes
+    links = [(encode(100000000 + i), f"https://example.com/{i}") for i in range(20)]
+
+    with patch("src.app.link_cache.link_cache_nodes", ring):
+        await cache_links(AsyncMock(), links, 60)
+        for node, pipe in zip(nodes, pipes):
+            written = {call.args[0] for call in pipe.set.call_args_list}
+            assert written == {f"shortlink:{s}" for s, _ in links if ring.node(f"shortlink:{s}") == nodes.index(node)}
+            pipe.execute.assert_awaited_once()
+
+        short_link = links[0][0]
+        node = nodes[ring.node(f"shortlink:{short_link}")]
+        node.evalsha = AsyncMock(side_effect=RedisConnectionError("node down"))
+        # The redirect goes on to the DB
+        assert await get_cached_link(AsyncMock(), short_link, 600) is None
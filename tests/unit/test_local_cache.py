@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.app.core.local_cache import (
+    LocalCache,
+    INVALIDATE_ALL,
+    handle_invalidation_message,
+    listen_for_invalidations,
+)
+
+
+def test_get_and_set():
+    cache = LocalCache(max_size=10, ttl_seconds=60)
+    assert cache.get("abc") is None
+    cache.set("abc", "https://example.com")
+
+    assert cache.get("abc") == "https://example.com"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = LocalCache(max_size=2, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = LocalCache(max_size=10, ttl_seconds=5)
+    with patch("src.app.core.local_cache.time.monotonic", return_value=100.0):
+        cache.set("a", "1")
+    with patch("src.app.core.local_cache.time.monotonic", return_value=106.0):
+        assert cache.get("a") is None
+
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_disabled_cache_stores_nothing():
+    cache = LocalCache(max_size=10, ttl_seconds=60, enabled=False)
+    cache.set("a", "1")
+
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_handle_invalidation_message():
+    cache = LocalCache(max_size=10, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+
+    handle_invalidation_message(cache, "a")
+    assert cache.get("a") is None
+    assert cache.get("b") == "2"
+
+    handle_invalidation_message(cache, INVALIDATE_ALL)
+    assert cache.get("b") is None
+
+
+@pytest.mark.asyncio
+async def test_listen_for_invalidations_evicts_published_keys():
+    cache = LocalCache(max_size=10, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    received = asyncio.Event()
+
+    async def listen():
+        yield {"type": "message", "data": "a"}
+        received.set()
+        await asyncio.Event().wait()
+
+    pubsub = MagicMock()
+    pubsub.__aenter__ = AsyncMock(return_value=pubsub)
+    pubsub.__aexit__ = AsyncMock(return_value=False)
+    pubsub.subscribe = AsyncMock()
+    pubsub.listen = listen
+    redis_mock = MagicMock()
+    redis_mock.pubsub.return_value = pubsub
+
+    task = asyncio.create_task(listen_for_invalidations(redis_mock, cache))
+    await asyncio.wait_for(received.wait(), timeout=1)
+    task.cancel()
+
+    pubsub.subscribe.assert_awaited_once()
+    assert cache.get("a") is None
@@ -0,0 +1,52 @@
+import logging
+import queue
+import orjson
+from unittest.mock import patch
+from src.app.core.config import EnvironmentOption
+from src.app.core.logger import ENVIRONMENT_LEVELS, JsonFormatter, NonBlockingQueueHandler, SampledLogger
+
+
+def make_record(level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord(
+        "src.app.routes", level, __file__, 1, "Redirecting %s to %s", ("abc", "https://a.com/"), None
+    )
+
+
+def test_environment_levels_match_the_enum_values():
+    # Settings hold the enum, whose values are lowercase
+    assert ENVIRONMENT_LEVELS[EnvironmentOption("production")] == logging.WARNING
+    assert ENVIRONMENT_LEVELS[EnvironmentOption("staging")] == logging.INFO
+
+
+def test_json_formatter_writes_one_object_per_record():
+    entry = orjson.loads(JsonFormatter().format(make_record()))
+
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "src.app.routes"
+    assert entry["message"] == "Redirecting abc to https://a.com/"
+
+
+def test_queue_handler_defers_formatting_and_drops_when_full():
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    record = make_record()
+
+    handler.handle(record)
+    handler.handle(make_record())
+
+    queued = handler.queue.get_nowait()
+    assert queued is record
+    # Still unformatted; the writer thread does that
+    assert queued.args == ("abc", "https://a.com/")
+    assert handler.dropped == 1
+
+
+def test_sampled_logger_keeps_a_share_of_records_below_error():
+    logger = logging.getLogger("test.sampled")
+    logger.setLevel(logging.DEBUG)
+    sampled = SampledLogger(logger, 0.25)
+
+    with patch("src.app.core.logger.random.random", side_effect=[0.1, 0.5]):
+        assert sampled.isEnabledFor(logging.INFO)
+        assert not sampled.isEnabledFor(logging.INFO)
+    assert sampled.isEnabledFor(logging.ERROR)
+    assert SampledLogger(logger, 1.0).isEnabledFor(logging.DEBUG)
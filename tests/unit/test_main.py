@@ -0,0 +1,50 @@
+import contextlib
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.app.main import app, lifespan
+
+
+@contextlib.contextmanager
+def patched_lifespan(**overrides):
+    flusher = MagicMock()
+    flusher.stop = AsyncMock()
+    mocks = {
+        "warm_db_pool": AsyncMock(),
+        "warm_redis_pool": AsyncMock(),
+        "close_db_pool": AsyncMock(),
+        "close_redis_pool": AsyncMock(),
+        "listen_for_invalidations": AsyncMock(),
+        "access_count_flusher": flusher,
+        "create_link_batcher": AsyncMock(),
+    }
+    mocks.update(overrides)
+    with contextlib.ExitStack() as stack:
+        for name, mock in mocks.items():
+            stack.enter_context(patch(f"src.app.main.{name}", new=mock))
+        yield mocks
+
+
+@pytest.mark.asyncio
+async def test_lifespan_warms_and_closes_pools():
+    with patched_lifespan() as mocks:
+        async with lifespan(app):
+            mocks["warm_db_pool"].assert_awaited_once()
+            mocks["warm_redis_pool"].assert_awaited_once()
+            mocks["access_count_flusher"].start.assert_called_once()
+
+        mocks["access_count_flusher"].stop.assert_awaited_once()
+        mocks["create_link_batcher"].close.assert_awaited_once()
+        mocks["close_db_pool"].assert_awaited_once()
+        mocks["close_redis_pool"].assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_lifespan_starts_when_backends_are_down():
+    with patched_lifespan(
+        warm_db_pool=AsyncMock(side_effect=OSError("down")),
+        warm_redis_pool=AsyncMock(side_effect=OSError("down")),
+    ) as mocks:
+        async with lifespan(app):
+            pass
+
+        mocks["close_db_pool"].assert_awaited_once()
@@ -0,0 +1,130 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.app.core import redis as core_redis
+from src.app.core.db import ReadReplicas, get_db_pool_stats
+from redis.exceptions import ConnectionError as RedisConnectionError
+from src.app.core.redis import (
+    RedisRing,
+    async_get_redis,
+    get_redis_client,
+    get_redis_pool_stats,
+    warm_redis_pool,
+)
+
+
+@pytest.mark.asyncio
+async def test_async_get_redis_reuses_shared_client():
+    clients = [client async for client in async_get_redis()]
+    clients += [client async for client in async_get_redis()]
+
+    assert clients[0] is clients[1] is get_redis_client()
+
+
+@pytest.mark.asyncio
+async def test_warm_redis_pool_opens_and_releases_connections():
+    pool = MagicMock()
+    pool.max_connections = 10
+    pool.get_connection = AsyncMock(side_effect=lambda *args: MagicMock())
+    pool.release = AsyncMock()
+
+    with patch.object(core_redis, "redis_pool", pool):
+        await warm_redis_pool(3)
+
+    assert pool.get_connection.await_count == 3
+    assert pool.release.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_warm_redis_pool_raises_after_releasing_healthy_connections():
+    pool = MagicMock()
+    pool.max_connections = 10
+    pool.get_connection = AsyncMock(side_effect=[MagicMock(), OSError("down")])
+    pool.release = AsyncMock()
+
+    with patch.object(core_redis, "redis_pool", pool):
+        with pytest.raises(OSError):
+            await warm_redis_pool(2)
+
+    pool.release.assert_awaited_once()
+
+
+def test_pool_stats():
+    redis_stats = get_redis_pool_stats()
+    db_stats = get_db_pool_stats()
+
+    assert redis_stats["in_use"] == 0
+    assert redis_stats["max_connections"] > 0
+    assert db_stats["in_use"] == 0
+    assert db_stats["utilization"] == 0.0
+
+
+def make_replicas(selection="round_robin"):
+    return ReadReplicas(
+        ["postgresql+asyncpg://u:p@replica1:5432/db", "postgresql+asyncpg://u:p@replica2:5432/db"],
+        selection,
+    )
+
+
+def test_read_replicas_round_robin_skips_failed_replicas():
+    replicas = make_replicas()
+
+    assert {replicas.choose(), replicas.choose()} == {0, 1}
+
+    replicas.failed_until[0] = float("inf")
+    assert {replicas.choose(), replicas.choose()} == {1}
+
+    replicas.failed_until[1] = float("inf")
+    assert replicas.choose() is None
+
+
+def test_read_replicas_least_latency():
+    replicas = make_replicas("least_latency")
+    replicas.latencies = [0.004, 0.001]
+
+    assert replicas.choose() == 1
+
+
+@pytest.mark.asyncio
+async def test_read_replicas_run_marks_failing_replica():
+    replicas = make_replicas()
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+    replicas.session_factories = [MagicMock(return_value=session)] * 2
+
+    assert await replicas.run(0, AsyncMock(return_value="row")) == "row"
+    with pytest.raises(OSError):
+        await replicas.run(1, AsyncMock(side_effect=OSError("replica down")))
+
+    stats = replicas.stats()
+    assert stats[0]["reads"] == 1 and stats[0]["healthy"]
+    assert stats[1]["failures"] == 1 and not stats[1]["healthy"]
+    assert stats[1]["host"] == "replica2:5432"
+
+
+def test_redis_ring_only_moves_keys_of_the_added_node():
+    keys = [f"shortlink:{i}" for i in range(5000)]
+    before = RedisRing(["redis://cache1:6379", "redis://cache2:6379", "redis://cache3:6379"])
+    after = RedisRing(["redis://cache1:6379", "redis://cache2:6379", "redis://cache3:6379", "redis://cache4:6379"])
+
+    moved = [key for key in keys if before.names[before.node(key)] != after.names[after.node(key)]]
+
+    # Every moved key went to the new node, and it took roughly its share
+    assert {after.names[after.node(key)] for key in moved} == {"cache4:6379"}
+    assert 0.15 < len(moved) / len(keys) < 0.35
+    assert len({before.node(key) for key in keys}) == 3
+
+
+@pytest.mark.asyncio
+async def test_redis_ring_skips_a_failed_node():
+    ring = RedisRing(["redis://cache1:6379", "redis://cache2:6379"])
+
+    command = AsyncMock(side_effect=RedisConnectionError("node down"))
+    assert await ring.run(0, command) is None
+    assert await ring.run(0, command) is None
+    command.assert_awaited_once()
+
+    assert await ring.run(1, AsyncMock(return_value="https://example.com")) == "https://example.com"
+    stats = ring.stats()
+    assert stats[0]["failures"] == 1 and stats[0]["skipped"] == 1 and not stats[0]["healthy"]
+    assert stats[1]["healthy"]
@@ -15,6 +15,18 @@ async def test_get_health():
         assert response.status_code == 200
 
 
+@pytest.mark.asyncio
+async def test_get_health_while_warming_up():
+    async with AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        with patch("src.app.routes.cache_warmer.ready", False):
+            response = await ac.get("/health")
+
+            assert response.status_code == 503
+            assert response.json() == {"status": "warming"}
+
+
 @pytest.mark.asyncio
 async def test_create_short_link_success():
     async with AsyncClient(
@@ -59,6 +71,41 @@ async def test_create_short_link_failure():
             assert response.status_code == 500
 
 
+@pytest.mark.asyncio
+async def test_create_short_links_batch_success():
+    async with AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        results = [
+            {"long_url": "https://example.com", "short_link": "abc123", "error": None},
+            {"long_url": "invalid_url", "short_link": None, "error": "Input should be a valid URL"},
+        ]
+
+        with patch(
+            "src.app.routes.create_short_links", return_value=results
+        ) as mock_service:
+            response = await ac.post(
+                "/create/batch",
+                json={"long_urls": ["https://example.com", "invalid_url"]},
+            )
+
+            assert response.status_code == 201
+            assert response.json() == {"results": results}
+            mock_service.assert_awaited_once_with(
+                ["https://example.com", "invalid_url"], ANY, ANY
+            )
+
+
+@pytest.mark.asyncio
+async def test_create_short_links_batch_empty():
+    async with AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        response = await ac.post("/create/batch", json={"long_urls": []})
+
+        assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_redirect_to_long_url_found():
     async with AsyncClient(
@@ -74,7 +121,59 @@ async def test_redirect_to_long_url_found():
             print(f"Response text: {response.text}")
             assert response.status_code == 307
             assert response.headers["Location"] == test_long_url
-            mock_get_long_url.assert_awaited_once_with(test_short_link, ANY, ANY, ANY)
+            mock_get_long_url.assert_awaited_once_with(test_short_link, ANY, ANY, ANY, None)
+
+
+@pytest.mark.asyncio
+async def test_redirect_to_long_url_permanent_is_cacheable():
+    async with AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        with patch("src.app.routes.get_long_url", return_value="308 https://example.com") as mock_get_long_url:
+            response = await ac.get("/abc123")
+
+            assert response.status_code == 308
+            assert response.headers["Location"] == "https://example.com"
+            assert response.headers["Cache-Control"] == "public, max-age=86400"
+
+            revalidated = await ac.get("/abc123", headers={"If-None-Match": response.headers["ETag"]})
+
+            assert revalidated.status_code == 304
+            assert "Location" not in revalidated.headers
+            # Revalidations reach the service, so they are still counted
+            assert mock_get_long_url.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_redirect_to_long_url_default_status():
+    async with AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        with patch("src.app.http_caching.settings.REDIRECT_STATUS_CODE", 302), patch(
+            "src.app.routes.get_long_url", return_value="https://example.com"
+        ):
+            response = await ac.get("/abc123", headers={"If-None-Match": "*"})
+
+            assert response.status_code == 302
+            assert response.headers["Cache-Control"] == "no-store"
+            assert "ETag" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_redirect_to_long_url_records_click_event():
+    async with AsyncClient(
+        transport=httpx.ASGITransport(app=app, client=("203.0.113.7", 1234)), base_url="http://test"
+    ) as ac:
+        with patch("src.app.routes.settings.CLICK_EVENTS_ENABLED", True), patch(
+            "src.app.routes.get_long_url", return_value="https://example.com"
+        ) as mock_get_long_url:
+            response = await ac.get("/abc123", headers={"Referer": "https://news.example/"})
+
+            assert response.status_code == 307
+            click = mock_get_long_url.await_args.args[4]
+            assert click["link"] == "abc123"
+            assert click["ref"] == "https://news.example/"
+            assert click["ip"] == "203.0.113.0/24"
 
 
 @pytest.mark.asyncio
@@ -113,7 +212,31 @@ async def test_get_link_stats_success():
 
             assert response.status_code == 200
             assert response.json() == mock_response
-            mock_service.assert_awaited_once_with(test_short_link, ANY)
+            mock_service.assert_awaited_once_with(test_short_link, ANY, ANY)
+
+
+@pytest.mark.asyncio
+async def test_get_link_stats_conditional_request():
+    async with AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        stats = {"long_url": "https://example.com", "short_link": "abc123", "access_count": 7}
+
+        with patch("src.app.routes.get_link_stats", return_value=stats):
+            response = await ac.get("/stats/abc123")
+            etag = response.headers["etag"]
+            assert etag == '"abc123-7"'
+            assert response.headers["cache-control"] == "max-age=1"
+
+            response = await ac.get("/stats/abc123", headers={"If-None-Match": f"W/{etag}"})
+            assert response.status_code == 304
+            assert response.content == b""
+            assert response.headers["etag"] == etag
+
+            stats["access_count"] = 8
+            response = await ac.get("/stats/abc123", headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.json()["access_count"] == 8
 
 
 @pytest.mark.asyncio
@@ -131,3 +254,46 @@ async def test_get_link_stats_not_found():
 
             assert response.status_code == 404
             assert response.json() == {"detail": "Short link not found"}
+
+
+@pytest.mark.asyncio
+async def test_get_link_timeseries():
+    async with AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        mock_response = {
+            "short_link": "abc123",
+            "granularity": "day",
+            "from": "2026-10-17T00:00:00Z",
+            "to": "2026-10-18T00:00:00Z",
+            "points": [{"timestamp": "2026-10-17T00:00:00Z", "clicks": 7}],
+        }
+
+        with patch(
+            "src.app.routes.get_link_timeseries", return_value=mock_response
+        ) as mock_service:
+            response = await ac.get(
+                "/stats/abc123/timeseries",
+                params={"granularity": "day", "from": "2026-10-17T00:00:00Z"},
+            )
+
+            assert response.status_code == 200
+            assert response.json()["from"] == "2026-10-17T00:00:00Z"
+            assert response.json()["points"] == [{"timestamp": "2026-10-17T00:00:00Z", "clicks": 7}]
+            mock_service.assert_awaited_once_with("abc123", "day", ANY, None, ANY)
+
+
+@pytest.mark.asyncio
+async def test_get_link_timeseries_rejects_bad_ranges():
+    async with AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        with patch(
+            "src.app.routes.get_link_timeseries",
+            side_effect=ValueError("from must be before to"),
+        ):
+            response = await ac.get("/stats/abc123/timeseries")
+            assert response.status_code == 400
+
+        response = await ac.get("/stats/abc123/timeseries", params={"granularity": "minute"})
+        assert response.status_code == 422
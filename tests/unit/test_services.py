@@ -1,12 +1,23 @@
+import asyncio
 import pytest
-from unittest.mock import AsyncMock, MagicMock
+from datetime import datetime, timezone
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 from sqlalchemy.exc import NoResultFound
 from src.app.services import (
+    copy_urls,
     create_short_link,
+    create_short_links,
+    find_url,
     get_long_url,
     get_link_stats,
+    get_link_timeseries,
     increment_access_count,
+    apply_access_count_deltas,
+    invalidate_all_short_links,
+    invalidate_short_link,
 )
+from src.app.core.local_cache import local_cache
+from src.app.dedup import url_digest
 from src.app.models import URL
 from src.app.base62 import encode, decode
 
@@ -23,56 +34,176 @@ async def test_create_short_link():
     db_mock.add = MagicMock()
     db_mock.commit = AsyncMock()
 
-    async def custom_refresh(url_obj):
-        url_obj.id = current_db_url_id
-
-    # Simulate the behavior of returning the URL object from the DB with a new ID
-    db_mock.refresh = AsyncMock(side_effect=custom_refresh)
-
     # Execute the function under test
-    actual_short_link = await create_short_link(long_url, db_mock, redis_mock)
+    with patch("src.app.services.settings.CREATE_BATCH_ENABLED", False), patch(
+        "src.app.services.id_allocator.allocate",
+        new=AsyncMock(return_value=current_db_url_id),
+    ):
+        actual_short_link = await create_short_link(long_url, db_mock, redis_mock)
 
     expected_short_link = encode(current_db_url_id)
 
     # Assertions
     assert actual_short_link == expected_short_link
     db_mock.add.assert_called_once()
+    assert db_mock.add.call_args.args[0].id == current_db_url_id
     db_mock.commit.assert_called_once()
-    redis_mock.set.assert_called_with(f"shortlink:{expected_short_link}", long_url)
+    redis_mock.set.assert_called_with(f"shortlink:{expected_short_link}", long_url, ex=3600)
+
+
+@pytest.mark.asyncio
+async def test_create_short_link_failed_commit_is_uncached():
+    redis_mock = AsyncMock()
+    db_mock = AsyncMock()
+    db_mock.add = MagicMock()
+    db_mock.commit = AsyncMock(side_effect=OSError("db down"))
+
+    with patch("src.app.services.settings.CREATE_BATCH_ENABLED", False), patch(
+        "src.app.services.id_allocator.allocate", new=AsyncMock(return_value=1000)
+    ):
+        with pytest.raises(OSError):
+            await create_short_link("https://example.com", db_mock, redis_mock)
+
+    redis_mock.delete.assert_awaited_once_with(f"shortlink:{encode(1000)}")
+
+
+@pytest.mark.asyncio
+async def test_create_short_link_with_its_own_redirect_status():
+    redis_mock = AsyncMock()
+    db_mock = AsyncMock()
+    db_mock.add = MagicMock()
+
+    with patch("src.app.services.settings.DEDUP_ENABLED", True), patch(
+        "src.app.services.find_existing_link", new=AsyncMock()
+    ) as find_mock, patch("src.app.services.create_link_batcher.submit", new=AsyncMock()) as submit_mock, patch(
+        "src.app.services.id_allocator.allocate", new=AsyncMock(return_value=1000)
+    ):
+        short_link = await create_short_link("https://example.com", db_mock, redis_mock, 301)
+
+    find_mock.assert_not_awaited()
+    submit_mock.assert_not_awaited()
+    url_obj = db_mock.add.call_args.args[0]
+    assert (url_obj.redirect_status, url_obj.long_url_digest) == (301, None)
+    redis_mock.set.assert_called_with(f"shortlink:{short_link}", "301 https://example.com", ex=3600)
+
+
+@pytest.mark.asyncio
+async def test_create_short_link_batched():
+    long_url = "https://example.com"
+    db_mock = AsyncMock()
+
+    with patch(
+        "src.app.services.create_link_batcher.submit",
+        new=AsyncMock(return_value="6LAze"),
+    ) as submit_mock:
+        actual_short_link = await create_short_link(long_url, db_mock, AsyncMock())
+
+    assert actual_short_link == "6LAze"
+    submit_mock.assert_awaited_once_with(long_url, 0)
+    db_mock.commit.assert_not_awaited()
 
 
 @pytest.mark.asyncio
 async def test_get_long_url_found_in_redis():
-    short_link = "short123"
+    short_link = "short1"
     long_url = "https://example.com"
     bt_mock = MagicMock()
 
     db_mock = AsyncMock()
     redis_mock = AsyncMock()
-    redis_mock.get = AsyncMock(return_value=long_url)
+    redis_mock.evalsha = AsyncMock(return_value=long_url)
 
     result = await get_long_url(short_link, db_mock, redis_mock, bt_mock)
 
     assert result == long_url
-    redis_mock.get.assert_awaited_with(f"shortlink:{short_link}")
+    redis_mock.evalsha.assert_awaited_with(ANY, 1, f"shortlink:{short_link}", 86400)
     db_mock.assert_not_awaited()
 
 
+@pytest.mark.asyncio
+async def test_get_long_url_found_in_local_cache():
+    short_link = "short1"
+    long_url = "https://example.com"
+    local_cache.set(short_link, long_url)
+
+    db_mock = AsyncMock()
+    redis_mock = AsyncMock()
+
+    result = await get_long_url(short_link, db_mock, redis_mock, MagicMock())
+
+    assert result == long_url
+    redis_mock.evalsha.assert_not_awaited()
+    db_mock.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_long_url_found_in_snapshot():
+    redis_mock = AsyncMock()
+    background_tasks = MagicMock()
+
+    with patch("src.app.services.link_snapshot.get", return_value="https://example.com") as get_mock:
+        result = await get_long_url(encode(100000000), AsyncMock(), redis_mock, background_tasks)
+
+    assert result == "https://example.com"
+    get_mock.assert_called_once_with(100000000)
+    redis_mock.evalsha.assert_not_awaited()
+    background_tasks.add_task.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_get_long_url_populates_local_cache():
+    short_link = "short1"
+    long_url = "https://example.com"
+
+    redis_mock = AsyncMock()
+    redis_mock.evalsha = AsyncMock(return_value=long_url)
+
+    await get_long_url(short_link, AsyncMock(), redis_mock, MagicMock())
+    await get_long_url(short_link, AsyncMock(), redis_mock, MagicMock())
+
+    redis_mock.evalsha.assert_awaited_once()
+    assert local_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_short_link():
+    short_link = "short1"
+    local_cache.set(short_link, "https://example.com")
+    redis_mock = AsyncMock()
+
+    await invalidate_short_link(short_link, redis_mock)
+
+    assert local_cache.get(short_link) is None
+    redis_mock.delete.assert_awaited_once_with(f"shortlink:{short_link}")
+    redis_mock.publish.assert_awaited_once_with("shortlink:invalidate", short_link)
+
+
+@pytest.mark.asyncio
+async def test_invalidate_all_short_links():
+    local_cache.set("short1", "https://example.com")
+    redis_mock = AsyncMock()
+
+    await invalidate_all_short_links(redis_mock)
+
+    assert local_cache.get("short1") is None
+    redis_mock.publish.assert_awaited_once_with("shortlink:invalidate", "*")
+
+
 @pytest.mark.asyncio
 async def test_get_long_url_found_in_db():
-    short_link = "short123"
+    short_link = "short1"
     id = decode(short_link)
     expected_long_url = "https://example.com"
 
     bt_mock = MagicMock()
 
     redis_mock = AsyncMock()
-    redis_mock.get = AsyncMock(return_value=None)
+    redis_mock.evalsha = AsyncMock(return_value=None)
 
     db_mock = AsyncMock()
     url_obj = URL(id=id, long_url=expected_long_url)
     mock_result = MagicMock()
-    mock_result.scalars.return_value.first.return_value = url_obj
+    mock_result.first.return_value = url_obj
     db_mock.execute = AsyncMock(return_value=mock_result)
     db_mock.commit = AsyncMock()
 
@@ -80,7 +211,7 @@ async def test_get_long_url_found_in_db():
 
     assert actual_long_url == expected_long_url
     db_mock.execute.assert_awaited_once()
-    redis_mock.set.assert_awaited_with(f"shortlink:{short_link}", expected_long_url)
+    redis_mock.set.assert_awaited_with(f"shortlink:{short_link}", expected_long_url, ex=86400)
 
 
 @pytest.mark.asyncio
@@ -88,15 +219,39 @@ async def test_get_long_url_not_found():
     db_mock = AsyncMock()
     redis_mock = AsyncMock()
     bt_mock = MagicMock()
-    short_link = "nonexistent123"
+    # Canonical and in range, so the lookup gets as far as the database
+    short_link = encode(100000000)
 
-    redis_mock.get = AsyncMock(return_value=None)
+    redis_mock.evalsha = AsyncMock(return_value=None)
     mock_result = MagicMock()
-    mock_result.scalars.return_value.first.return_value = None
+    mock_result.first.return_value = None
     db_mock.execute = AsyncMock(return_value=mock_result)
 
     with pytest.raises(NoResultFound):
         await get_long_url(short_link, db_mock, redis_mock, bt_mock)
+    db_mock.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_find_url_selects_its_columns_without_the_orm():
+    db_mock = AsyncMock()
+    db_mock.execute.return_value.first = MagicMock(return_value=("https://example.com", 3, None))
+
+    assert await find_url(100000000, db_mock) == ("https://example.com", 3, None)
+
+    query, params = db_mock.execute.await_args.args
+    assert params == {"id": 100000000}
+    assert [column.name for column in query.selected_columns] == ["long_url", "access_count", "redirect_status"]
+    assert "orm" not in query._propagate_attrs.get("compile_state_plugin", "")
+
+
+def mock_pipeline(redis_mock, results):
+    pipe = MagicMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    pipe.execute = AsyncMock(return_value=results)
+    redis_mock.pipeline = MagicMock(return_value=pipe)
+    return pipe
 
 
 @pytest.mark.asyncio
@@ -109,47 +264,369 @@ async def test_get_link_stats_success():
     expected_stats = {
         "long_url": long_url,
         "short_link": short_link,
-        "access_count": access_count,
+        "access_count": access_count + 5,
     }
 
     db_mock = AsyncMock()
     url_obj = URL(id=id, long_url=long_url, access_count=access_count)
     mock_result = MagicMock()
-    mock_result.scalars.return_value.first.return_value = url_obj
+    mock_result.first.return_value = url_obj
     db_mock.execute = AsyncMock(return_value=mock_result)
+    redis_mock = AsyncMock()
+    # Clicks still pending in Redis and clicks in the batch being flushed
+    mock_pipeline(redis_mock, ["3", "2", "7"])
 
-    actual_stats = await get_link_stats(short_link, db_mock)
+    actual_stats = await get_link_stats(short_link, db_mock, redis_mock)
 
     assert actual_stats == expected_stats
     db_mock.execute.assert_awaited_once()
 
 
+@pytest.mark.asyncio
+async def test_get_link_stats_reuses_cached_row_until_the_next_flush():
+    db_mock = AsyncMock()
+    db_mock.execute.return_value.first = MagicMock(return_value=URL(long_url="https://example.com", access_count=100))
+    redis_mock = AsyncMock()
+
+    mock_pipeline(redis_mock, ["3", None, "7"])
+    assert (await get_link_stats("abc123", db_mock, redis_mock))["access_count"] == 103
+    mock_pipeline(redis_mock, ["4", None, "7"])
+    assert (await get_link_stats("abc123", db_mock, redis_mock))["access_count"] == 104
+    db_mock.execute.assert_awaited_once()
+
+    # A flush moved the pending clicks into the DB
+    db_mock.execute.return_value.first = MagicMock(return_value=URL(long_url="https://example.com", access_count=104))
+    mock_pipeline(redis_mock, ["1", None, "8"])
+    assert (await get_link_stats("abc123", db_mock, redis_mock))["access_count"] == 105
+    assert db_mock.execute.await_count == 2
+
+
 @pytest.mark.asyncio
 async def test_get_link_stats_not_found():
-    short_link = "nonexistent123"
+    short_link = encode(100000000)
     db_mock = AsyncMock()
     redis_mock = AsyncMock()
-    redis_mock.get = AsyncMock(return_value=None)
+    mock_pipeline(redis_mock, [None, None, None])
     mock_result = MagicMock()
-    mock_result.scalars.return_value.first.return_value = None
+    mock_result.first.return_value = None
     db_mock.execute = AsyncMock(return_value=mock_result)
 
     with pytest.raises(NoResultFound):
-        await get_link_stats(short_link, db_mock)
+        await get_link_stats(short_link, db_mock, redis_mock)
+    db_mock.execute.assert_awaited_once()
 
 
 @pytest.mark.asyncio
 async def test_increment_access_count():
-    db_mock = AsyncMock()
+    redis_mock = AsyncMock()
+    pipe = mock_pipeline(redis_mock, [1, 1])
+    short_link = "abc123"
+
+    with patch("src.app.services.time.time", return_value=1792319400.5):
+        await increment_access_count(short_link, redis_mock)
+
+    pipe.hincrby.assert_any_call("access_count:pending", decode(short_link), 1)
+    pipe.hincrby.assert_any_call("click_rollup:pending", f"{decode(short_link)}:1792317600", 1)
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_increment_access_count_appends_click_event():
+    redis_mock = AsyncMock()
+    pipe = mock_pipeline(redis_mock, [1, 1, "1-0"])
+    click = {"ts": "1792317600000", "link": "abc123", "ref": "", "ua": "", "ip": ""}
+
+    await increment_access_count("abc123", redis_mock, click)
+
+    pipe.xadd.assert_called_once_with("click_events", click, maxlen=1000000, approximate=True)
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_increment_access_count_without_rollups():
+    redis_mock = AsyncMock()
     short_link = "abc123"
-    url_obj = URL(long_url="https://example.com", access_count=10)
 
+    with patch("src.app.services.settings.CLICK_ROLLUP_ENABLED", False):
+        await increment_access_count(short_link, redis_mock)
+
+    redis_mock.hincrby.assert_awaited_once_with(
+        "access_count:pending", decode(short_link), 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_link_timeseries_defaults_and_limits():
+    db_mock = AsyncMock()
+    db_mock.execute.return_value.first = MagicMock(return_value=URL())
+    end = datetime(2026, 10, 18, 11, 20, tzinfo=timezone.utc)
+
+    with patch("src.app.services.get_click_timeseries", new=AsyncMock(return_value=[])) as series_mock:
+        timeseries = await get_link_timeseries(encode(100000000), "hour", None, end, db_mock)
+
+    assert timeseries["from"] == datetime(2026, 10, 17, 11, tzinfo=timezone.utc)
+    assert timeseries["to"] == datetime(2026, 10, 18, 11, tzinfo=timezone.utc)
+    series_mock.assert_awaited_once_with(100000000, "hour", timeseries["from"], timeseries["to"], db_mock)
+
+    with pytest.raises(ValueError):
+        await get_link_timeseries(encode(100000000), "hour", datetime(2020, 1, 1), end, db_mock)
+
+
+@pytest.mark.asyncio
+async def test_get_link_timeseries_unknown_link():
+    db_mock = AsyncMock()
+    db_mock.execute.return_value.first = MagicMock(return_value=None)
+
+    with pytest.raises(NoResultFound):
+        await get_link_timeseries(encode(100000000), "day", None, None, db_mock)
+
+
+@pytest.mark.asyncio
+async def test_apply_access_count_deltas():
+    db_mock = AsyncMock()
+
+    await apply_access_count_deltas({100000000: 3, 100000001: 1}, db_mock)
+
+    db_mock.execute.assert_awaited_once()
+    query = str(db_mock.execute.await_args.args[0])
+    assert "UPDATE urls" in query
+    assert "VALUES" in query
+    db_mock.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_create_short_links_keeps_input_order_and_item_errors():
+    long_urls = ["https://a.com/", "not a url", "https://b.com/"]
+    redis_mock = AsyncMock()
+
+    with patch(
+        "src.app.services.id_allocator.allocate_many",
+        new=AsyncMock(return_value=[1000, 1001]),
+    ), patch("src.app.services.copy_urls", new=AsyncMock()) as copy_mock, patch(
+        "src.app.services.cache_links", new=AsyncMock()
+    ) as cache_mock:
+        results = await create_short_links(long_urls, AsyncMock(), redis_mock)
+
+    assert [result["short_link"] for result in results] == [encode(1000), None, encode(1001)]
+    assert results[1]["error"]
+    copy_mock.assert_awaited_once()
+    assert copy_mock.await_args.args[1] == [
+        (1000, "https://a.com/", 0, url_digest("https://a.com/")),
+        (1001, "https://b.com/", 0, url_digest("https://b.com/")),
+    ]
+    cache_mock.assert_awaited_once_with(
+        redis_mock, [(encode(1000), "https://a.com/"), (encode(1001), "https://b.com/")], 3600
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_short_link_dedup_returns_existing_link():
+    redis_mock = AsyncMock()
+    redis_mock.get = AsyncMock(return_value="6LAze")
+
+    with patch("src.app.services.settings.DEDUP_ENABLED", True), patch(
+        "src.app.services.create_link_batcher.submit", new=AsyncMock()
+    ) as submit_mock:
+        assert await create_short_link("https://example.com", AsyncMock(), redis_mock) == "6LAze"
+
+    redis_mock.get.assert_awaited_once_with(f"urldigest:{url_digest('https://example.com').hex()}")
+    submit_mock.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_create_short_links_dedup_reuses_existing_and_repeated_urls():
+    long_urls = ["https://a.com/", "https://b.com/", "https://b.com/"]
+
+    with patch("src.app.services.settings.DEDUP_ENABLED", True), patch(
+        "src.app.services.find_existing_links", new=AsyncMock(return_value={"https://a.com/": "6LAze"})
+    ), patch(
+        "src.app.services.id_allocator.allocate_many", new=AsyncMock(return_value=[1000])
+    ) as allocate_mock, patch("src.app.services.copy_urls", new=AsyncMock()) as copy_mock, patch(
+        "src.app.services.cache_links", new=AsyncMock()
+    ), patch("src.app.services.remember_links", new=AsyncMock()) as remember_mock:
+        results = await create_short_links(long_urls, AsyncMock(), AsyncMock())
+
+    assert [result["short_link"] for result in results] == ["6LAze", encode(1000), encode(1000)]
+    allocate_mock.assert_awaited_once_with(1, 0)
+    assert copy_mock.await_args.args[1] == [(1000, "https://b.com/", 0, url_digest("https://b.com/"))]
+    assert remember_mock.await_args.args[1] == {"https://a.com/": "6LAze", "https://b.com/": encode(1000)}
+
+
+@pytest.mark.asyncio
+async def test_create_short_links_all_invalid_skips_db():
+    with patch("src.app.services.copy_urls", new=AsyncMock()) as copy_mock:
+        results = await create_short_links(["nope"], AsyncMock(), AsyncMock())
+
+    assert results[0]["short_link"] is None
+    copy_mock.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_copy_urls_uses_copy_and_commits():
+    driver_connection = AsyncMock()
+    raw_conn = MagicMock(driver_connection=driver_connection)
+    conn = AsyncMock()
+    conn.get_raw_connection = AsyncMock(return_value=raw_conn)
+    db_mock = AsyncMock()
+    db_mock.connection = AsyncMock(return_value=conn)
+
+    records = [(1000, "https://a.com/", 0, url_digest("https://a.com/"))]
+    await copy_urls(db_mock, records)
+
+    driver_connection.copy_records_to_table.assert_awaited_once_with(
+        "urls", records=records, columns=["id", "long_url", "access_count", "long_url_digest"]
+    )
+    db_mock.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("short_link", ["abc-12", "0abc123", "", "a" * 12, "abc", "z" * 11])
+async def test_get_long_url_rejects_malformed_or_unallocated_codes_without_io(short_link):
+    db_mock = AsyncMock()
+    redis_mock = AsyncMock()
+
+    with pytest.raises(NoResultFound):
+        await get_long_url(short_link, db_mock, redis_mock, MagicMock())
+
+    redis_mock.evalsha.assert_not_awaited()
+    db_mock.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_long_url_rejects_ids_beyond_allocated_range(allocated_id_range):
+    allocated_id_range.return_value = False
+    db_mock = AsyncMock()
+    redis_mock = AsyncMock()
+    redis_mock.evalsha = AsyncMock(return_value=None)
+
+    with pytest.raises(NoResultFound):
+        await get_long_url("short1", db_mock, redis_mock, MagicMock())
+
+    db_mock.execute.assert_not_awaited()
+    # The range may be out of date, so the id could belong to a block another worker just reserved
+    redis_mock.set.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_long_url_miss_is_negatively_cached():
+    short_link = "short1"
+    db_mock = AsyncMock()
+    redis_mock = AsyncMock()
+    redis_mock.evalsha = AsyncMock(return_value=None)
     mock_result = MagicMock()
-    mock_result.scalars.return_value.first.return_value = url_obj
+    mock_result.first.return_value = None
     db_mock.execute = AsyncMock(return_value=mock_result)
-    db_mock.commit = AsyncMock()
 
-    await increment_access_count(short_link, db_mock)
+    for _ in range(3):
+        with pytest.raises(NoResultFound):
+            await get_long_url(short_link, db_mock, redis_mock, MagicMock())
+
+    db_mock.execute.assert_awaited_once()
+    redis_mock.evalsha.assert_awaited_once()
+    redis_mock.set.assert_awaited_once_with(f"shortlink:{short_link}", "", ex=60, nx=True)
+
+
+@pytest.mark.asyncio
+async def test_get_long_url_negative_entry_in_redis():
+    db_mock = AsyncMock()
+    redis_mock = AsyncMock()
+    redis_mock.evalsha = AsyncMock(return_value="")
+
+    with pytest.raises(NoResultFound):
+        await get_long_url("short1", db_mock, redis_mock, MagicMock())
+
+    db_mock.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_link_stats_rejects_malformed_code():
+    db_mock = AsyncMock()
+
+    with pytest.raises(NoResultFound):
+        await get_link_stats("bad-code", db_mock, AsyncMock())
+
+    db_mock.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_long_url_coalesces_concurrent_misses():
+    short_link = "short1"
+    expected_long_url = "https://example.com"
+    redis_mock = AsyncMock()
+    redis_mock.evalsha = AsyncMock(return_value=None)
+
+    async def slow_execute(query, params):
+        await asyncio.sleep(0.01)
+        mock_result = MagicMock()
+        mock_result.first.return_value = URL(long_url=expected_long_url)
+        return mock_result
+
+    db_mock = AsyncMock()
+    db_mock.execute = AsyncMock(side_effect=slow_execute)
+
+    results = await asyncio.gather(
+        *(get_long_url(short_link, db_mock, redis_mock, MagicMock()) for _ in range(10))
+    )
+
+    assert results == [expected_long_url] * 10
+    db_mock.execute.assert_awaited_once()
+    redis_mock.evalsha.assert_awaited_once()
+    redis_mock.set.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_long_url_waits_for_lease_holder():
+    short_link = "short1"
+    redis_mock = AsyncMock()
+    # Missing at first, then written by the node holding the lease
+    redis_mock.evalsha = AsyncMock(side_effect=[None, None, "https://example.com"])
+    redis_mock.set = AsyncMock(return_value=None)
+    db_mock = AsyncMock()
+
+    with patch("src.app.services.settings.SINGLE_FLIGHT_LEASE_ENABLED", True), patch(
+        "src.app.services.settings.SINGLE_FLIGHT_LEASE_POLL_MS", 1
+    ):
+        result = await get_long_url(short_link, db_mock, redis_mock, MagicMock())
+
+    assert result == "https://example.com"
+    db_mock.execute.assert_not_awaited()
+    assert redis_mock.set.await_args.args[0] == f"shortlink:lease:{short_link}"
+
 
-    assert url_obj.access_count == 11
-    db_mock.commit.assert_awaited()
+@pytest.mark.asyncio
+async def test_get_long_url_lease_holder_loads_and_releases():
+    short_link = "short1"
+    redis_mock = AsyncMock()
+    redis_mock.evalsha = AsyncMock(return_value=None)
+    redis_mock.set = AsyncMock(return_value=True)
+    mock_result = MagicMock()
+    mock_result.first.return_value = URL(long_url="https://example.com")
+    db_mock = AsyncMock()
+    db_mock.execute = AsyncMock(return_value=mock_result)
+
+    with patch("src.app.services.settings.SINGLE_FLIGHT_LEASE_ENABLED", True):
+        result = await get_long_url(short_link, db_mock, redis_mock, MagicMock())
+
+    assert result == "https://example.com"
+    db_mock.execute.assert_awaited_once()
+    redis_mock.eval.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_link_stats_reads_from_the_primary_only():
+    primary_row = URL(id=100000000, long_url="https://example.com", access_count=2)
+    db_mock = AsyncMock()
+    db_mock.execute.return_value.first = MagicMock(return_value=primary_row)
+    redis_mock = AsyncMock()
+    mock_pipeline(redis_mock, [None, None, None])
+    replicas = MagicMock()
+    replicas.choose = MagicMock(return_value=0)
+
+    replicas.run = AsyncMock(return_value=URL(id=100000000, long_url="https://example.com", access_count=1))
+    with patch("src.app.services.read_replicas", replicas):
+        stats = await get_link_stats(encode(100000000), db_mock, redis_mock)
+
+    # A replica may not have seen the last flush yet, while Redis already dropped its clicks
+    assert stats["access_count"] == 2
+    db_mock.execute.assert_awaited_once()
+    replicas.run.assert_not_awaited()
@@ -0,0 +1,75 @@
+import contextlib
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.exc import NoResultFound
+from src.app.base62 import encode
+from src.app.dedup import url_digest
+from src.app.models import URL
+from src.app.services import apply_access_count_deltas, get_long_url, read_url
+from src.app.sharding import local_id, shard_id, shard_of, write_shard_for
+
+
+def test_shard_id_round_trips_and_keeps_shard_zero_ids():
+    id = shard_id(3, 100000123)
+    assert shard_of(id) == 3
+    assert local_id(id) == 100000123
+    assert shard_id(0, 100000123) == 100000123
+
+
+def test_shard_id_refuses_local_ids_that_spill_into_the_next_shard():
+    assert shard_of(shard_id(1, (1 << 40) - 1)) == 1
+    with pytest.raises(ValueError):
+        shard_id(1, 1 << 40)
+
+
+def test_write_shard_for_spreads_over_write_shards_only():
+    digests = [url_digest(f"https://example.com/{i}") for i in range(200)]
+    with patch("src.app.sharding.settings.DB_WRITE_SHARDS", "1,2"):
+        shards = {write_shard_for(digest) for digest in digests}
+        assert shards == {1, 2}
+        # Stable, so dedup knows where to look
+        assert write_shard_for(digests[0]) == write_shard_for(digests[0])
+
+
+def mock_shards(sessions: dict[int, AsyncMock]):
+    @contextlib.asynccontextmanager
+    async def session(shard, db=None):
+        yield db if shard == 0 and db is not None else sessions[shard]
+
+    return patch("src.app.services.shards.session", new=session)
+
+
+@pytest.mark.asyncio
+async def test_read_url_goes_to_the_shard_in_the_id():
+    shard_db = AsyncMock()
+    url_obj = URL(long_url="https://example.com")
+    shard_db.execute.return_value.first = MagicMock(return_value=url_obj)
+    db_mock = AsyncMock()
+
+    with mock_shards({1: shard_db}):
+        assert await read_url(shard_id(1, 100000000), db_mock) is url_obj
+
+    db_mock.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_apply_access_count_deltas_updates_each_shard():
+    db_mock, shard_db = AsyncMock(), AsyncMock()
+
+    with mock_shards({1: shard_db}):
+        await apply_access_count_deltas({100000000: 3, shard_id(1, 100000000): 1}, db_mock)
+
+    db_mock.execute.assert_awaited_once()
+    db_mock.commit.assert_awaited_once()
+    shard_db.execute.assert_awaited_once()
+    shard_db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_unknown_shard_is_rejected_without_io():
+    db_mock, redis_mock = AsyncMock(), AsyncMock()
+    with pytest.raises(NoResultFound):
+        await get_long_url(encode(shard_id(5, 100000000)), db_mock, redis_mock, MagicMock())
+
+    redis_mock.evalsha.assert_not_awaited()
+    db_mock.execute.assert_not_awaited()
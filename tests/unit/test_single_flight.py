@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from src.app.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    single_flight = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "https://example.com"
+
+    waiters = [asyncio.create_task(single_flight.do("abc", load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ["https://example.com"] * 5
+    assert calls == 1
+    assert single_flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    single_flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fail():
+        await release.wait()
+        raise LookupError("missing")
+
+    waiters = [asyncio.create_task(single_flight.do("abc", fail)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert all(isinstance(result, LookupError) for result in results)
+
+    async def load():
+        return "https://example.com"
+
+    assert await single_flight.do("abc", load) == "https://example.com"
+
+
+@pytest.mark.asyncio
+async def test_different_keys_do_not_coalesce():
+    single_flight = SingleFlight()
+
+    async def load(value):
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(
+        single_flight.do("a", lambda: load(1)), single_flight.do("b", lambda: load(2))
+    )
+
+    assert results == [1, 2]
+    assert single_flight.stats()["coalesced"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_fail_its_followers():
+    single_flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def load():
+        await release.wait()
+        return "https://example.com"
+
+    leader = asyncio.create_task(single_flight.do("abc", load))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(single_flight.do("abc", load))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await follower == "https://example.com"
+    assert leader.cancelled()
+    assert single_flight.stats()["in_flight"] == 0
@@ -0,0 +1,97 @@
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.app.snapshot import LinkSnapshot, SnapshotRefresher, top_links, write_snapshot
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "links.snapshot")
+    write_snapshot(path, [(100000002, "https://b.com/ü"), (100000000, "https://a.com/"), (100000005, "")])
+    snapshot = LinkSnapshot(path)
+
+    assert snapshot.load()
+    assert len(snapshot) == 3
+    assert snapshot.get(100000000) == "https://a.com/"
+    assert snapshot.get(100000002) == "https://b.com/ü"
+    assert snapshot.get(100000001) is None
+    assert snapshot.get(200000000) is None
+    # Nothing changed on disk, so nothing is mapped again
+    assert not snapshot.load()
+    snapshot.close()
+
+
+def test_snapshot_picks_up_a_replaced_file(tmp_path):
+    path = str(tmp_path / "links.snapshot")
+    write_snapshot(path, [(100000000, "https://a.com/")])
+    snapshot = LinkSnapshot(path)
+    snapshot.load()
+
+    write_snapshot(path, [(100000001, "https://b.com/")])
+    assert snapshot.load()
+
+    assert snapshot.get(100000000) is None
+    assert snapshot.get(100000001) == "https://b.com/"
+    assert snapshot.stats()["loads"] == 2
+    snapshot.close()
+
+
+def test_snapshot_without_a_file_misses(tmp_path):
+    snapshot = LinkSnapshot(str(tmp_path / "missing.snapshot"))
+
+    assert not snapshot.load()
+    assert snapshot.get(100000000) is None
+
+
+@pytest.mark.asyncio
+async def test_top_links_merges_shards_by_access_count():
+    def shard(rows):
+        db = AsyncMock()
+        db.execute.return_value.all = MagicMock(return_value=rows)
+        factory = MagicMock()
+        factory.return_value.__aenter__ = AsyncMock(return_value=db)
+        factory.return_value.__aexit__ = AsyncMock(return_value=False)
+        return factory
+
+    shard0 = shard([(1, "https://a.com/", 50, None), (2, "https://b.com/", 3, None)])
+    shard1 = shard([(1 << 40, "https://c.com/", 20, 308)])
+
+    assert await top_links(2, [shard0, shard1]) == [(1, "https://a.com/"), (1 << 40, "308 https://c.com/")]
+
+
+@pytest.mark.asyncio
+async def test_top_links_reads_the_first_shard_from_a_replica():
+    primary = MagicMock()
+    replica_rows = [(1, "https://a.com/", 50, None)]
+    with patch("src.app.snapshot.read_replicas.choose", return_value=0), patch(
+        "src.app.snapshot.read_replicas.run", new=AsyncMock(return_value=replica_rows)
+    ) as run_mock:
+        assert await top_links(1, [primary]) == [(1, "https://a.com/")]
+
+    run_mock.assert_awaited_once()
+    primary.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_refresher_rebuilds_stale_snapshot_once(tmp_path):
+    path = str(tmp_path / "links.snapshot")
+    snapshot = LinkSnapshot(path)
+    refresher = SnapshotRefresher(snapshot, rebuild_seconds=300)
+
+    async def build(path, max_links):
+        write_snapshot(path, [(100000000, "https://a.com/")])
+        return 1
+
+    with patch("src.app.snapshot.build_snapshot", new=AsyncMock(side_effect=build)) as build_mock:
+        await refresher.refresh()
+        await refresher.refresh()
+
+    build_mock.assert_awaited_once()
+    assert snapshot.get(100000000) == "https://a.com/"
+
+    # Old enough to be rebuilt again
+    os.utime(path, (0, 0))
+    with patch("src.app.snapshot.build_snapshot", new=AsyncMock(side_effect=build)) as build_mock:
+        await refresher.refresh()
+    build_mock.assert_awaited_once()
+    assert refresher.stats()["rebuilds"] == 2
+    await refresher.stop()
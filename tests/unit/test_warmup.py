@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.app.base62 import encode
+from src.app.core.local_cache import local_cache
+from src.app.warmup import CacheWarmer, links_by_access_count, stream_top_links, warm_links
+
+
+def mock_session_factory(pages):
+    async def partitions(size):
+        for rows in pages:
+            yield rows
+
+    db = AsyncMock()
+    db.stream.return_value.partitions = partitions
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    return factory, db
+
+
+@pytest.mark.asyncio
+async def test_stream_top_links_streams_one_top_n_query():
+    factory, db = mock_session_factory(
+        [[(3, "https://c.com/", None), (1, "https://a.com/", 301)], [(2, "https://b.com/", None)]]
+    )
+
+    pages = [page async for page in stream_top_links(factory, 10, 2)]
+
+    assert pages == [[(3, "https://c.com/"), (1, "301 https://a.com/")], [(2, "https://b.com/")]]
+    query = db.stream.await_args.args[0]
+    db.stream.assert_awaited_once()
+    assert query.whereclause is None
+    assert query._limit == 10
+
+
+@pytest.mark.asyncio
+async def test_links_by_access_count_takes_pages_from_shards_in_turn():
+    shard0, _ = mock_session_factory([[(1, "https://a.com/", None)], [(2, "https://b.com/", None)]])
+    shard1, _ = mock_session_factory([[(1 << 40, "https://c.com/", None)]])
+
+    pages = [page async for page in links_by_access_count(4, 1, [shard0, shard1])]
+
+    assert [id for page in pages for id, _ in page] == [1, 1 << 40, 2]
+
+
+@pytest.mark.asyncio
+async def test_links_by_access_count_scans_the_first_shard_on_a_replica():
+    primary, primary_db = mock_session_factory([])
+    replica, _ = mock_session_factory([[(1, "https://a.com/", None)]])
+    with patch("src.app.warmup.shards.session_factories", [primary]), patch(
+        "src.app.warmup.read_replicas.choose", return_value=0
+    ), patch("src.app.warmup.read_replicas.session_factories", [replica]):
+        pages = [page async for page in links_by_access_count(4, 10)]
+
+    assert pages == [[(1, "https://a.com/")]]
+    primary_db.stream.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_warm_links_fills_redis_and_the_hottest_of_l1():
+    async def hot_links(source, max_links, batch_size):
+        yield [(100000000, "https://a.com/"), (100000001, "https://b.com/")]
+        yield [(100000002, "https://c.com/")]
+
+    redis_mock = AsyncMock()
+    progress = MagicMock()
+    with patch("src.app.warmup.hot_links", new=hot_links), patch(
+        "src.app.warmup.cache_links", new=AsyncMock()
+    ) as cache_mock, patch.object(local_cache, "max_size", 2):
+        assert await warm_links(redis_mock, progress=progress) == 3
+
+    assert cache_mock.await_count == 2
+    assert cache_mock.await_args_list[1].args[1] == [(encode(100000002), "https://c.com/")]
+    assert local_cache.get(encode(100000001)) == "https://b.com/"
+    assert local_cache.get(encode(100000002)) is None
+    assert [len(call.args[0]) for call in progress.call_args_list] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_warmer_is_ready_once_its_budget_runs_out():
+    async def slow_warm_links(redis, progress):
+        progress([(encode(100000000 + i), "https://a.com/") for i in range(10)])
+        await asyncio.sleep(10)
+
+    warmer = CacheWarmer(budget_seconds=0.05)
+    with patch("src.app.warmup.acquire_lock", new=AsyncMock(return_value="token")), patch(
+        "src.app.warmup.release_lock", new=AsyncMock()
+    ) as release_mock, patch("src.app.warmup.warm_links", new=slow_warm_links):
+        warmer.start()
+        assert not warmer.ready
+        await warmer._task
+
+    assert warmer.ready
+    assert warmer.stats()["timed_out"]
+    assert warmer.links == 10
+    release_mock.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_warmer_waits_for_the_worker_holding_the_lock():
+    redis_mock = AsyncMock()
+    redis_mock.exists.side_effect = [1, 0]
+    redis_mock.get.return_value = None
+    warmer = CacheWarmer()
+    with patch("src.app.warmup.acquire_lock", new=AsyncMock(return_value=None)), patch(
+        "src.app.warmup.warm_links", new=AsyncMock()
+    ) as warm_mock, patch("src.app.warmup.WARMUP_LOCK_POLL_SECONDS", 0):
+        await warmer.warm(redis_mock)
+
+    warm_mock.assert_not_awaited()
+    assert redis_mock.exists.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_warmer_publishes_its_l1_links_for_the_other_workers():
+    links = [(encode(100000000), "https://a.com/"), (encode(100000001), "301 https://b.com/")]
+    redis_mock = AsyncMock()
+
+    async def holder_warm_links(redis, progress):
+        progress(links)
+
+    with patch("src.app.warmup.acquire_lock", new=AsyncMock(return_value="token")), patch(
+        "src.app.warmup.release_lock", new=AsyncMock()
+    ), patch("src.app.warmup.warm_links", new=holder_warm_links):
+        await CacheWarmer().warm(redis_mock)
+
+    key, value = redis_mock.set.await_args.args
+    assert value == f"{encode(100000000)},{encode(100000001)}"
+
+    # Another worker, after the lock is released
+    redis_mock.get = AsyncMock(return_value=value)
+    warmer = CacheWarmer()
+    with patch("src.app.warmup.get_cached_links", new=AsyncMock(return_value=dict(links[:1]))) as read_mock:
+        await warmer.warm_local(redis_mock)
+
+    read_mock.assert_awaited_once_with(redis_mock, [encode(100000000), encode(100000001)])
+    assert local_cache.get(encode(100000000)) == "https://a.com/"
+    assert warmer.links == 1